@@ -0,0 +1,49 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+class AITask:
+    """A decision running in the background: poll done(), then collect result()"""
+    def __init__(self, future, cancelled):
+        self.future = future
+        self.cancelled = cancelled
+
+    def done(self):
+        return self.future.done()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.future.cancel()
+
+    def result(self):
+        if self.future.cancelled() or self.cancelled.is_set():
+            return None
+        return self.future.result()
+
+class AIWorker:
+    """Runs a synchronous AI's choose_shot(state, goals) on a background worker
+
+    Gives plain AIs the same start(state, goals) -> task interface as the search AIs,
+    so the game loop can poll for the decision instead of waiting for it. Threads are
+    the default; use_processes=True moves the work off the interpreter entirely, for
+    AIs that can be pickled.
+    """
+    def __init__(self, ai, use_processes=False):
+        self.ai = ai
+        self.use_processes = use_processes
+        self.executor = None
+
+    def start(self, state, goals):
+        if self.executor is None:
+            executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self.executor = executor_class(max_workers=1)
+        return AITask(self.executor.submit(self.ai.choose_shot, state, goals), threading.Event())
+
+    def choose_shot(self, state, goals):
+        return self.ai.choose_shot(state, goals)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if hasattr(self.ai, "close"):
+            self.ai.close()
@@ -0,0 +1,365 @@
+import argparse
+import json
+import math
+import os
+import time
+from collections import namedtuple
+
+from engine import PucketEngine, Shot, WIDTH, HEIGHT, PUCK_RADIUS, HOLE_RADIUS, FRICTION, MAX_VELOCITY
+from evaluation import shot_score, DISTANCE_WEIGHT
+
+# Same constants as the scalar engine and resolve_shot
+WALL_RESTITUTION = 0.8
+CAPTURE_RADIUS = HOLE_RADIUS - 5
+STOP_SPEED = 0.1
+
+AIM_TABLE_VERSION = 1
+
+# Where the game keeps its table between runs
+DEFAULT_TABLE = "aim_table.json"
+
+# Wall a bank shot comes off, as the table stores it; DIRECT aims straight at the goal
+DIRECT, LEFT, RIGHT, TOP, BOTTOM = -1, 0, 1, 2, 3
+
+# Predicted outcome of a shot on an otherwise empty board: where the puck comes to
+# rest (or is captured), after how many frames, and the corners of its path
+Prediction = namedtuple("Prediction", "x y frames captured path")
+
+# One entry of the aim table: the wall to bank off, angle and power corrections, and
+# whether the shot scores from the cell centre and in how many frames
+AimOption = namedtuple("AimOption", "wall angle_offset power_scale captured frames")
+
+def travel(speed, frames):
+    # Distance covered in frames frames from launch speed: a geometric series, since
+    # every frame multiplies the speed by FRICTION before moving
+    return speed * FRICTION * (1 - FRICTION ** frames) / (1 - FRICTION)
+
+def frames_to_travel(speed, distance):
+    # Fewest frames to cover more than distance from launch speed, or None
+    if distance < 0:
+        return 1
+    if speed <= 0 or distance >= speed * FRICTION / (1 - FRICTION):
+        return None
+    frames = max(1, math.ceil(math.log(1 - distance * (1 - FRICTION) / (speed * FRICTION)) / math.log(FRICTION)))
+    # Step over rounding at the boundary
+    while frames > 1 and travel(speed, frames - 1) > distance:
+        frames -= 1
+    while travel(speed, frames) <= distance:
+        frames += 1
+    return frames
+
+def frames_to_stop(speed, stop_speed=STOP_SPEED):
+    # Frames until a velocity component of this size drops below stop_speed
+    if speed < stop_speed:
+        return 1
+    return max(1, math.floor(math.log(stop_speed / speed) / math.log(FRICTION)) + 1)
+
+def stopping_power(distance):
+    # Launch power that brings the puck to rest distance away, capped at MAX_VELOCITY
+    return min(distance * (1 - FRICTION) / FRICTION, MAX_VELOCITY)
+
+def predict(x, y, angle, power, radius=PUCK_RADIUS, goal=None, capture_radius=CAPTURE_RADIUS,
+            stop_speed=STOP_SPEED, max_bounces=8):
+    """Closed-form trajectory of a lone puck, frame for frame as PucketEngine moves it
+
+    Straight runs are geometric series, so the cost is per wall bounce, not per frame.
+    With a goal, the puck is captured at the first frame that ends within
+    capture_radius of it. The puck stops as resolve_shot stops it: once both velocity
+    components are below stop_speed.
+    """
+    power = min(power, MAX_VELOCITY)
+    vx = power * math.cos(angle)
+    vy = power * math.sin(angle)
+    frames = 0
+    path = [(x, y)]
+    for _ in range(max_bounces + 1):
+        speed = math.hypot(vx, vy)
+        stop = frames_to_stop(max(abs(vx), abs(vy)), stop_speed)
+        run = stop
+        if speed > 0:
+            for position, component, high in ((x, vx, WIDTH), (y, vy, HEIGHT)):
+                if component > 0:
+                    crossing = frames_to_travel(component, high - radius - position)
+                elif component < 0:
+                    crossing = frames_to_travel(-component, position - radius)
+                else:
+                    crossing = None
+                if crossing is not None:
+                    run = min(run, crossing)
+
+        # Capture on the straight frames of this run (the last one may be clamped)
+        if goal is not None and speed > 0:
+            hit = capture_frame(x, y, vx / speed, vy / speed, speed, goal, capture_radius, run - 1)
+            if hit is not None:
+                distance = travel(speed, hit)
+                return Prediction(x + vx / speed * distance, y + vy / speed * distance, frames + hit, True, path)
+
+        # Advance the run and apply the engine's wall clamp
+        scale = FRICTION * (1 - FRICTION ** run) / (1 - FRICTION)
+        x += vx * scale
+        y += vy * scale
+        decay = FRICTION ** run
+        vx *= decay
+        vy *= decay
+        frames += run
+        if x < radius:
+            x, vx = radius, -vx * WALL_RESTITUTION
+        elif x > WIDTH - radius:
+            x, vx = WIDTH - radius, -vx * WALL_RESTITUTION
+        if y < radius:
+            y, vy = radius, -vy * WALL_RESTITUTION
+        elif y > HEIGHT - radius:
+            y, vy = HEIGHT - radius, -vy * WALL_RESTITUTION
+        path.append((x, y))
+
+        if goal is not None and math.hypot(x - goal[0], y - goal[1]) < capture_radius:
+            return Prediction(x, y, frames, True, path)
+        if run == stop:
+            break
+    return Prediction(x, y, frames, False, path)
+
+def capture_frame(x, y, dx, dy, speed, goal, capture_radius, last_frame):
+    # First frame in 1..last_frame ending inside the capture circle on a straight run
+    # along the unit direction (dx, dy), or None
+    if last_frame < 1:
+        return None
+    ox = goal[0] - x
+    oy = goal[1] - y
+    along = ox * dx + oy * dy
+    across2 = ox * ox + oy * oy - along * along
+    if across2 >= capture_radius * capture_radius:
+        return None
+    half = math.sqrt(capture_radius * capture_radius - across2)
+    enter, leave = along - half, along + half
+    if leave <= 0:
+        return None
+    frame = 1 if enter < 0 else frames_to_travel(speed, enter)
+    if frame is None or frame > last_frame or travel(speed, frame) >= leave:
+        return None
+    return frame
+
+def mirror(goal, wall, radius):
+    # The goal reflected in the line the puck centre bounces off
+    if wall == LEFT:
+        return (2 * radius - goal[0], goal[1])
+    if wall == RIGHT:
+        return (2 * (WIDTH - radius) - goal[0], goal[1])
+    if wall == TOP:
+        return (goal[0], 2 * radius - goal[1])
+    if wall == BOTTOM:
+        return (goal[0], 2 * (HEIGHT - radius) - goal[1])
+    return goal
+
+def option_shot(option, x, y, goal, radius):
+    # (angle, power) of a table option from the puck's actual position
+    target = mirror(goal, option.wall, radius)
+    dx = target[0] - x
+    dy = target[1] - y
+    angle = math.atan2(dy, dx) + option.angle_offset
+    power = min(stopping_power(math.hypot(dx, dy)) * option.power_scale, MAX_VELOCITY)
+    return angle, power
+
+class AimTable:
+    """Precomputed shots to each goal from every cell of the board
+
+    For each (cell, goal) the table lists the direct shot and the bank shots off each
+    wall that score from the cell centre on an empty board, fastest first. Options
+    are stored relative to the straight line at the goal (or its mirror image), so
+    they carry over to any position in the cell. Building takes a few seconds; save()
+    and load() keep it on disk.
+    """
+    def __init__(self, goals, radius=PUCK_RADIUS, cell_size=25, entries=None):
+        self.goals = [tuple(goal) for goal in goals]
+        self.radius = radius
+        self.cell_size = cell_size
+        self.columns = math.ceil(WIDTH / cell_size)
+        self.rows = math.ceil(HEIGHT / cell_size)
+        self.entries = entries if entries is not None else {}
+
+    def cell(self, x, y):
+        column = min(max(int(x // self.cell_size), 0), self.columns - 1)
+        row = min(max(int(y // self.cell_size), 0), self.rows - 1)
+        return column, row
+
+    def options(self, x, y, goal_idx):
+        return self.entries.get(self.cell(x, y) + (goal_idx,), ())
+
+    @classmethod
+    def build(cls, goals, radius=PUCK_RADIUS, cell_size=25, angle_offsets=(0.0, -0.03, 0.03, -0.06, 0.06),
+              power_scales=(1.0, 1.15, 1.3, 1.5)):
+        table = cls(goals, radius, cell_size)
+        for column in range(table.columns):
+            for row in range(table.rows):
+                x = min(max((column + 0.5) * cell_size, radius), WIDTH - radius)
+                y = min(max((row + 0.5) * cell_size, radius), HEIGHT - radius)
+                for goal_idx, goal in enumerate(table.goals):
+                    table.entries[(column, row, goal_idx)] = table.solve(x, y, goal, angle_offsets, power_scales)
+        return table
+
+    def solve(self, x, y, goal, angle_offsets, power_scales):
+        direct = AimOption(DIRECT, 0.0, 1.0, False, 0)
+        angle, power = option_shot(direct, x, y, goal, self.radius)
+        outcome = predict(x, y, angle, power, self.radius, goal)
+        options = [direct._replace(captured=outcome.captured, frames=outcome.frames)]
+        for wall in (LEFT, RIGHT, TOP, BOTTOM):
+            target = mirror(goal, wall, self.radius)
+            if stopping_power(math.hypot(target[0] - x, target[1] - y)) >= MAX_VELOCITY * max(power_scales):
+                continue  # Out of reach even at full power
+            found = None
+            for offset in angle_offsets:
+                for scale in power_scales:
+                    option = AimOption(wall, offset, scale, True, 0)
+                    angle, power = option_shot(option, x, y, goal, self.radius)
+                    outcome = predict(x, y, angle, power, self.radius, goal)
+                    # Only shots that actually come off this wall count as its bank shot
+                    if outcome.captured and len(outcome.path) > 1:
+                        found = option._replace(frames=outcome.frames)
+                        break
+                if found is not None:
+                    break
+            if found is not None:
+                options.append(found)
+        options.sort(key=lambda option: (not option.captured, option.frames))
+        return tuple(options)
+
+    def to_dict(self):
+        return {
+            "version": AIM_TABLE_VERSION,
+            "goals": [list(goal) for goal in self.goals],
+            "radius": self.radius,
+            "cell_size": self.cell_size,
+            "friction": FRICTION,
+            "max_velocity": MAX_VELOCITY,
+            "entries": [list(key) + [list(option) for option in options] for key, options in self.entries.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != AIM_TABLE_VERSION:
+            raise ValueError(f"Unsupported aim table version: {data.get('version')}")
+        if data["friction"] != FRICTION or data["max_velocity"] != MAX_VELOCITY:
+            raise ValueError("Aim table was built for different physics")
+        entries = {
+            tuple(item[:3]): tuple(AimOption(*option) for option in item[3:])
+            for item in data["entries"]
+        }
+        return cls(data["goals"], data["radius"], data["cell_size"], entries)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def load_or_build(cls, goals, radius=PUCK_RADIUS, path=None):
+        # The table on disk when it matches these goals and radius, else a fresh one
+        # (written to path for next time)
+        if path is not None and os.path.exists(path):
+            try:
+                table = cls.load(path)
+            except (ValueError, KeyError):
+                table = None
+            if table is not None and table.goals == [tuple(goal) for goal in goals] and table.radius == radius:
+                return table
+        table = cls.build(goals, radius)
+        if path is not None:
+            table.save(path)
+        return table
+
+def path_blocked(path, pucks, skip, radius):
+    # Whether any other active puck lies within reach of the path's straight segments
+    for k, puck in enumerate(pucks):
+        if k == skip or not puck.active:
+            continue
+        reach = radius * 2
+        for (x1, y1), (x2, y2) in zip(path, path[1:]):
+            dx = x2 - x1
+            dy = y2 - y1
+            length2 = dx*dx + dy*dy
+            t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((puck.x - x1) * dx + (puck.y - y1) * dy) / length2))
+            if math.hypot(x1 + t * dx - puck.x, y1 + t * dy - puck.y) < reach:
+                return True
+    return False
+
+class AimTableAI:
+    """Instant shots from the aim table, simulating only when a puck is in the way
+
+    Every own puck is looked up in the table; the first option whose predicted path
+    is clear of other pucks and scores is played at once. Without one, clear shots
+    are scored from their predicted resting point and blocked ones are resolved with
+    PucketEngine.resolve_shot, at most max_simulations of them. The predictions only
+    know the screen edges, so on a layout with obstacles every option is resolved.
+
+    Given goals (and no table), the table is loaded from table_path or built right
+    away, so no decision pays for it; otherwise the first decision builds it.
+    """
+    def __init__(self, table=None, table_path=None, max_simulations=8, goals=None, radius=PUCK_RADIUS):
+        if table is None and goals is not None:
+            table = AimTable.load_or_build(goals, radius, table_path)
+        self.table = table
+        self.table_path = table_path
+        self.max_simulations = max_simulations
+
+    def choose_shot(self, state, goals):
+        player_idx = state.current_player_idx
+        goal = goals[player_idx]
+        if self.table is None or self.table.goals != [tuple(g) for g in goals] or self.table.radius != state.puck_radius:
+            self.table = AimTable.load_or_build(goals, state.puck_radius, self.table_path)
+
+        best_shot, best_score = None, -math.inf
+        blocked = []
+        obstacles = state.layout is not None and not state.layout.empty
+        for k, puck in enumerate(state.pucks):
+            if not puck.active or puck.player_id != player_idx:
+                continue
+            for rank, option in enumerate(self.table.options(puck.x, puck.y, player_idx)):
+                angle, power = option_shot(option, puck.x, puck.y, goal, state.puck_radius)
+                shot = Shot(k, angle, power)
+                if obstacles:
+                    blocked.append((rank, shot))
+                    continue
+                outcome = predict(puck.x, puck.y, angle, power, state.puck_radius, goal)
+                if path_blocked(outcome.path + [(outcome.x, outcome.y)], state.pucks, k, state.puck_radius):
+                    blocked.append((rank, shot))
+                    continue
+                if outcome.captured:
+                    return shot
+                # Clear approach shot: progress towards the goal
+                score = DISTANCE_WEIGHT * (
+                    math.hypot(puck.x - goal[0], puck.y - goal[1]) -
+                    math.hypot(outcome.x - goal[0], outcome.y - goal[1])
+                )
+                if score > best_score:
+                    best_shot, best_score = shot, score
+
+        if blocked:
+            if obstacles:
+                # Every puck's best options first, rather than all of the first puck's
+                blocked.sort(key=lambda item: item[0])
+            engine = PucketEngine.from_state(state, ai_players=())
+            for _, shot in blocked[:self.max_simulations]:
+                engine.load_state(state)
+                result = engine.resolve_shot(engine.pucks[shot.puck_index], shot.angle, shot.power)
+                score = shot_score(state, result.state, goals, player_idx)
+                # A losing shot (-inf) is still played when there is nothing else
+                if best_shot is None or score > best_score:
+                    best_shot, best_score = shot, score
+        return best_shot
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an aim table and check its predictions")
+    parser.add_argument("path", help="file to write the table to")
+    parser.add_argument("--radius", type=float, default=PUCK_RADIUS)
+    args = parser.parse_args()
+
+    engine = PucketEngine(ai_players=(), puck_radius=args.radius, record_shots=False)
+    started = time.perf_counter()
+    table = AimTable.build(engine.goals, args.radius)
+    table.save(args.path)
+    scoring = sum(1 for options in table.entries.values() if options and options[0].captured)
+    print(f"{len(table.entries)} entries in {time.perf_counter() - started:.1f}s, "
+          f"{scoring} with a scoring shot, written to {args.path}")
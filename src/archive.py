@@ -0,0 +1,238 @@
+import argparse
+import mmap
+import os
+import struct
+
+from engine import PuckState, BoardState, Shot
+
+# File layout (little-endian):
+#   header     magic, version, puck count, players, puck radius
+#   records    one per turn: a keyframe (every puck) or a delta (pucks changed since
+#              the previous turn), both led by the shot that produced the turn
+#   index      one u64 file offset per turn
+#   footer     index offset, turn count, end magic
+# A file without a footer (still being written, or cut short) is read by scanning.
+MAGIC = b"PCKA"
+END_MAGIC = b"PCKX"
+ARCHIVE_VERSION = 1
+
+KEYFRAME, DELTA = 0, 1
+NO_SHOT = 0xFFFF
+NO_WINNER = -1
+
+HEADER = struct.Struct("<4sHHBf")                # magic, version, pucks, players, radius
+RECORD = struct.Struct("<BI")                    # kind, payload length
+SHOT = struct.Struct("<Hdd")                     # puck index, angle, power (exact)
+BOARD = struct.Struct("<IBBb")                   # frame, player to move, game over, winner
+PUCK = struct.Struct("<ffffB")                   # x, y, vx, vy, flags
+CHANGED = struct.Struct("<H")                    # count or puck index in deltas
+OFFSET = struct.Struct("<Q")
+FOOTER = struct.Struct("<QI4s")                  # index offset, turns, end magic
+
+ACTIVE_FLAG = 0x01
+PLAYER_SHIFT = 1
+
+def pack_puck(puck):
+    flags = (ACTIVE_FLAG if puck.active else 0) | (puck.player_id << PLAYER_SHIFT)
+    return PUCK.pack(puck.x, puck.y, puck.vx, puck.vy, flags)
+
+def unpack_puck(buffer, offset):
+    x, y, vx, vy, flags = PUCK.unpack_from(buffer, offset)
+    return PuckState(x, y, vx, vy, bool(flags & ACTIVE_FLAG), flags >> PLAYER_SHIFT)
+
+class ArchiveWriter:
+    """Streams turns of one or more games to a binary archive
+
+    Each turn is written as soon as it is given, so a crashed writer still leaves a
+    readable file. Positions and velocities are stored as float32; shots keep their
+    full precision. close() appends the turn index that lets readers seek.
+    """
+    def __init__(self, path, num_pucks, puck_radius, num_players=2, keyframe_interval=32):
+        self.file = open(path, "wb")
+        self.num_pucks = num_pucks
+        self.num_players = num_players
+        self.keyframe_interval = keyframe_interval
+        self.scores = struct.Struct(f"<{num_players}H")
+        self.offsets = []
+        self.previous = None  # Packed pucks of the last turn written
+        self.since_keyframe = 0
+        self.file.write(HEADER.pack(MAGIC, ARCHIVE_VERSION, num_pucks, num_players, puck_radius))
+
+    def write_turn(self, state, shot=None, frame=0):
+        # A turn without a shot starts a new game and is always a keyframe
+        if len(state.pucks) != self.num_pucks:
+            raise ValueError(f"Archive holds {self.num_pucks} pucks per board, got {len(state.pucks)}")
+        packed = [pack_puck(puck) for puck in state.pucks]
+        keyframe = shot is None or self.previous is None or self.since_keyframe >= self.keyframe_interval
+
+        winner = state.winner_id if state.winner_id is not None else NO_WINNER
+        parts = [
+            SHOT.pack(*shot) if shot is not None else SHOT.pack(NO_SHOT, 0.0, 0.0),
+            BOARD.pack(frame, state.current_player_idx, state.game_over, winner),
+            self.scores.pack(*state.scores),
+        ]
+        if keyframe:
+            parts.extend(packed)
+            self.since_keyframe = 0
+        else:
+            changed = [k for k, record in enumerate(packed) if record != self.previous[k]]
+            parts.append(CHANGED.pack(len(changed)))
+            for k in changed:
+                parts.append(CHANGED.pack(k))
+                parts.append(packed[k])
+            self.since_keyframe += 1
+        payload = b"".join(parts)
+
+        self.offsets.append(self.file.tell())
+        self.file.write(RECORD.pack(KEYFRAME if keyframe else DELTA, len(payload)))
+        self.file.write(payload)
+        self.previous = packed
+
+    def close(self):
+        if self.file.closed:
+            return
+        index_offset = self.file.tell()
+        self.file.write(b"".join(OFFSET.pack(offset) for offset in self.offsets))
+        self.file.write(FOOTER.pack(index_offset, len(self.offsets), END_MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ArchiveReader:
+    """Memory-mapped reader: len(reader) turns, reader.turn(t) or iterate with turns()
+
+    turn(t) decodes from the nearest keyframe at or before t, so any turn is reached
+    without reading the ones before that keyframe. Turns are (shot, BoardState, frame);
+    the shot is None where a game starts.
+    """
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.num_pucks, self.num_players, self.puck_radius = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a Pucket archive")
+        if version != ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported archive version: {version}")
+        self.scores = struct.Struct(f"<{self.num_players}H")
+        self.offsets = self.read_index()
+
+    def read_index(self):
+        # The footer's index when the file was closed, else a scan of the records
+        size = len(self.buffer)
+        if size >= HEADER.size + FOOTER.size:
+            index_offset, count, end = FOOTER.unpack_from(self.buffer, size - FOOTER.size)
+            if end == END_MAGIC:
+                return [OFFSET.unpack_from(self.buffer, index_offset + k * OFFSET.size)[0] for k in range(count)]
+        offsets = []
+        offset = HEADER.size
+        while offset + RECORD.size <= size:
+            _, length = RECORD.unpack_from(self.buffer, offset)
+            if offset + RECORD.size + length > size:
+                break  # Last record only partly written
+            offsets.append(offset)
+            offset += RECORD.size + length
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def decode(self, offset, pucks):
+        # Decode the record at offset on top of the previous turn's pucks (a list,
+        # updated in place) and return (shot, state, frame)
+        kind, _ = RECORD.unpack_from(self.buffer, offset)
+        offset += RECORD.size
+        puck_index, angle, power = SHOT.unpack_from(self.buffer, offset)
+        offset += SHOT.size
+        frame, current, game_over, winner = BOARD.unpack_from(self.buffer, offset)
+        offset += BOARD.size
+        scores = self.scores.unpack_from(self.buffer, offset)
+        offset += self.scores.size
+
+        if kind == KEYFRAME:
+            pucks[:] = [unpack_puck(self.buffer, offset + k * PUCK.size) for k in range(self.num_pucks)]
+        else:
+            (count,) = CHANGED.unpack_from(self.buffer, offset)
+            offset += CHANGED.size
+            for _ in range(count):
+                (k,) = CHANGED.unpack_from(self.buffer, offset)
+                pucks[k] = unpack_puck(self.buffer, offset + CHANGED.size)
+                offset += CHANGED.size + PUCK.size
+
+        shot = Shot(puck_index, angle, power) if puck_index != NO_SHOT else None
+        state = BoardState(
+            tuple(pucks), scores, current, bool(game_over),
+            winner if winner != NO_WINNER else None, self.puck_radius
+        )
+        return shot, state, frame
+
+    def turns(self, start=0, stop=None):
+        # Generator over turns start..stop-1, decoding each record once
+        stop = len(self.offsets) if stop is None else min(stop, len(self.offsets))
+        if start >= stop:
+            return
+        keyframe = start
+        while RECORD.unpack_from(self.buffer, self.offsets[keyframe])[0] != KEYFRAME:
+            keyframe -= 1
+        pucks = []
+        for t in range(keyframe, stop):
+            turn = self.decode(self.offsets[t], pucks)
+            if t >= start:
+                yield turn
+
+    def turn(self, t):
+        if t < 0:
+            t += len(self.offsets)
+        if not 0 <= t < len(self.offsets):
+            raise IndexError("turn out of range")
+        return next(self.turns(t, t + 1))
+
+    def __iter__(self):
+        return self.turns()
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def archive_replays(paths, out, keyframe_interval=32):
+    # Re-run JSON replay logs and store every turn of them in one archive
+    from replay import ReplayLog, turns
+
+    writer = None
+    for path in paths:
+        log = ReplayLog.load(path)
+        if writer is None:
+            num_pucks = 2 * log.num_pucks_per_player
+            writer = ArchiveWriter(out, num_pucks, log.puck_radius, keyframe_interval=keyframe_interval)
+        for shot, state, frame in turns(log):
+            writer.write_turn(state, shot, frame)
+    if writer is not None:
+        writer.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write or inspect binary Pucket match archives")
+    parser.add_argument("archive", help="archive file")
+    parser.add_argument("replays", nargs="*", help="JSON replay logs to store in the archive")
+    parser.add_argument("--turn", type=int, default=None, help="print the board at this turn")
+    args = parser.parse_args()
+
+    if args.replays:
+        archive_replays(args.replays, args.archive)
+    with ArchiveReader(args.archive) as reader:
+        games = sum(1 for offset in reader.offsets if SHOT.unpack_from(reader.buffer, offset + RECORD.size)[0] == NO_SHOT)
+        size = os.path.getsize(args.archive)
+        print(f"{len(reader)} turns in {games} games, {reader.num_pucks} pucks per board, {size} bytes")
+        if args.turn is not None:
+            shot, state, frame = reader.turn(args.turn)
+            print(f"turn {args.turn} (frame {frame}): shot {shot}, scores {state.scores}, to move {state.current_player_idx}")
+            for k, puck in enumerate(state.pucks):
+                print(f"  {k}: ({puck.x:.1f}, {puck.y:.1f}) v=({puck.vx:.2f}, {puck.vy:.2f}) active={puck.active} player={puck.player_id}")
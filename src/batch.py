@@ -0,0 +1,329 @@
+import random
+from collections import namedtuple
+
+from vector_physics import (
+    np, require_numpy, WALL_RESTITUTION, COLLISION_IMPULSE, CAPTURE_RADIUS, STOP_SPEED
+)
+from engine import WIDTH, HEIGHT, PUCK_RADIUS, FRICTION, MAX_VELOCITY
+
+# Per-board outcome of one BatchSimulator.step call
+BatchStepResult = namedtuple("BatchStepResult", "scores captured at_rest game_over winner")
+
+class BatchSimulator:
+    """Advances N independent boards in lock step with one set of array operations
+
+    Every board has the same number of pucks. Positions and velocities are (N, n, 2)
+    arrays, active is (N, n) and the turn state (current player, move made, stopped
+    frames, cooldown) is one array entry per board, mirroring PucketEngine.manage_turns.
+    Isolated contacts are resolved simultaneously across all boards; chained contacts on
+    small boards fall back to the scalar pair order, so trajectories match the engine.
+    Pucks that land on the same spot are nudged apart by the board's own rng in that
+    order too; from_engines copies each engine's rng, so the nudges match as well.
+    Boards of more than max_ordered_pucks pucks resolve every contact at once, ignoring
+    the pair order and the rng, and no longer follow the engine once contacts chain or
+    pucks coincide.
+    """
+    def __init__(self, pos, vel, active, owner, goals, num_players=2, radius=PUCK_RADIUS, rngs=None):
+        require_numpy()
+        # C order, even from broadcast inputs: resolve_batch updates flat views of these
+        self.pos = np.array(pos, dtype=np.float64, order="C")
+        self.vel = np.array(vel, dtype=np.float64, order="C")
+        self.active = np.array(active, dtype=bool)
+        self.num_boards, self.num_pucks = self.active.shape
+        self.num_players = num_players
+
+        # Owner and goals may be shared by every board or given per board
+        self.owner = np.broadcast_to(np.asarray(owner, dtype=np.intp), self.active.shape).copy()
+        goals = np.asarray(goals, dtype=np.float64)
+        self.goals = np.broadcast_to(goals, (self.num_boards,) + goals.shape[-2:]).copy()
+        # The hole each puck is captured by
+        self.targets = self.goals[np.arange(self.num_boards)[:, None], self.owner]
+        self.radius = radius
+        self.reach = 3 * radius
+        self.pair_i, self.pair_j = np.triu_indices(self.num_pucks, k=1)
+        # One random.Random per board for the nudges; a board given none gets
+        # random.Random(0) when it first needs one
+        self.rngs = list(rngs) if rngs is not None else [None] * self.num_boards
+
+        # Boards up to this many pucks resolve chained contacts in the scalar engine's
+        # order; bigger boards resolve every contact simultaneously, which is faster but
+        # sends pile-ups elsewhere than the engine does
+        self.max_ordered_pucks = 32
+
+        # Scoring and turn state, one entry per board
+        self.scores = np.zeros((self.num_boards, num_players), dtype=np.int64)
+        self.current_player = np.zeros(self.num_boards, dtype=np.intp)
+        self.move_made = np.zeros((self.num_boards, num_players), dtype=bool)
+        self.all_stopped_frames = np.zeros(self.num_boards, dtype=np.int64)
+        self.turn_cooldown = np.zeros(self.num_boards, dtype=np.int64)
+        self.game_over = np.zeros(self.num_boards, dtype=bool)
+        self.winner = np.full(self.num_boards, -1, dtype=np.intp)
+        self.turn_cooldown_duration = 30
+        self.required_stopped_frames = 30
+        self.frame = 0
+
+    @classmethod
+    def from_engines(cls, engines):
+        # Stack the current state of several PucketEngines, which must have equal puck counts
+        boards = [[puck for player in engine.players for puck in player.pucks] for engine in engines]
+        batch = cls(
+            [[puck.position for puck in pucks] for pucks in boards],
+            [[puck.velocity for puck in pucks] for pucks in boards],
+            [[puck.active for puck in pucks] for pucks in boards],
+            [[puck.player_id for puck in pucks] for pucks in boards],
+            [engine.goals for engine in engines],
+            num_players=len(engines[0].players),
+            radius=engines[0].puck_radius,
+            rngs=[random.Random() for _ in engines]
+        )
+        for b, engine in enumerate(engines):
+            # Draw the same nudges as the engine from here on
+            batch.rngs[b].setstate(engine.rng.getstate())
+            batch.scores[b] = [player.score for player in engine.players]
+            batch.move_made[b] = [player.move_made for player in engine.players]
+            batch.current_player[b] = engine.current_player_idx
+            batch.all_stopped_frames[b] = engine.all_stopped_frames
+            batch.turn_cooldown[b] = engine.turn_cooldown
+            batch.game_over[b] = engine.game_over
+            if engine.winner is not None:
+                batch.winner[b] = engine.winner.id
+        batch.turn_cooldown_duration = engines[0].turn_cooldown_duration
+        batch.required_stopped_frames = engines[0].required_stopped_frames
+        return batch
+
+    @classmethod
+    def replicate(cls, engine, count):
+        # N copies of one engine's board, e.g. to try N candidate shots from one position
+        return cls.from_engines([engine] * count)
+
+    def write_back(self, board, engine):
+        # Copy one board's state back into a PucketEngine with the same layout
+        pucks = [puck for player in engine.players for puck in player.pucks]
+        for k, puck in enumerate(pucks):
+            puck.position = (float(self.pos[board, k, 0]), float(self.pos[board, k, 1]))
+            puck.velocity = (float(self.vel[board, k, 0]), float(self.vel[board, k, 1]))
+            puck.active = bool(self.active[board, k])
+        for player in engine.players:
+            player.score = int(self.scores[board, player.id])
+            player.move_made = bool(self.move_made[board, player.id])
+        engine.current_player_idx = int(self.current_player[board])
+        engine.all_stopped_frames = int(self.all_stopped_frames[board])
+        engine.turn_cooldown = int(self.turn_cooldown[board])
+        engine.game_over = bool(self.game_over[board])
+        engine.winner = engine.players[self.winner[board]] if self.winner[board] >= 0 else None
+
+    def keep(self, boards):
+        # Drop every board but the given ones (indices or a mask), e.g. to stop stepping
+        # boards that are done
+        for name in ("pos", "vel", "active", "owner", "goals", "targets", "scores", "current_player", "move_made",
+                     "all_stopped_frames", "turn_cooldown", "game_over", "winner"):
+            setattr(self, name, getattr(self, name)[boards])
+        self.rngs = [self.rngs[b] for b in np.arange(len(self.rngs))[boards]]
+        self.num_boards = len(self.active)
+
+    def launch(self, boards, pucks, angles, powers):
+        # Launch one puck on each of the given boards and mark the mover's turn as played
+        boards = np.asarray(boards, dtype=np.intp)
+        pucks = np.broadcast_to(np.asarray(pucks, dtype=np.intp), boards.shape)
+        angles = np.broadcast_to(np.asarray(angles, dtype=np.float64), boards.shape)
+        powers = np.minimum(np.broadcast_to(np.asarray(powers, dtype=np.float64), boards.shape), MAX_VELOCITY)
+        live = self.active[boards, pucks]
+        boards, pucks, angles, powers = boards[live], pucks[live], angles[live], powers[live]
+        self.vel[boards, pucks, 0] = powers * np.cos(angles)
+        self.vel[boards, pucks, 1] = powers * np.sin(angles)
+        self.move_made[boards, self.current_player[boards]] = True
+        self.all_stopped_frames[boards] = 0
+
+    def step(self):
+        # One frame on every board
+        self.frame += 1
+        self.integrate()
+        self.collide()
+        captured = self.capture()
+        at_rest = self.at_rest()
+        self.manage_turns()
+        self.check_winners()
+        return BatchStepResult(self.scores, captured, at_rest, self.game_over, self.winner)
+
+    def run(self, frames):
+        result = None
+        for _ in range(frames):
+            result = self.step()
+        return result
+
+    def integrate(self):
+        active = self.active[..., None]
+        self.vel = np.where(active, self.vel * FRICTION, self.vel)
+        self.pos = np.where(active, self.pos + self.vel, self.pos)
+
+        low = self.radius
+        high = np.array((WIDTH - self.radius, HEIGHT - self.radius), dtype=np.float64)
+        out = ((self.pos < low) | (self.pos > high)) & active
+        self.pos = np.where(out, np.clip(self.pos, low, high), self.pos)
+        self.vel = np.where(out, -self.vel * WALL_RESTITUTION, self.vel)
+
+    def collide(self):
+        if len(self.pair_i) == 0:
+            return
+
+        if self.num_pucks > self.max_ordered_pucks:
+            self.collide_unordered()
+            return
+
+        # Candidate pairs as in the scalar broad phase (see VectorPhysics.collide)
+        i, j = self.pair_i, self.pair_j
+        d = self.pos[:, j] - self.pos[:, i]
+        distance2 = (d * d).sum(axis=2)
+        moving = self.moving()
+        candidate = self.active[:, i] & self.active[:, j] & (moving[:, i] | moving[:, j]) & (distance2 < self.reach * self.reach)
+        distance = np.sqrt(distance2)
+        touching = candidate & (distance < 2 * self.radius)
+        if not touching.any():
+            return
+
+        # Boards where a contact shares a puck with another candidate pair depend on the
+        # resolution order and are resolved in the scalar engine's pair order, as are
+        # boards with pucks on the same spot, whose nudges are drawn in that order
+        counts = np.zeros((self.num_boards, self.num_pucks), dtype=np.int64)
+        board, pair = np.nonzero(candidate)
+        np.add.at(counts, (board, i[pair]), 1)
+        np.add.at(counts, (board, j[pair]), 1)
+        crowded = counts > 1
+        ordered = (touching & (crowded[:, i] | crowded[:, j] | (distance < 0.0001))).any(axis=1)
+        if ordered.any():
+            self.resolve_sequential(np.flatnonzero(ordered), candidate[ordered])
+            touching &= ~ordered[:, None]
+
+        board, pair = np.nonzero(touching)
+        if len(board):
+            self.resolve_batch(board, pair, d[board, pair], distance[board, pair])
+
+    def collide_unordered(self):
+        # Every contact resolved at once, measuring only the pairs with a moving puck:
+        # the same contacts as collide() finds (touching is always within the reach),
+        # but not resolved in the engine's order
+        moving = self.moving()
+        i, j = self.pair_i, self.pair_j
+        board, pair = np.nonzero((moving[:, i] | moving[:, j]) & self.active[:, i] & self.active[:, j])
+        if len(board) == 0:
+            return
+        d = self.pos[board, j[pair]] - self.pos[board, i[pair]]
+        distance2 = (d * d).sum(axis=1)
+        touching = distance2 < (2 * self.radius) ** 2
+        if touching.any():
+            self.resolve_batch(board[touching], pair[touching], d[touching], np.sqrt(distance2[touching]))
+
+    def resolve_batch(self, board, pair, d, distance):
+        # Resolve every contact at once, summing impulses on pucks in several contacts
+        # Flat puck indices across all boards
+        i = board * self.num_pucks + self.pair_i[pair]
+        j = board * self.num_pucks + self.pair_j[pair]
+
+        coincident = distance < 0.0001
+        safe = np.where(coincident, 1.0, distance)
+        normal = np.where(coincident[:, None], (1.0, 0.0), d / safe[:, None])
+        distance = np.where(coincident, 0.0, distance)
+
+        vel = self.vel.reshape(-1, 2)
+        pos = self.pos.reshape(-1, 2)
+        vn = ((vel[i] - vel[j]) * normal).sum(axis=1)
+        approaching = vn <= 0
+        i, j, normal, vn, distance = i[approaching], j[approaching], normal[approaching], vn[approaching], distance[approaching]
+        if len(i) == 0:
+            return
+
+        impulse = (-COLLISION_IMPULSE * vn / 2)[:, None] * normal
+        overlap = (0.5 * (2 * self.radius - distance))[:, None] * normal
+        size = len(vel)
+        for axis in range(2):
+            vel[:, axis] += np.bincount(i, impulse[:, axis], size) - np.bincount(j, impulse[:, axis], size)
+            pos[:, axis] += np.bincount(j, overlap[:, axis], size) - np.bincount(i, overlap[:, axis], size)
+
+    def resolve_sequential(self, boards, candidate):
+        # The scalar engine's pair-by-pair pass, vectorized across the given boards
+        pos = self.pos[boards]
+        vel = self.vel[boards]
+        limit = 2 * self.radius
+        for p in np.flatnonzero(candidate.any(axis=0)):
+            a = self.pair_i[p]
+            b = self.pair_j[p]
+            live = candidate[:, p]
+            d = pos[:, b] - pos[:, a]
+            distance = np.sqrt((d * d).sum(axis=1))
+            coincident = live & (distance < 0.0001)
+            if coincident.any():
+                for row in np.flatnonzero(coincident):
+                    rng = self.board_rng(boards[row])
+                    pos[row, b, 0] += rng.uniform(0.1, 1.0)
+                    pos[row, b, 1] += rng.uniform(0.1, 1.0)
+                d = pos[:, b] - pos[:, a]
+                distance = np.sqrt((d * d).sum(axis=1))
+            hit = live & (distance < limit)
+            if not hit.any():
+                continue
+            normal = d[hit] / distance[hit, None]
+            vn = ((vel[hit, a] - vel[hit, b]) * normal).sum(axis=1)
+            approaching = vn <= 0
+            rows = np.flatnonzero(hit)[approaching]
+            normal = normal[approaching]
+            impulse = (-COLLISION_IMPULSE * vn[approaching] / 2)[:, None] * normal
+            overlap = (0.5 * (limit - distance[rows]))[:, None] * normal
+            vel[rows, a] += impulse
+            vel[rows, b] -= impulse
+            pos[rows, a] -= overlap
+            pos[rows, b] += overlap
+        self.pos[boards] = pos
+        self.vel[boards] = vel
+
+    def board_rng(self, board):
+        if self.rngs[board] is None:
+            self.rngs[board] = random.Random(0)
+        return self.rngs[board]
+
+    def capture(self):
+        d = self.pos - self.targets
+        captured = self.active & ((d * d).sum(axis=2) < CAPTURE_RADIUS * CAPTURE_RADIUS)
+        if captured.any():
+            self.active &= ~captured
+            board, puck = np.nonzero(captured)
+            np.add.at(self.scores, (board, self.owner[board, puck]), 1)
+        return captured
+
+    def moving(self):
+        return (np.abs(self.vel) >= STOP_SPEED).any(axis=2) & self.active
+
+    def at_rest(self):
+        return ~self.moving().any(axis=1)
+
+    def manage_turns(self):
+        # Vectorized PucketEngine.manage_turns: only the current player's pucks count
+        cooling = self.turn_cooldown > 0
+        self.turn_cooldown[cooling] -= 1
+
+        mine = self.owner == self.current_player[:, None]
+        stopped = ~(self.moving() & mine).any(axis=1)
+        moved = self.move_made[np.arange(self.num_boards), self.current_player]
+        counting = ~cooling & stopped & moved
+        self.all_stopped_frames[counting] += 1
+
+        switch = counting & (self.all_stopped_frames >= self.required_stopped_frames)
+        if switch.any():
+            self.all_stopped_frames[switch] = 0
+            self.current_player[switch] = (self.current_player[switch] + 1) % self.num_players
+            self.move_made[switch, self.current_player[switch]] = False
+            self.turn_cooldown[switch] = self.turn_cooldown_duration
+
+    def check_winners(self):
+        # A player with no active pucks left has scored them all; the highest id wins ties
+        finished = np.stack([
+            ~(self.active & (self.owner == player)).any(axis=1) for player in range(self.num_players)
+        ], axis=1)
+        done = finished.any(axis=1)
+        self.game_over |= done
+        last = self.num_players - 1 - np.argmax(finished[:, ::-1], axis=1)
+        self.winner = np.where(done, last, self.winner)
+
+    def ready(self):
+        # Boards waiting for the current player's shot
+        moved = self.move_made[np.arange(self.num_boards), self.current_player]
+        return ~self.game_over & ~moved & (self.turn_cooldown == 0)
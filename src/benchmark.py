@@ -0,0 +1,344 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from engine import PucketEngine, MAX_VELOCITY, dense_radius
+from difficulty import PROFILES, ProfileAI
+
+BENCHMARK_VERSION = 1
+
+# Relative change allowed before a metric counts as a regression
+DEFAULT_THRESHOLD = 0.15
+# Peak memory changes smaller than this are noise from allocator caches, not growth
+MEMORY_SLACK_KB = 64
+
+class Skip(Exception):
+    """Raised by a scenario's setup when it cannot run here (e.g. no pygame)"""
+
+# Scenarios: setup(seed) returns (work, unit), where work() runs the measured
+# workload once and returns how many units (frames or decisions) it did. A work
+# that times each decision keeps the times in work.latencies (ms), and one with a
+# latency guarantee states it as work.p99_limit_ms. work.search_stats(), when set,
+# returns extra metrics of the timed run (the minimax search statistics)
+
+def opening(seed):
+    # The default 5-puck game, AI vs AI with the heuristic AI, for a fixed span
+    engine = PucketEngine(ai_players=(0, 1), seed=seed, record_shots=False)
+    def work():
+        engine.run(3000)
+        return engine.frame
+    return work, "frame"
+
+def dense_board(pucks_per_player, frames):
+    def setup(seed):
+        # Every puck of the first player launched at once into a crowded board, the
+        # pucks as large as the start grid allows
+        engine = PucketEngine(ai_players=(), num_pucks_per_player=pucks_per_player,
+                              puck_radius=dense_radius(pucks_per_player), seed=seed, record_shots=False)
+        rng = random.Random(seed)
+        for puck in engine.players[0].pucks:
+            puck.launch(rng.uniform(-math.pi, math.pi), rng.uniform(0.5, 1.0) * MAX_VELOCITY)
+        def work():
+            for _ in range(frames):
+                engine.update_game_state()
+            return frames
+        return work, "frame"
+    return setup
+
+def obstacle_board(count):
+    def setup(seed):
+        # Physics frames of ten pucks shot across a board of count bumpers, restarted
+        # every 30 frames; the static index should keep the cost flat as count grows
+        engine = PucketEngine(ai_players=(), seed=seed, record_shots=False, layout=f"scattered_{count}")
+        rng = random.Random(seed)
+        for puck in engine.pucks:
+            puck.position = (rng.uniform(60, 740), rng.uniform(60, 540))
+            puck.launch(rng.uniform(-math.pi, math.pi), MAX_VELOCITY)
+        start = engine.snapshot()
+        def work():
+            for frame in range(3000):
+                if frame % 30 == 0:
+                    engine.load_state(start)
+                engine.physics_step(engine.pucks)
+            return 3000
+        return work, "frame"
+    return setup
+
+def long_roll(seed):
+    # Full-power bank shots resolved to rest: long runs with wall bounces
+    engine = PucketEngine(ai_players=(), seed=seed, record_shots=False)
+    start = engine.snapshot()
+    rng = random.Random(seed)
+    angles = [rng.uniform(-math.pi, math.pi) for _ in range(40)]
+    def work():
+        frames = 0
+        for angle in angles:
+            engine.load_state(start)
+            frames += engine.resolve_shot(engine.pucks[0], angle, MAX_VELOCITY).frames
+        return frames
+    return work, "frame"
+
+def ai_decisions(make_ai, decisions=5):
+    def setup(seed):
+        # Decision latency from the opening board, after one warm-up decision that
+        # starts the AI's workers
+        engine = PucketEngine(ai_players=(), seed=seed, record_shots=False)
+        state = engine.snapshot()
+        ai = make_ai(seed)
+        ai.choose_shot(state, engine.goals)
+        stats = []
+        def work():
+            for _ in range(decisions):
+                ai.choose_shot(state, engine.goals)
+                if getattr(ai, "last_stats", None) is not None:
+                    stats.append(ai.last_stats)
+            return decisions
+        if hasattr(ai, "last_stats"):
+            work.search_stats = lambda: search_metrics(stats)
+        if hasattr(ai, "close"):
+            work.close = ai.close
+        return work, "decision"
+    return setup
+
+def search_metrics(stats):
+    # Nodes/sec, transposition table hit rate and shallowest depth over the
+    # SearchStats of a run's decisions
+    elapsed = sum(s.elapsed for s in stats)
+    probes = sum(s.tt_probes for s in stats)
+    return {
+        "search_nodes_per_sec": sum(s.nodes for s in stats) / elapsed if elapsed > 0 else 0.0,
+        "tt_hit_rate": sum(s.tt_hits for s in stats) / probes if probes else 0.0,
+        "search_depth": min((s.depth for s in stats), default=0),
+    }
+
+def montecarlo_ai(seed):
+    from montecarlo import MonteCarloAI
+    return MonteCarloAI(rollouts=64, time_budget=0.2, workers=2, seed=seed)
+
+def minimax_ai(seed):
+    from minimax import AlphaBetaAI
+    return AlphaBetaAI(time_budget=0.2, use_processes=False, max_depth=2)
+
+def aim_ai(seed):
+    from aim import AimTableAI
+    return AimTableAI()
+
+def grid_ai(seed):
+    from candidates import GridAI
+    return GridAI()
+
+def learned_ai(seed):
+    # Untrained weights: ranking costs the same whatever the model learned
+    from learned import LearnedAI, ValueModel
+    return LearnedAI(ValueModel.initial(), seed=seed)
+
+def game_positions(seed, count):
+    # Boards at the start of count turns of seeded games between normal-level AIs
+    engine = PucketEngine(ai_players=(), seed=seed, record_shots=False)
+    ai = ProfileAI("normal", seed)
+    states = []
+    while len(states) < count:
+        if engine.game_over:
+            engine = PucketEngine(ai_players=(), seed=seed + len(states), record_shots=False)
+        state = engine.snapshot()
+        states.append(state)
+        shot = ai.choose_shot(state, engine.goals)
+        engine.resolve_shot(engine.pucks[shot.puck_index], shot.angle, shot.power)
+    return states, engine.goals
+
+def profile_decisions(name, positions=10):
+    def setup(seed):
+        # Every decision of a difficulty profile over the turns of a game, timed one
+        # by one against the profile's p99 latency. The cache starts empty, and the
+        # warm-up decision (which starts the search workers) is on an extra board
+        profile = PROFILES[name]
+        states, goals = game_positions(seed, positions + 1)
+        ai = ProfileAI(profile, seed)
+        ai.choose_shot(states.pop(), goals)
+        latencies = []
+        def work():
+            for state in states:
+                started = time.perf_counter()
+                ai.choose_shot(state, goals)
+                latencies.append(1000.0 * (time.perf_counter() - started))
+            return len(states)
+        work.latencies = latencies
+        work.p99_limit_ms = profile.p99_ms
+        work.close = ai.close
+        return work, "decision"
+    return setup
+
+def render(seed):
+    # Dirty-rect rendering of an AI-vs-AI game to an offscreen display
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    try:
+        import pygame
+        from game import PucketGame
+    except ImportError:
+        raise Skip("pygame is not installed")
+    game = PucketGame(PucketEngine(ai_players=(0, 1), seed=seed, record_shots=False))
+    def work():
+        for _ in range(600):
+            game.engine.step()
+            game.draw_game_state()
+        return 600
+    work.close = pygame.quit
+    return work, "frame"
+
+SCENARIOS = {
+    "opening": opening,
+    "dense_100": dense_board(50, 300),
+    "dense_500": dense_board(250, 60),
+    "obstacles_0": obstacle_board(0),
+    "obstacles_30": obstacle_board(30),
+    "obstacles_300": obstacle_board(300),
+    "long_roll": long_roll,
+    "ai_montecarlo": ai_decisions(montecarlo_ai),
+    "ai_minimax": ai_decisions(minimax_ai),
+    "ai_aim": ai_decisions(aim_ai, decisions=200),
+    "ai_grid": ai_decisions(grid_ai, decisions=3),
+    "ai_learned": ai_decisions(learned_ai, decisions=20),
+    "render": render,
+    **{f"profile_{name}": profile_decisions(name) for name in PROFILES},
+}
+
+def measure(setup, repeat=5, seed=1):
+    """Run one scenario and return its metrics
+
+    Timings are the best of repeat runs, each on a fresh setup, which is the least
+    sensitive to other load on the machine. Peak memory is taken from a separate
+    traced run, so tracing does not slow the timed ones. Per-decision latencies are
+    pooled over all timed runs instead: a p99 has to hold on every run. Search
+    statistics are those of the last timed run.
+    """
+    times = []
+    latencies = []
+    limit = None
+    extra = {}
+    units = 0
+    unit = None
+    for _ in range(repeat):
+        work, unit = setup(seed)
+        started = time.perf_counter()
+        units = work()
+        times.append(time.perf_counter() - started)
+        latencies.extend(getattr(work, "latencies", ()))
+        limit = getattr(work, "p99_limit_ms", None)
+        if hasattr(work, "search_stats"):
+            extra = work.search_stats()
+        getattr(work, "close", lambda: None)()
+
+    work, _ = setup(seed)
+    tracemalloc.start()
+    try:
+        work()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        getattr(work, "close", lambda: None)()
+
+    elapsed = min(times)
+    rate_name = "steps_per_sec" if unit == "frame" else "decisions_per_sec"
+    metrics = {
+        rate_name: units / elapsed,
+        f"ms_per_{unit}": 1000.0 * elapsed / units,
+        "peak_kb": peak / 1024.0,
+    }
+    if latencies:
+        latencies.sort()
+        metrics["p99_ms"] = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    if limit is not None:
+        metrics["p99_limit_ms"] = limit
+    metrics.update(extra)
+    return metrics
+
+def run_benchmarks(names=None, repeat=5, seed=1):
+    results = {
+        "version": BENCHMARK_VERSION,
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "seed": seed,
+        "scenarios": {},
+    }
+    for name in names or SCENARIOS:
+        try:
+            results["scenarios"][name] = measure(SCENARIOS[name], repeat, seed)
+        except Skip as reason:
+            results["scenarios"][name] = {"skipped": str(reason)}
+    return results
+
+def over_limit(results):
+    # Scenarios whose p99 decision latency breaks their stated limit, as readable lines
+    violations = []
+    for name, metrics in results["scenarios"].items():
+        limit = metrics.get("p99_limit_ms")
+        if limit is not None and metrics["p99_ms"] > limit:
+            violations.append(f"{name}.p99_ms: {metrics['p99_ms']:.4g} ms over the {limit:.4g} ms limit")
+    return violations
+
+def higher_is_better(metric):
+    return metric.endswith("_per_sec") or metric in ("tt_hit_rate", "search_depth")
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    # Metrics worse than the baseline by more than threshold, as readable lines
+    regressions = []
+    for name, metrics in results["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if reference is None or "skipped" in metrics or "skipped" in reference:
+            continue
+        for metric, value in metrics.items():
+            base = reference.get(metric)
+            if not base or metric == "p99_limit_ms":
+                continue
+            change = (value - base) / base
+            worse = -change if higher_is_better(metric) else change
+            if metric == "peak_kb" and value - base < MEMORY_SLACK_KB:
+                continue
+            if worse > threshold:
+                regressions.append(f"{name}.{metric}: {base:.4g} -> {value:.4g} ({change:+.1%})")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pucket performance benchmarks")
+    parser.add_argument("scenarios", nargs="*", help="scenarios to run (default: all): " + ", ".join(SCENARIOS))
+    parser.add_argument("--out", metavar="PATH", default=None, help="write the results as JSON to PATH")
+    parser.add_argument("--baseline", metavar="PATH", default=None, help="fail on regressions against this results file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed relative regression (default 0.15)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per scenario")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    results = run_benchmarks(args.scenarios, args.repeat, args.seed)
+    for name, metrics in results["scenarios"].items():
+        if "skipped" in metrics:
+            print(f"{name:14s} skipped: {metrics['skipped']}")
+        else:
+            print(f"{name:14s} " + "  ".join(f"{metric} {value:.4g}" for metric, value in metrics.items()))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    # Latency limits hold on their own, with or without a baseline
+    violations = over_limit(results)
+    for line in violations:
+        print(f"OVER LIMIT {line}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if not regressions:
+            print("no regressions")
+    if regressions or violations:
+        sys.exit(1)
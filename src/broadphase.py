@@ -0,0 +1,107 @@
+import math
+
+class SpatialHash:
+    """Uniform grid broad phase for puck-puck collisions
+
+    Pucks are bucketed by the cell of their centre. A pair is a candidate when both pucks
+    are active, at least one of them is moving and their centres are closer than reach,
+    so pairs of resting pucks are never tested. The cell size equals the reach, which
+    makes the 3x3 block of cells around a puck cover every candidate and the candidate
+    set independent of where the grid lines fall.
+
+    The buckets, scratch lists and result list are kept between calls and reused, so
+    a frame builds no new containers once the grid has seen every cell in use.
+    """
+    def __init__(self, reach):
+        self.reach = reach
+        self.cell_size = reach
+        self.cells = {}  # Cell key -> bucket of puck indices, emptied rather than dropped
+        self.used = []  # Keys of the buckets filled this call
+        self.moving = []  # Indices of the moving pucks this call
+        self.is_moving = bytearray()
+        self.pairs = []
+        # Up to this many (mover, puck) tests the grid is skipped for a direct scan
+        self.direct_limit = 1024
+
+    def candidate_pairs(self, data, indices, count):
+        """Candidate pairs among the pucks in indices (the active ones, ascending)
+
+        data holds x, y, vx, vy of puck k at 4k..4k+3, and count is the number of
+        pucks on the board. Returns a sorted list of pairs, each once and encoded
+        as i * count + j with i < j. The list is reused by the next call.
+        """
+        pairs = self.pairs
+        pairs.clear()
+        moving = self.moving
+        moving.clear()
+        for index in indices:
+            k = 4 * index + 2
+            if abs(data[k]) >= 0.1 or abs(data[k + 1]) >= 0.1:
+                moving.append(index)
+        if not moving:
+            return pairs  # Nothing moves, so nothing can collide
+
+        reach2 = self.reach * self.reach
+        is_moving = self.is_moving
+        if len(is_moving) < count:
+            is_moving.extend(bytes(count - len(is_moving)))
+        for index in moving:
+            is_moving[index] = 1
+
+        if len(moving) * len(indices) <= self.direct_limit:
+            # Few movers: testing each against every puck beats building the grid
+            for i in moving:
+                x = data[4 * i]
+                y = data[4 * i + 1]
+                for j in indices:
+                    if j == i or (j < i and is_moving[j]):
+                        continue
+                    dx = data[4 * j] - x
+                    dy = data[4 * j + 1] - y
+                    if dx*dx + dy*dy < reach2:
+                        pairs.append(i * count + j if i < j else j * count + i)
+            pairs.sort()
+            for index in moving:
+                is_moving[index] = 0
+            return pairs
+
+        cell_size = self.cell_size
+        cells = self.cells
+        used = self.used
+        for key in used:
+            cells[key].clear()
+        used.clear()
+
+        for index in indices:
+            k = 4 * index
+            # Keys pack the cell coordinates into one int
+            key = math.floor(data[k] / cell_size) * 65536 + math.floor(data[k + 1] / cell_size)
+            bucket = cells.get(key)
+            if bucket is None:
+                bucket = cells[key] = []
+            if not bucket:
+                used.append(key)
+            bucket.append(index)
+
+        for i in moving:
+            x = data[4 * i]
+            y = data[4 * i + 1]
+            key = math.floor(x / cell_size) * 65536 + math.floor(y / cell_size)
+            for row in range(key - 65536, key + 65537, 65536):
+                for cell in range(row - 1, row + 2):
+                    bucket = cells.get(cell)
+                    if not bucket:
+                        continue
+                    for j in bucket:
+                        # Moving pairs are emitted by their lower index only
+                        if j == i or (j < i and is_moving[j]):
+                            continue
+                        dx = data[4 * j] - x
+                        dy = data[4 * j + 1] - y
+                        if dx*dx + dy*dy < reach2:
+                            pairs.append(i * count + j if i < j else j * count + i)
+        pairs.sort()
+
+        for index in moving:
+            is_moving[index] = 0
+        return pairs
@@ -0,0 +1,194 @@
+import argparse
+import math
+import time
+from collections import namedtuple
+
+from vector_physics import np, require_numpy
+from batch import BatchSimulator
+from engine import PucketEngine, Shot, MAX_VELOCITY
+from evaluation import shot_score, GOAL_WEIGHT, DISTANCE_WEIGHT, DISPLACEMENT_WEIGHT
+
+# Scores of a launch grid: scores[p, a, w] is the score of launching pucks[p] at
+# angles[p, a] with powers[w], frames the frames each candidate ran for
+CandidateScores = namedtuple("CandidateScores", "scores pucks angles powers frames")
+
+class CandidateEvaluator:
+    """Scores a whole grid of candidate launches as one array batch
+
+    Every (puck, angle, power) candidate gets its own copy of the board in a
+    BatchSimulator, and all copies are stepped together. A candidate drops out of the
+    batch as soon as its board is at rest or the game is over, so the arrays shrink
+    as the shots play out. Scores are evaluation.shot_score, computed on the arrays.
+    """
+    def __init__(self, max_frames=600):
+        require_numpy()
+        self.max_frames = max_frames
+
+    def evaluate(self, state, goals, angles, powers, pucks=None):
+        """Simulate every launch and return CandidateScores
+
+        pucks defaults to the active pucks of the player to move. angles is either one
+        grid shared by all pucks, shape (A,), or one row per puck, shape (P, A).
+        """
+        player_idx = state.current_player_idx
+        if pucks is None:
+            pucks = [k for k, puck in enumerate(state.pucks) if puck.active and puck.player_id == player_idx]
+        pucks = np.asarray(pucks, dtype=np.intp)
+        angles = np.broadcast_to(np.asarray(angles, dtype=np.float64), (len(pucks), np.shape(angles)[-1]))
+        powers = np.minimum(np.asarray(powers, dtype=np.float64), MAX_VELOCITY)
+        shape = (len(pucks), angles.shape[1], len(powers))
+        count = int(np.prod(shape))
+        if count == 0:
+            return CandidateScores(np.zeros(shape), pucks, angles, powers, np.zeros(shape, dtype=np.int64))
+
+        # One board per candidate, launched
+        pos = np.array([(puck.x, puck.y) for puck in state.pucks], dtype=np.float64)
+        vel = np.array([(puck.vx, puck.vy) for puck in state.pucks], dtype=np.float64)
+        active = np.array([puck.active for puck in state.pucks], dtype=bool)
+        owner = np.array([puck.player_id for puck in state.pucks], dtype=np.intp)
+        sim = BatchSimulator(
+            np.broadcast_to(pos, (count,) + pos.shape),
+            np.broadcast_to(vel, (count,) + vel.shape),
+            np.broadcast_to(active, (count,) + active.shape),
+            owner, goals, num_players=len(state.scores), radius=state.puck_radius
+        )
+        # Contacts are resolved all at once: scoring does not need the scalar pair order
+        sim.max_ordered_pucks = 0
+        sim.scores[:] = state.scores
+        sim.current_player[:] = player_idx
+        grid_pucks = np.broadcast_to(pucks[:, None, None], shape).ravel()
+        grid_angles = np.broadcast_to(angles[:, :, None], shape).ravel()
+        grid_powers = np.broadcast_to(powers[None, None, :], shape).ravel()
+        sim.launch(np.arange(count), grid_pucks, grid_angles, grid_powers)
+
+        # Final board of each candidate, filled in as candidates finish
+        final_pos = sim.pos.copy()
+        final_active = sim.active.copy()
+        final_scores = sim.scores.copy()
+        final_won = np.zeros(count, dtype=bool)
+        final_lost = np.zeros(count, dtype=bool)
+        frames = np.zeros(count, dtype=np.int64)
+        ids = np.arange(count)
+        for frame in range(1, self.max_frames + 1):
+            sim.integrate()
+            sim.collide()
+            sim.capture()
+            sim.check_winners()
+            done = sim.at_rest() | sim.game_over
+            if frame == self.max_frames:
+                done[:] = True
+            if done.any():
+                finished = ids[done]
+                final_pos[finished] = sim.pos[done]
+                final_active[finished] = sim.active[done]
+                final_scores[finished] = sim.scores[done]
+                final_won[finished] = sim.game_over[done] & (sim.winner[done] == player_idx)
+                final_lost[finished] = sim.game_over[done] & (sim.winner[done] == (player_idx + 1) % len(state.scores))
+                frames[finished] = frame
+                if done.all():
+                    break
+                sim.keep(~done)
+                ids = ids[~done]
+
+        scores = self.score(state, goals, player_idx, pos, active, owner, final_pos, final_active, final_scores)
+        scores[final_won] = math.inf
+        scores[final_lost] = -math.inf
+        return CandidateScores(scores.reshape(shape), pucks, angles, powers, frames.reshape(shape))
+
+    @staticmethod
+    def score(state, goals, player_idx, pos, active, owner, final_pos, final_active, final_scores):
+        # evaluation.shot_score for a batch of resulting boards
+        opponent_idx = (player_idx + 1) % len(state.scores)
+        goals = np.asarray(goals, dtype=np.float64)
+        score = GOAL_WEIGHT * (final_scores[:, player_idx] - state.scores[player_idx])
+        score = score - GOAL_WEIGHT * (final_scores[:, opponent_idx] - state.scores[opponent_idx])
+
+        both = active[None, :] & final_active
+        own = both & (owner == player_idx)[None, :]
+        other = both & (owner != player_idx)[None, :]
+        own_goal = goals[player_idx]
+        opponent_goal = goals[opponent_idx]
+        progress = np.hypot(*(pos - own_goal).T)[None, :] - np.hypot(*(final_pos - own_goal).transpose(2, 0, 1))
+        pushed = np.hypot(*(final_pos - opponent_goal).transpose(2, 0, 1)) - np.hypot(*(pos - opponent_goal).T)[None, :]
+        score = score + DISTANCE_WEIGHT * np.where(own, progress, 0.0).sum(axis=1)
+        score = score + DISPLACEMENT_WEIGHT * np.where(other, pushed, 0.0).sum(axis=1)
+        return score.astype(np.float64)
+
+def best_shot(result):
+    # The argmax of a score tensor as a Shot, or None for an empty grid
+    if result.scores.size == 0:
+        return None
+    p, a, w = np.unravel_index(np.argmax(result.scores), result.scores.shape)
+    return Shot(int(result.pucks[p]), float(result.angles[p, a]), float(result.powers[w]))
+
+class GridAI:
+    """Scores every (puck, angle, power) of a fixed grid in one batch and plays the best
+
+    Angles are spread around the full circle with extra ones fanned around the
+    straight line to the goal; powers are spread over the launch range. The default
+    grid is 480 candidates with five pucks, about 0.27 s on one core (0.37 s at
+    worst), inside the 0.5 s of the 30 frames the AI thinks for.
+
+    The batch has no obstacles: on a layout with any, the grid only ranks the shots
+    and the top verify of them are resolved on the real board to pick one.
+    """
+    def __init__(self, angles=24, aimed_angles=8, aimed_spread=0.3, powers=(0.5, 0.75, 1.0),
+                 max_frames=600, verify=8):
+        self.evaluator = CandidateEvaluator(max_frames)
+        self.angles = angles
+        self.aimed_angles = aimed_angles
+        self.aimed_spread = aimed_spread
+        self.powers = np.asarray(powers) * MAX_VELOCITY
+        self.verify = verify
+        self.last_result = None
+
+    def grid(self, state, goals, pucks):
+        goal = goals[state.current_player_idx]
+        spread = np.linspace(-math.pi, math.pi, self.angles, endpoint=False)
+        fan = np.linspace(-self.aimed_spread, self.aimed_spread, self.aimed_angles)
+        rows = []
+        for k in pucks:
+            puck = state.pucks[k]
+            direct = math.atan2(goal[1] - puck.y, goal[0] - puck.x)
+            rows.append(np.concatenate((spread, direct + fan)))
+        return np.array(rows).reshape(len(pucks), self.angles + self.aimed_angles)
+
+    def choose_shot(self, state, goals):
+        player_idx = state.current_player_idx
+        pucks = [k for k, puck in enumerate(state.pucks) if puck.active and puck.player_id == player_idx]
+        if not pucks:
+            return None
+        self.last_result = result = self.evaluator.evaluate(state, goals, self.grid(state, goals, pucks), self.powers,
+                                                            pucks)
+        if state.layout is None or state.layout.empty or result.scores.size == 0:
+            return best_shot(result)
+
+        engine = PucketEngine.from_state(state, ai_players=())
+        best, best_score = None, -math.inf
+        for flat in np.argsort(-result.scores, axis=None)[:max(1, self.verify)]:
+            p, a, w = np.unravel_index(flat, result.scores.shape)
+            shot = Shot(int(result.pucks[p]), float(result.angles[p, a]), float(result.powers[w]))
+            engine.load_state(state)
+            outcome = engine.resolve_shot(engine.pucks[shot.puck_index], shot.angle, shot.power)
+            score = shot_score(state, outcome.state, goals, player_idx)
+            if best is None or score > best_score:
+                best, best_score = shot, score
+        return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the vectorized candidate evaluator")
+    parser.add_argument("--angles", type=int, default=64, help="angles per puck")
+    parser.add_argument("--powers", type=int, default=4, help="powers per angle")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    engine = PucketEngine(ai_players=(), seed=args.seed, record_shots=False)
+    state = engine.snapshot()
+    angles = np.linspace(-math.pi, math.pi, args.angles, endpoint=False)
+    powers = np.linspace(MAX_VELOCITY / args.powers, MAX_VELOCITY, args.powers)
+    evaluator = CandidateEvaluator()
+    started = time.perf_counter()
+    result = evaluator.evaluate(state, engine.goals, angles, powers)
+    elapsed = time.perf_counter() - started
+    print(f"{result.scores.size} candidates in {elapsed:.3f}s ({result.scores.size / elapsed:.0f}/s), "
+          f"mean {result.frames.mean():.0f} frames, best {best_shot(result)}")
@@ -0,0 +1,253 @@
+import heapq
+import math
+
+# Event kinds, in the order they are handled when two fall on the same instant
+HOLE, WALL, PAIR = 0, 1, 2
+
+class SweptCollider:
+    """Continuous collision detection for one physics step of any length
+
+    Within a step every puck moves in a straight line, and the exact times at which
+    it reaches a wall, another puck or its target hole are computed from the swept
+    circles. Events are handled in time-of-impact order: the pucks involved are
+    advanced to that instant, their velocities change (or the puck is captured) and
+    only their own future events are recomputed. Nothing can pass through a puck or
+    skip over a hole, however far it moves in one step, so dt can be several frames.
+
+    Friction is folded in so that a puck free of contacts ends a step of dt frames
+    exactly where dt discrete frames of PucketEngine would put it, and walls bounce it
+    the same way. Puck contacts do not match the discrete engine: there the impulse
+    only reaches pairs that already overlap and are moving apart, while here it is
+    applied at the moment of contact to pucks that are approaching, so pucks never
+    overlap. After the first contact the two physics go separate ways, and only a
+    game played with continuous collisions can be predicted with them.
+    """
+    def __init__(self, width, height, capture_radius, friction, wall_restitution=0.8,
+                 impulse_factor=0.9, max_events_per_puck=8):
+        self.width = width
+        self.height = height
+        self.capture_radius = capture_radius
+        self.friction = friction
+        self.wall_restitution = wall_restitution
+        self.impulse_factor = impulse_factor
+        # Guard against endless chains of contacts in a resting cluster
+        self.max_events_per_puck = max_events_per_puck
+
+    def step(self, pucks, goals, dt=1, woken=None):
+        """Advance the active pucks by dt frames; returns the pucks captured, in order
+
+        goals[player_id] is the hole a puck of that player is captured by. Captured
+        pucks are deactivated here and the caller scores them. Sleeping pucks that are
+        hit are appended to woken, as in PucketEngine.check_puck_collisions.
+        """
+        friction = self.friction
+        decay = friction ** dt
+        # Mean speed over the step relative to the starting speed
+        mean = friction * (1 - decay) / ((1 - friction) * dt)
+
+        active = [puck for puck in pucks if puck.active]
+        state = {}
+        moving = []
+        max_speed = 0.0
+        for puck in active:
+            ux = puck.velocity[0] * mean
+            uy = puck.velocity[1] * mean
+            # [x, y, ux, uy, anchor time, version]
+            state[puck] = [puck.position[0], puck.position[1], ux, uy, 0.0, 0]
+            if ux or uy:
+                moving.append(puck)
+                max_speed = max(max_speed, math.hypot(ux, uy))
+
+        captured = []
+        if moving:
+            # Neighbours are looked up on a grid of the start positions; the reach
+            # covers both pucks moving at up to twice the fastest starting speed
+            max_radius = max(puck.radius for puck in active)
+            reach = 2 * max_radius + 4 * max_speed * dt
+            reach2 = reach * reach
+            grid = {}
+            for puck in active:
+                key = (math.floor(puck.position[0] / reach), math.floor(puck.position[1] / reach))
+                grid.setdefault(key, []).append(puck)
+            neighbours = {}
+
+            def near(puck):
+                found = neighbours.get(puck)
+                if found is None:
+                    x, y = puck.position
+                    cx = math.floor(x / reach)
+                    cy = math.floor(y / reach)
+                    found = [
+                        other
+                        for gx in (cx - 1, cx, cx + 1)
+                        for gy in (cy - 1, cy, cy + 1)
+                        for other in grid.get((gx, gy), ())
+                        if other is not puck
+                        and (other.position[0] - x) ** 2 + (other.position[1] - y) ** 2 < reach2
+                    ]
+                    neighbours[puck] = found
+                return found
+
+            events = []
+            counter = [0]
+
+            def push(time, kind, puck, other=None, axis=None):
+                counter[0] += 1
+                versions = (state[puck][5], state[other][5] if other is not None else None)
+                heapq.heappush(events, (time, kind, counter[0], puck, other, axis, versions))
+
+            def schedule(puck, skip=None):
+                # Wall, hole and pair events of one puck from its current motion
+                s = state[puck]
+                x, y, ux, uy, t0 = s[0], s[1], s[2], s[3], s[4]
+                if ux or uy:
+                    wall = self.wall_time(x, y, ux, uy, puck.radius)
+                    if wall is not None and t0 + wall[0] <= dt:
+                        push(t0 + wall[0], WALL, puck, axis=wall[1])
+                    goal = goals[puck.player_id]
+                    hole = self.contact_time(x - goal[0], y - goal[1], ux, uy, self.capture_radius)
+                    if hole is not None and t0 + hole <= dt:
+                        push(t0 + hole, HOLE, puck)
+                for other in near(puck):
+                    if other is skip or not other.active:
+                        continue
+                    pair = self.pair_time(state[puck], state[other], puck.radius + other.radius)
+                    if pair is not None and pair <= dt:
+                        push(pair, PAIR, puck, other)
+
+            for puck in moving:
+                schedule(puck)
+            # Each pair of moving pucks was scheduled from both sides; the stale twin
+            # is dropped by the version check once either puck changes
+
+            budget = self.max_events_per_puck * len(moving) + 16
+            while events and budget > 0:
+                time, kind, _, puck, other, axis, versions = heapq.heappop(events)
+                if not puck.active or state[puck][5] != versions[0]:
+                    continue
+                if other is not None and (not other.active or state[other][5] != versions[1]):
+                    continue
+                budget -= 1
+
+                if kind == HOLE:
+                    self.advance(state[puck], time)
+                    puck.active = False
+                    captured.append(puck)
+                    continue
+
+                if kind == WALL:
+                    s = self.advance(state[puck], time)
+                    low = puck.radius
+                    if axis == 0:
+                        s[0] = low if s[2] < 0 else self.width - low
+                        s[2] = -s[2] * self.wall_restitution
+                    else:
+                        s[1] = low if s[3] < 0 else self.height - low
+                        s[3] = -s[3] * self.wall_restitution
+                    s[5] += 1
+                    schedule(puck)
+                    continue
+
+                s1 = self.advance(state[puck], time)
+                s2 = self.advance(state[other], time)
+                if not self.collide(s1, s2):
+                    continue
+                for hit in (puck, other):
+                    if woken is not None and hit.sleeping:
+                        woken.append(hit)
+                schedule(puck)
+                schedule(other, skip=puck)
+
+        # Bring everyone to the end of the step and turn mean speeds back into velocities
+        for puck in active:
+            if not puck.active:
+                continue
+            s = self.advance(state[puck], dt)
+            radius = puck.radius
+            puck.position = (
+                min(max(s[0], radius), self.width - radius),
+                min(max(s[1], radius), self.height - radius)
+            )
+            puck.velocity = (s[2] * decay / mean, s[3] * decay / mean)
+        return captured
+
+    @staticmethod
+    def advance(s, time):
+        # Move a puck's anchor to the given time along its current velocity
+        elapsed = time - s[4]
+        if elapsed:
+            s[0] += s[2] * elapsed
+            s[1] += s[3] * elapsed
+            s[4] = time
+        return s
+
+    def wall_time(self, x, y, ux, uy, radius):
+        # Earliest (time, axis) at which the puck's edge reaches a wall it moves towards
+        best = None
+        for position, speed, high, axis in ((x, ux, self.width, 0), (y, uy, self.height, 1)):
+            if speed < 0:
+                time = (radius - position) / speed
+            elif speed > 0:
+                time = (high - radius - position) / speed
+            else:
+                continue
+            time = max(time, 0.0)
+            if best is None or time < best[0]:
+                best = (time, axis)
+        return best
+
+    @staticmethod
+    def contact_time(dx, dy, vx, vy, distance):
+        # First time >= 0 at which a point at (dx, dy) moving at (vx, vy) comes within
+        # distance of the origin, or None
+        c = dx*dx + dy*dy - distance*distance
+        b = dx*vx + dy*vy
+        if c <= 0:
+            return 0.0 if b < 0 or c < 0 else None
+        if b >= 0:
+            return None
+        a = vx*vx + vy*vy
+        disc = b*b - a*c
+        if disc < 0:
+            return None
+        return (-b - math.sqrt(disc)) / a
+
+    def pair_time(self, s1, s2, distance):
+        # Time of impact of two pucks, from their states advanced to a common time
+        start = max(s1[4], s2[4])
+        x1 = s1[0] + s1[2] * (start - s1[4])
+        y1 = s1[1] + s1[3] * (start - s1[4])
+        x2 = s2[0] + s2[2] * (start - s2[4])
+        y2 = s2[1] + s2[3] * (start - s2[4])
+        dx = x2 - x1
+        dy = y2 - y1
+        c = dx*dx + dy*dy - distance*distance
+        b = dx * (s2[2] - s1[2]) + dy * (s2[3] - s1[3])
+        if b >= 0:
+            return None  # Not approaching
+        if c <= 0:
+            return start
+        time = self.contact_time(dx, dy, s2[2] - s1[2], s2[3] - s1[3], distance)
+        return None if time is None else start + time
+
+    def collide(self, s1, s2):
+        # Impulse between two touching pucks as they approach (the discrete engine
+        # waits until they overlap and separate); False if separating
+        dx = s2[0] - s1[0]
+        dy = s2[1] - s1[1]
+        distance = math.sqrt(dx*dx + dy*dy)
+        if distance < 0.0001:
+            return False
+        nx = dx / distance
+        ny = dy / distance
+        vn = (s1[2] - s2[2]) * nx + (s1[3] - s2[3]) * ny
+        if vn <= 0:
+            return False
+        impulse = self.impulse_factor * vn
+        s1[2] -= impulse * nx
+        s1[3] -= impulse * ny
+        s2[2] += impulse * nx
+        s2[3] += impulse * ny
+        s1[5] += 1
+        s2[5] += 1
+        return True
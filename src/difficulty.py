@@ -0,0 +1,151 @@
+import argparse
+import math
+import random
+from collections import OrderedDict, namedtuple
+
+from engine import Shot, MAX_VELOCITY
+from aim import stopping_power
+from ai_worker import AIWorker
+
+# A difficulty level as a compute budget: the search that picks the shot and how
+# much of it (rollouts, depth, time cap in seconds), how far the shot is thrown off
+# (aim noise in radians, power noise as a fraction, both uniform), frames of shown
+# thinking, entries in the response cache (0 for none), and the p99 decision latency
+# the profile must keep on the reference hardware, checked by benchmark.py
+Profile = namedtuple(
+    "Profile", "name search rollouts depth time_budget aim_noise power_noise think_frames cache_size p99_ms"
+)
+
+PROFILES = {
+    # Wild aim at the goal with a random puck
+    "easy": Profile("easy", "heuristic", 0, 0, 0.0, 0.35, 0.25, 45, 0, 5.0),
+    # A random puck, ±0.2 rad around the goal, at the power that stops it there
+    "normal": Profile("normal", "heuristic", 0, 0, 0.0, 0.2, 0.0, 30, 0, 5.0),
+    "hard": Profile("hard", "montecarlo", 64, 0, 0.15, 0.03, 0.0, 30, 4096, 250.0),
+    "expert": Profile("expert", "minimax", 0, 2, 0.35, 0.0, 0.0, 30, 4096, 600.0),
+}
+
+def get_profile(name_or_profile):
+    if isinstance(name_or_profile, Profile):
+        return name_or_profile
+    if name_or_profile not in PROFILES:
+        raise ValueError(f"Unknown difficulty {name_or_profile!r}: choose from {', '.join(PROFILES)}")
+    return PROFILES[name_or_profile]
+
+class ResponseCache:
+    """Shots already solved, by position, least recently used evicted first
+
+    Positions are keyed like minimax's transposition table, with pucks snapped to a
+    one-pixel grid, so a board that comes up again in the match (a repeated
+    exchange, a shot that moved nothing) is answered without searching.
+    """
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.shots = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(state, goals):
+        from minimax import quantize
+        return quantize(state, 1.0), tuple(tuple(goal) for goal in goals)
+
+    def get(self, key):
+        shot = self.shots.get(key)
+        if shot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.shots.move_to_end(key)
+        return shot
+
+    def put(self, key, shot):
+        self.shots[key] = shot
+        if len(self.shots) > self.max_size:
+            self.shots.popitem(last=False)
+
+class ProfileAI:
+    """A choose_shot AI playing at one difficulty profile
+
+    The profile's search picks the shot (or the cache answers it), then the aim
+    and power noise are applied; the cache keeps the shot before the noise. The AI
+    makes its own cache unless given one, so none is shared between matches. Each
+    search gets one core, so its time cap bounds the decision.
+    """
+    def __init__(self, profile, seed=None, cache=None):
+        self.profile = get_profile(profile)
+        self.rng = random.Random(seed)
+        self.searcher = None
+        profile = self.profile
+        if profile.search == "montecarlo":
+            from montecarlo import MonteCarloAI
+            self.searcher = MonteCarloAI(rollouts=profile.rollouts, time_budget=profile.time_budget, workers=1,
+                                         seed=seed)
+        elif profile.search == "minimax":
+            from minimax import AlphaBetaAI
+            self.searcher = AlphaBetaAI(time_budget=profile.time_budget, use_processes=False,
+                                        max_depth=profile.depth)
+        elif profile.search != "heuristic":
+            raise ValueError(f"Unknown search {profile.search!r} in difficulty {profile.name!r}")
+        if cache is None and profile.cache_size:
+            cache = ResponseCache(profile.cache_size)
+        self.cache = cache
+
+    def aimed_shot(self, state, goals):
+        # A random own puck with the power that stops it on the goal
+        player_idx = state.current_player_idx
+        movable = [k for k, puck in enumerate(state.pucks) if puck.active and puck.player_id == player_idx]
+        if not movable:
+            return None
+        k = self.rng.choice(movable)
+        puck = state.pucks[k]
+        goal = goals[player_idx]
+        dx = goal[0] - puck.x
+        dy = goal[1] - puck.y
+        return Shot(k, math.atan2(dy, dx), stopping_power(math.hypot(dx, dy)))
+
+    def choose_shot(self, state, goals):
+        if self.searcher is None:
+            shot = self.aimed_shot(state, goals)
+        else:
+            key = ResponseCache.key(state, goals) if self.cache is not None else None
+            shot = self.cache.get(key) if key is not None else None
+            if shot is None:
+                shot = self.searcher.choose_shot(state, goals)
+                if key is not None and shot is not None:
+                    self.cache.put(key, shot)
+        if shot is None:
+            return None
+
+        profile = self.profile
+        angle = shot.angle + self.rng.uniform(-profile.aim_noise, profile.aim_noise)
+        power = min(shot.power * (1 + self.rng.uniform(-profile.power_noise, profile.power_noise)), MAX_VELOCITY)
+        return Shot(shot.puck_index, angle, power)
+
+    def close(self):
+        if self.searcher is not None and hasattr(self.searcher, "close"):
+            self.searcher.close()
+
+def apply_profile(engine, profile, seed=None):
+    """Make engine's AI play at profile from the next turn on
+
+    Meant for between matches: any decision in progress is dropped and the old AI's
+    workers are released.
+    """
+    profile = get_profile(profile)
+    engine.shutdown()
+    engine.ai = AIWorker(ProfileAI(profile, seed))
+    engine.think_frames = profile.think_frames
+    engine.ai_delay_frames = profile.think_frames
+    engine.ai_thinking = False
+    return profile
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the difficulty profiles")
+    parser.parse_args()
+    print(f"{'profile':8s} {'search':10s} {'rollouts':>8s} {'depth':>5s} {'cap s':>6s} {'aim rad':>7s} "
+          f"{'power':>6s} {'cache':>6s} {'p99 ms':>7s}")
+    for profile in PROFILES.values():
+        print(f"{profile.name:8s} {profile.search:10s} {profile.rollouts:8d} {profile.depth:5d} "
+              f"{profile.time_budget:6.2f} {profile.aim_noise:7.2f} {profile.power_noise:6.0%} "
+              f"{profile.cache_size:6d} {profile.p99_ms:7.0f}")
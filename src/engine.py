@@ -0,0 +1,908 @@
+import random
+import math
+import time
+from bisect import insort
+from collections import namedtuple
+
+from broadphase import SpatialHash
+from ccd import SweptCollider
+from ai_worker import AIWorker
+
+# Game constants
+WIDTH, HEIGHT = 800, 600
+BOARD_WIDTH, BOARD_HEIGHT = 700, 500
+PUCK_RADIUS = 20
+HOLE_RADIUS = 25
+DIVIDER_WIDTH = 10
+FPS = 60
+MAX_VELOCITY = 10
+FRICTION = 0.98
+
+def dense_capacity(puck_radius):
+    # Pucks per player that the dense start grid fits into one half of the board
+    spacing = 2 * puck_radius + 4
+    columns = max(1, int((BOARD_WIDTH // 2 - 100) // spacing))
+    rows = max(1, int((BOARD_HEIGHT - 2 * puck_radius) // spacing) + 1)
+    return columns * rows
+
+def dense_radius(num_pucks_per_player, largest=PUCK_RADIUS):
+    # Largest whole puck radius, up to largest, whose dense start grid fits the count
+    for radius in range(int(largest), 0, -1):
+        if dense_capacity(radius) >= num_pucks_per_player:
+            return radius
+    raise ValueError(f"{num_pucks_per_player} pucks per player do not fit on the board")
+
+# Plain snapshots of a board, detached from any engine
+PuckState = namedtuple("PuckState", "x y vx vy active player_id")
+
+class BoardState(namedtuple("BoardState", "pucks scores current_player_idx game_over winner_id puck_radius layout",
+                            defaults=(None,))):
+    """A board at one moment, plus the layout.Layout it is played on
+
+    The layout rides along so an AI rebuilding the board (PucketEngine.from_state)
+    plans with the same obstacles; None is the classic board. It is static, so it is
+    left out of the repr, which replay digests hash.
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in zip(self._fields[:-1], self[:-1]))
+        return f"BoardState({fields})"
+
+# One launch: index into BoardState.pucks / PucketEngine.pucks, angle and power
+Shot = namedtuple("Shot", "puck_index angle power")
+
+# Outcome of PucketEngine.resolve_shot: the resting board, goals scored per player,
+# frames simulated and the indices of the pucks captured by the shot
+ShotResult = namedtuple("ShotResult", "state goals frames captured")
+
+# Bookkeeping events, emitted by the physics step as they happen: a puck captured
+# in its goal, a puck come to rest, and a player left with nothing moving (for the
+# player to move, the board at rest). puck_index is None for AT_REST
+Event = namedtuple("Event", "kind player_id puck_index")
+CAPTURED, SLEEPING, AT_REST = "captured", "sleeping", "at_rest"
+
+# Colors
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+GREEN = (0, 255, 0)
+YELLOW = (255, 255, 0)
+BROWN = (139, 69, 19)
+GRAY = (200, 200, 200)
+
+class PuckArray:
+    """Positions and velocities of every puck of a board in one preallocated array
+
+    Puck k owns the floats data[4k:4k+4] (x, y, vx, vy) and is a view over them, so
+    the physics updates the board in place instead of building tuples. The array is
+    a list: reading an element of array("d") would box a new float every time. The
+    indices of the active pucks are kept in order as pucks are captured or restored,
+    so nothing has to scan the board for them.
+    """
+    __slots__ = ("data", "pucks", "active", "events")
+
+    def __init__(self, capacity=0):
+        self.data = [0.0] * (4 * capacity)
+        self.pucks = []
+        self.active = []
+        self.events = []  # Events not yet dispatched by the engine
+
+class Puck:
+    __slots__ = ("data", "base", "index", "store", "owner", "color", "radius", "player_id", "_active", "_moving",
+                 "sleeping")
+
+    def __init__(self, position, color, player_id, radius=PUCK_RADIUS, store=None, owner=None):
+        # A puck made on its own gets a store of its own
+        if store is None:
+            store = PuckArray(1)
+        self.store = store
+        self.data = store.data
+        self.index = len(store.pucks)
+        self.base = 4 * self.index
+        if self.base + 4 > len(self.data):
+            self.data.extend((0.0, 0.0, 0.0, 0.0))
+        store.pucks.append(self)
+        self.owner = owner  # The Player whose active list follows this puck
+        self._active = False
+        self._moving = False
+        self.position = position
+        self.velocity = (0, 0)
+        self.color = color
+        self.radius = radius
+        self.player_id = player_id
+        self.sleeping = False  # Resting puck skipped by resolve_shot until something hits it
+        self.active = True  # Whether the puck is still in play
+
+    @property
+    def position(self):
+        return (self.data[self.base], self.data[self.base + 1])
+
+    @position.setter
+    def position(self, position):
+        self.data[self.base] = position[0]
+        self.data[self.base + 1] = position[1]
+
+    @property
+    def velocity(self):
+        return (self.data[self.base + 2], self.data[self.base + 3])
+
+    @velocity.setter
+    def velocity(self, velocity):
+        self.data[self.base + 2] = velocity[0]
+        self.data[self.base + 3] = velocity[1]
+        self.track_motion()
+
+    @property
+    def active(self):
+        return self._active
+
+    @active.setter
+    def active(self, active):
+        # Keep the store's and the owner's active lists in index order, and the
+        # owner's count of moving pucks
+        active = bool(active)
+        if active == self._active:
+            return
+        self._active = active
+        owner = self.owner
+        if active:
+            insort(self.store.active, self.index)
+            if owner is not None:
+                pucks = owner.active
+                position = len(pucks)
+                while position and pucks[position - 1].index > self.index:
+                    position -= 1
+                pucks.insert(position, self)
+                if self._moving:
+                    owner.moving += 1
+        else:
+            self.store.active.remove(self.index)
+            if owner is not None:
+                owner.active.remove(self)
+                if self._moving:
+                    owner.moving -= 1
+                    if not owner.moving:
+                        self.store.events.append(Event(AT_REST, self.player_id, None))
+
+    @property
+    def moving(self):
+        # Same as not is_stopped(), kept up to date as the velocity changes
+        return self._moving
+
+    def track_motion(self):
+        # Call after writing the velocity in data directly
+        k = self.base + 2
+        moving = abs(self.data[k]) >= 0.1 or abs(self.data[k + 1]) >= 0.1
+        if moving != self._moving:
+            self.set_moving(moving)
+
+    def set_moving(self, moving):
+        # A start or stop: update the owner's moving count and emit the events
+        self._moving = moving
+        if not self._active:
+            return
+        owner = self.owner
+        if moving:
+            if owner is not None:
+                owner.moving += 1
+            return
+        events = self.store.events
+        events.append(Event(SLEEPING, self.player_id, self.index))
+        if owner is not None:
+            owner.moving -= 1
+            if not owner.moving:
+                events.append(Event(AT_REST, self.player_id, None))
+
+    def update(self):
+        if not self._active or self.sleeping:
+            return
+        data = self.data
+        k = self.base
+
+        # Apply friction
+        vx = data[k + 2] * FRICTION
+        vy = data[k + 3] * FRICTION
+
+        # Update position
+        x = data[k] + vx
+        y = data[k + 1] + vy
+
+        # Check board boundaries
+        radius = self.radius
+        if x < radius:
+            x = radius
+            vx = -vx * 0.8
+        elif x > WIDTH - radius:
+            x = WIDTH - radius
+            vx = -vx * 0.8
+
+        if y < radius:
+            y = radius
+            vy = -vy * 0.8
+        elif y > HEIGHT - radius:
+            y = HEIGHT - radius
+            vy = -vy * 0.8
+
+        data[k] = x
+        data[k + 1] = y
+        data[k + 2] = vx
+        data[k + 3] = vy
+
+        # Friction and the walls only slow a puck down, so here it can only stop
+        if self._moving and -0.1 < vx < 0.1 and -0.1 < vy < 0.1:
+            self.set_moving(False)
+
+    def launch(self, angle, power):
+        if not self._active:
+            return
+
+        power = min(power, MAX_VELOCITY)
+        self.data[self.base + 2] = power * math.cos(angle)
+        self.data[self.base + 3] = power * math.sin(angle)
+        self.track_motion()
+
+    def is_stopped(self):
+        k = self.base + 2
+        return abs(self.data[k]) < 0.1 and abs(self.data[k + 1]) < 0.1
+
+class Player:
+    __slots__ = ("id", "name", "color", "pucks", "active", "moving", "is_ai", "score", "move_made")
+
+    def __init__(self, id, name, color, is_ai=False):
+        self.id = id
+        self.name = name
+        self.color = color
+        self.pucks = []
+        self.active = []  # Active pucks in order, kept up to date by the pucks themselves
+        self.moving = 0  # How many of them are moving, likewise
+        self.is_ai = is_ai
+        self.score = 0
+        self.move_made = False  # Flag to track if a move has been made
+
+    def initialize_pucks(self, count, start_positions, radius=PUCK_RADIUS, store=None):
+        self.pucks = []
+        self.active = []
+        self.moving = 0
+        for i in range(count):
+            position = start_positions[i % len(start_positions)]
+            self.pucks.append(Puck(position, self.color, self.id, radius, store, self))
+
+    def all_pucks_stopped(self):
+        return not self.moving
+
+    def has_active_pucks(self):
+        return bool(self.active)
+
+class PucketEngine:
+    """Headless Pucket simulation: physics, goals, turns and the AI, no pygame"""
+    def __init__(self, ai_players=(1,), num_pucks_per_player=5, puck_radius=PUCK_RADIUS, ai=None,
+                 seed=None, record_shots=True, ccd=False, layout=None):
+        # Ids of the players controlled by the AI, e.g. (0, 1) for AI-vs-AI
+        self.ai_players = tuple(ai_players)
+        # Seed of the first game; later games draw a fresh one unless given
+        self.seed = seed
+        # Keep the (frame, puck, angle, power) log of every shot for replays
+        self.record_shots = record_shots
+        # Search-based AI (e.g. MonteCarloAI) used instead of the simple heuristic. It
+        # thinks in the background; plain choose_shot AIs are moved to a worker thread
+        if ai is not None and not hasattr(ai, "start"):
+            ai = AIWorker(ai)
+        self.ai = ai
+        self.ai_search = None
+        # Frames the AI shows itself thinking before it moves (difficulty.py sets this)
+        self.think_frames = 30
+        # Larger counts and smaller pucks make the dense stress and party boards
+        self.num_pucks_per_player = num_pucks_per_player
+        self.puck_radius = puck_radius
+        # Broad phase: only pucks within this reach of a moving puck are tested
+        self.broadphase = SpatialHash(3 * puck_radius)
+        # Continuous (swept) collisions instead of the per-frame overlap tests: nothing
+        # tunnels, and resolve_shot can take steps of several frames
+        self.collider = SweptCollider(WIDTH, HEIGHT, HOLE_RADIUS - 5, FRICTION) if ccd else None
+        # Static obstacles (layout.Layout, or the name of a built-in one); the classic
+        # board has none and skips the obstacle pass entirely
+        from layout import get_layout, static_index
+        self.layout = get_layout(layout)
+        if ccd and not self.layout.empty:
+            raise ValueError("continuous collisions do not handle obstacles; use the discrete physics")
+        self.obstacles = static_index(self.layout, puck_radius)
+        # Optional profiler.Profiler timing the hot paths; None costs one check per frame
+        self.profiler = None
+        # Callables given every Event as the physics step dispatches it
+        self.listeners = []
+        self.initialize_game()
+
+    def initialize_game(self, seed=None):
+        # Per-game random streams: one for the physics and one for the AI, so a replay
+        # without the AI draws the same physics numbers
+        if seed is None:
+            seed = self.seed if self.seed is not None else random.randrange(2**32)
+            self.seed = None
+        self.game_seed = seed
+        self.rng = random.Random(seed)
+        self.ai_rng = random.Random(seed ^ 0x5EED)
+        self.shot_log = [] if self.record_shots else None
+
+        # Create players
+        self.players = [
+            Player(0, "AI 1" if 0 in self.ai_players and 1 in self.ai_players else "Player", BLUE, is_ai=0 in self.ai_players),
+            Player(1, "AI 2" if 0 in self.ai_players and 1 in self.ai_players else "AI", RED, is_ai=1 in self.ai_players)
+        ]
+
+        # Board setup
+        self.board_x = (WIDTH - BOARD_WIDTH) // 2
+        self.board_y = (HEIGHT - BOARD_HEIGHT) // 2
+
+        # Initialize player pucks
+        player_start_positions = self.start_positions(0)
+        ai_start_positions = self.start_positions(1)
+
+        # Every puck in one list, in player order, backed by one shared array
+        self.store = PuckArray(2 * self.num_pucks_per_player)
+        self.players[0].initialize_pucks(self.num_pucks_per_player, player_start_positions, self.puck_radius, self.store)
+        self.players[1].initialize_pucks(self.num_pucks_per_player, ai_start_positions, self.puck_radius, self.store)
+        self.pucks = self.store.pucks
+
+        # Game state
+        self.current_player_idx = 0
+        self.game_over = False
+        self.winner = None
+        self.frame = 0
+
+        # Goals (holes)
+        self.goals = self.create_goals()
+
+        # AI decision timer
+        self.ai_timer = 0
+        self.ai_thinking = False
+        self.ai_delay_frames = self.think_frames  # Half a second at 60 FPS by default
+        self.cancel_ai_search()
+
+        # Turn management
+        self.turn_cooldown = 0
+        self.turn_cooldown_duration = 30  # Half a second at 60 FPS
+        self.all_stopped_frames = 0  # Count frames where pucks are stopped
+        self.required_stopped_frames = 30  # Wait this many frames with all pucks stopped before switching turns
+
+        # Sleeping pucks hit during resolve_shot, woken at the end of the frame
+        self.woken = None
+
+    def start_positions(self, player_idx):
+        positions = []
+
+        if self.num_pucks_per_player <= 5:
+            # Each player's side
+            for i in range(self.num_pucks_per_player):
+                if player_idx == 0:
+                    positions.append((
+                        self.board_x + 100 + (i % 3) * 50,
+                        self.board_y + 100 + (i // 3) * 60
+                    ))
+                else:
+                    positions.append((
+                        self.board_x + BOARD_WIDTH - 100 - (i % 3) * 50,
+                        self.board_y + BOARD_HEIGHT - 100 - (i // 3) * 60
+                    ))
+            return positions
+
+        # Dense boards: fill each half of the board in rows, clear of the goals. The
+        # grid must fit inside the half, so larger counts need smaller pucks
+        if self.num_pucks_per_player > dense_capacity(self.puck_radius):
+            raise ValueError(f"{self.num_pucks_per_player} pucks per player of radius {self.puck_radius} do not fit "
+                             f"on the board (at most {dense_capacity(self.puck_radius)}); see dense_radius")
+        spacing = 2 * self.puck_radius + 4
+        columns = max(1, int((BOARD_WIDTH // 2 - 100) // spacing))
+        for i in range(self.num_pucks_per_player):
+            column = i % columns
+            row = i // columns
+            x = self.board_x + 100 + column * spacing
+            y = self.board_y + self.puck_radius + row * spacing
+            if player_idx == 1:
+                x = WIDTH - x
+                y = HEIGHT - y
+            positions.append((x, y))
+        return positions
+
+    def create_goals(self):
+        goals = []
+
+        # Player's goal (on AI side)
+        goals.append((
+            self.board_x + BOARD_WIDTH - 50,
+            self.board_y + BOARD_HEIGHT // 2
+        ))
+
+        # AI's goal (on player side)
+        goals.append((
+            self.board_x + 50,
+            self.board_y + BOARD_HEIGHT // 2
+        ))
+
+        return goals
+
+    def current_player(self):
+        return self.players[self.current_player_idx]
+
+    def active_pucks(self, player_idx=None):
+        if player_idx is None:
+            player_idx = self.current_player_idx
+        # The player's own up-to-date list: read it, don't modify it
+        return self.players[player_idx].active
+
+    def launch(self, puck, angle, power):
+        if puck is None or not puck.active:
+            return
+        if self.shot_log is not None:
+            self.shot_log.append((self.frame, puck.index, angle, power))
+        puck.launch(angle, power)
+        # Mark that a move has been made
+        self.players[self.current_player_idx].move_made = True
+        # Reset frames counter
+        self.all_stopped_frames = 0
+
+    def apply_shot(self, shot):
+        self.launch(self.pucks[shot.puck_index], shot.angle, shot.power)
+
+    def cancel_ai_search(self):
+        if getattr(self, "ai_search", None) is not None:
+            self.ai_search.cancel()
+        self.ai_search = None
+
+    def shutdown(self):
+        # Stop any background thinking and release the AI's workers
+        self.cancel_ai_search()
+        if self.ai is not None and hasattr(self.ai, "close"):
+            self.ai.close()
+
+    def step(self, block_on_ai=False):
+        # Advance the simulation by one frame, letting the AI act on its turn
+        if self.players[self.current_player_idx].is_ai and not self.game_over:
+            if self.profiler is None:
+                self.ai_make_move(block_on_ai)
+            else:
+                started = time.perf_counter()
+                self.ai_make_move(block_on_ai)
+                self.profiler.record("ai", time.perf_counter() - started)
+        self.update_game_state()
+
+    def run(self, max_frames=100000):
+        # Step un-throttled until the game ends or the frame budget runs out. Headless
+        # there is nothing to render, so wait for the AI instead of polling it
+        for _ in range(max_frames):
+            if self.game_over:
+                break
+            self.step(block_on_ai=True)
+        return self.winner
+
+    def update_game_state(self):
+        self.frame += 1
+
+        # Move pucks, collide them and capture the ones in goals
+        self.physics_step(self.pucks)
+
+        profiler = self.profiler
+        if profiler is not None:
+            started = time.perf_counter()
+
+        # Turn management; the win is settled as captures are dispatched
+        self.manage_turns()
+
+        if profiler is not None:
+            profiler.record("turns", time.perf_counter() - started)
+            profiler.frame_done(self.frame)
+
+    def physics_step(self, moving_pucks, dt=1):
+        if self.collider is not None:
+            self.swept_step(dt)
+        elif self.profiler is not None:
+            self.timed_physics_step(moving_pucks, self.profiler)
+        else:
+            # Update pucks
+            for puck in moving_pucks:
+                puck.update()
+
+            # Keep them out of the board's walls, bumpers and portals
+            if self.obstacles is not None:
+                self.obstacles.collide(moving_pucks, self.store.data)
+
+            # Check collisions between pucks
+            self.check_puck_collisions()
+
+            # Check goal collisions
+            self.check_goal_collisions(moving_pucks)
+
+        if self.store.events:
+            self.dispatch_events()
+
+    def dispatch_events(self):
+        # Settle the events of the last physics step: a capture scores and can end
+        # the game. Only frames with events pay for this
+        events = self.store.events
+        for event in events:
+            if event.kind == CAPTURED:
+                player = self.players[event.player_id]
+                player.score += 1
+                # Check if all pucks from this player are in goals
+                if not player.active:
+                    self.game_over = True
+                    self.winner = player
+            for listener in self.listeners:
+                listener(event)
+        events.clear()
+
+    def capture(self, puck):
+        # Take a puck that went into its goal off the board
+        self.store.events.append(Event(CAPTURED, puck.player_id, puck.index))
+        puck.active = False
+
+    def swept_step(self, dt=1):
+        # Continuous physics over dt frames; sleeping pucks have no velocity and only
+        # move once something hits them
+        profiler = self.profiler
+        if profiler is not None:
+            started = time.perf_counter()
+        events = self.store.events
+        for puck in self.collider.step(self.pucks, self.goals, dt, self.woken):
+            # Already taken off the board by the collider
+            events.append(Event(CAPTURED, puck.player_id, puck.index))
+        if profiler is not None:
+            profiler.record("swept", time.perf_counter() - started)
+
+    def timed_physics_step(self, moving_pucks, profiler):
+        # physics_step with each phase recorded on the profiler
+        clock = time.perf_counter
+        started = clock()
+        for puck in moving_pucks:
+            puck.update()
+        if self.obstacles is not None:
+            self.obstacles.collide(moving_pucks, self.store.data)
+        integrated = clock()
+        self.check_puck_collisions()
+        collided = clock()
+        self.check_goal_collisions(moving_pucks)
+        finished = clock()
+        profiler.record("integrate", integrated - started)
+        profiler.record("collide", collided - integrated)
+        profiler.record("goals", finished - collided)
+
+    def snapshot(self):
+        data = self.store.data
+        pucks = tuple(
+            PuckState(data[puck.base], data[puck.base + 1], data[puck.base + 2], data[puck.base + 3], puck.active, puck.player_id)
+            for puck in self.pucks
+        )
+        return BoardState(
+            pucks,
+            tuple(player.score for player in self.players),
+            self.current_player_idx,
+            self.game_over,
+            self.winner.id if self.winner is not None else None,
+            self.puck_radius,
+            self.layout
+        )
+
+    def load_state(self, state):
+        # Put the board in the given state, with the player to move about to shoot. A
+        # state without a layout keeps the engine's
+        layout = state.layout
+        if layout is not None and layout is not self.layout and layout != self.layout:
+            from layout import static_index
+            if self.collider is not None and not layout.empty:
+                raise ValueError("continuous collisions do not handle obstacles; use the discrete physics")
+            self.layout = layout
+            self.obstacles = static_index(layout, self.puck_radius)
+        counts = [sum(1 for puck in state.pucks if puck.player_id == player.id) for player in self.players]
+        if counts != [len(player.pucks) for player in self.players] or state.puck_radius != self.puck_radius:
+            self.puck_radius = state.puck_radius
+            self.broadphase = SpatialHash(3 * state.puck_radius)
+            from layout import static_index
+            self.obstacles = static_index(self.layout, state.puck_radius)
+            self.store = PuckArray(len(state.pucks))
+            for player, count in zip(self.players, counts):
+                player.initialize_pucks(count, [(0, 0)], state.puck_radius, self.store)
+            self.pucks = self.store.pucks
+
+        data = self.store.data
+        for puck, puck_state in zip(self.pucks, state.pucks):
+            k = puck.base
+            data[k] = puck_state.x
+            data[k + 1] = puck_state.y
+            data[k + 2] = puck_state.vx
+            data[k + 3] = puck_state.vy
+            puck.track_motion()
+            puck.active = puck_state.active
+            puck.sleeping = False
+        # Loading is not play: drop the starts and stops it caused
+        self.store.events.clear()
+
+        for player, score in zip(self.players, state.scores):
+            player.score = score
+            player.move_made = False
+        self.current_player_idx = state.current_player_idx
+        self.game_over = state.game_over
+        self.winner = self.players[state.winner_id] if state.winner_id is not None else None
+        # A board loaded already decided; later wins come from captures
+        if not self.game_over:
+            for player in self.players:
+                if not player.active:
+                    self.game_over = True
+                    self.winner = player
+        self.all_stopped_frames = 0
+        self.turn_cooldown = 0
+        self.ai_thinking = False
+        self.ai_timer = 0
+
+    @classmethod
+    def from_state(cls, state, ai_players=(1,), seed=0, ccd=False, layout=None):
+        # The board of state, on the given layout or else the state's own
+        if layout is None:
+            layout = state.layout
+        engine = cls(ai_players=ai_players, puck_radius=state.puck_radius, seed=seed, record_shots=False, ccd=ccd,
+                     layout=layout)
+        engine.load_state(state)
+        return engine
+
+    def resolve_shot(self, puck, angle, power, max_frames=10000, sleep_speed=0.1, step_frames=1):
+        """Launch a puck and integrate straight to rest, with no turn delays or rendering
+
+        A puck sleeps, with its velocity zeroed, once both velocity components drop
+        below sleep_speed; lower it to trade frames for a more exact resting position.
+        With continuous collisions (ccd=True) each step can cover step_frames frames.
+        """
+        if step_frames != 1 and self.collider is None:
+            raise ValueError("step_frames > 1 needs continuous collisions (ccd=True)")
+        scores = [player.score for player in self.players]
+        was_active = [other.active for other in self.pucks]
+        self.launch(puck, angle, power)
+
+        # Everything at rest sleeps; the collision pass wakes the pucks it hits
+        self.woken = []
+        awake = []
+        for other in self.pucks:
+            if other.active and (other is puck or not other.is_stopped()):
+                other.sleeping = False
+                awake.append(other)
+            else:
+                other.sleeping = True
+
+        frames = 0
+        while awake and frames < max_frames:
+            frames += step_frames
+            self.frame += step_frames
+            self.physics_step(awake, step_frames)
+
+            # Put pucks that came to rest to sleep and take in the ones that were hit
+            still_awake = []
+            data = self.store.data
+            for other in awake:
+                if not other._active:
+                    continue
+                k = other.base + 2
+                if abs(data[k]) < sleep_speed and abs(data[k + 1]) < sleep_speed:
+                    other.sleeping = True
+                    data[k] = 0
+                    data[k + 1] = 0
+                    other.track_motion()
+                else:
+                    still_awake.append(other)
+            for other in self.woken:
+                if other._active and other.sleeping:
+                    other.sleeping = False
+                    still_awake.append(other)
+            self.woken = []
+            awake = still_awake
+
+        for other in self.pucks:
+            other.sleeping = False
+        self.woken = None
+
+        # The board is at rest: check for a winner (captures already scored) and pass the turn
+        for player in self.players:
+            if not player.has_active_pucks():
+                self.game_over = True
+                self.winner = player
+        self.all_stopped_frames = 0
+        self.turn_cooldown = 0
+        self.current_player_idx = (self.current_player_idx + 1) % len(self.players)
+        self.players[self.current_player_idx].move_made = False
+
+        goals = tuple(player.score - before for player, before in zip(self.players, scores))
+        captured = tuple(k for k, other in enumerate(self.pucks) if was_active[k] and not other.active)
+        return ShotResult(self.snapshot(), goals, frames, captured)
+
+    def manage_turns(self):
+        # If turn cooldown is active, decrement it
+        if self.turn_cooldown > 0:
+            self.turn_cooldown -= 1
+            return
+
+        # Check if the current player's pucks have all stopped: the count of its
+        # moving pucks is kept by the physics step, so nothing is scanned here
+        if not self.players[self.current_player_idx].moving:
+            # Only count frames if a move has been made
+            if self.players[self.current_player_idx].move_made:
+                self.all_stopped_frames += 1
+
+                # If pucks have been stopped for enough frames, switch turns
+                if self.all_stopped_frames >= self.required_stopped_frames:
+                    # Reset for next player
+                    self.all_stopped_frames = 0
+
+                    # Switch to the other player
+                    self.current_player_idx = (self.current_player_idx + 1) % len(self.players)
+
+                    # Reset move made flag for the new player
+                    self.players[self.current_player_idx].move_made = False
+
+                    # Set a cooldown before the new player can make a move
+                    self.turn_cooldown = self.turn_cooldown_duration
+
+                    # Reset AI thinking state
+                    if self.players[self.current_player_idx].is_ai:
+                        self.ai_thinking = False
+                        self.ai_timer = 0
+
+    def check_puck_collisions(self):
+        pucks = self.pucks
+        data = self.store.data
+        count = len(pucks)
+
+        # Broad phase: each nearby pair with at least one moving puck, once, in index order
+        for pair in self.broadphase.candidate_pairs(data, self.store.active, count):
+            i = pair // count
+            j = pair - i * count
+            a = 4 * i
+            b = 4 * j
+
+            dx = data[b] - data[a]
+            dy = data[b + 1] - data[a + 1]
+            distance = math.sqrt(dx*dx + dy*dy)
+
+            # Prevent division by zero
+            if distance < 0.0001:
+                # Pucks are exactly in the same position - move one slightly
+                data[b] = data[b] + self.rng.uniform(0.1, 1.0)
+                data[b + 1] = data[b + 1] + self.rng.uniform(0.1, 1.0)
+                # Recalculate after adjustment
+                dx = data[b] - data[a]
+                dy = data[b + 1] - data[a + 1]
+                distance = math.sqrt(dx*dx + dy*dy)
+
+            puck1 = pucks[i]
+            puck2 = pucks[j]
+            if distance < puck1.radius + puck2.radius:
+                # Collision handling: elastic collision
+                # Calculate collision normal
+                nx = dx / distance
+                ny = dy / distance
+
+                # Calculate relative velocity
+                vx = data[a + 2] - data[b + 2]
+                vy = data[a + 3] - data[b + 3]
+
+                # Calculate velocity component along the normal
+                vn = vx * nx + vy * ny
+
+                # Don't process collision if pucks are moving away from each other
+                if vn > 0:
+                    continue
+
+                # Calculate impulse
+                impulse = -1.8 * vn / 2  # Slightly less elastic for stability
+
+                # Apply impulse to velocities, in place
+                data[a + 2] += impulse * nx
+                data[a + 3] += impulse * ny
+                data[b + 2] -= impulse * nx
+                data[b + 3] -= impulse * ny
+                # A hit can start or stop either puck: keep the moving counts exact
+                moving = abs(data[a + 2]) >= 0.1 or abs(data[a + 3]) >= 0.1
+                if moving != puck1._moving:
+                    puck1.set_moving(moving)
+                moving = abs(data[b + 2]) >= 0.1 or abs(data[b + 3]) >= 0.1
+                if moving != puck2._moving:
+                    puck2.set_moving(moving)
+
+                # Wake sleeping pucks that were hit
+                if puck1.sleeping:
+                    self.woken.append(puck1)
+                if puck2.sleeping:
+                    self.woken.append(puck2)
+
+                # Separate the pucks to prevent sticking
+                overlap = 0.5 * (puck1.radius + puck2.radius - distance)
+                data[a] -= overlap * nx
+                data[a + 1] -= overlap * ny
+                data[b] += overlap * nx
+                data[b + 1] += overlap * ny
+
+    def check_goal_collisions(self, pucks=None):
+        data = self.store.data
+        for puck in self.pucks if pucks is None else pucks:
+            if not puck._active:
+                continue
+
+            opponent_goal = self.goals[puck.player_id]
+
+            # Check if puck is in the opponent's goal
+            dx = data[puck.base] - opponent_goal[0]
+            dy = data[puck.base + 1] - opponent_goal[1]
+            distance = math.sqrt(dx*dx + dy*dy)
+
+            if distance < HOLE_RADIUS - 5:  # Little margin to make it easier
+                # Puck is in goal: scored when the event is dispatched
+                self.capture(puck)
+
+    def ai_make_move(self, block=False):
+        """Simple AI strategy for stability, or the decision of the background AI"""
+        if not self.players[self.current_player_idx].is_ai:
+            return
+
+        # Don't make a move if the AI player has already made one this turn
+        if self.players[self.current_player_idx].move_made:
+            return
+
+        if not self.ai_thinking:
+            self.ai_thinking = True
+            self.ai_timer = 0
+            # Let the AI think in the background from the start of its turn
+            if self.ai is not None:
+                self.cancel_ai_search()
+                self.ai_search = self.ai.start(self.snapshot(), self.goals)
+
+        # Simulate thinking time
+        self.ai_timer += 1
+        if self.ai_timer < self.ai_delay_frames:
+            return
+
+        if self.ai_search is not None:
+            # Poll the background search and keep the frame loop running until it is done
+            if not block and not self.ai_search.done():
+                return
+            shot = self.ai_search.result()
+            self.ai_search = None
+            self.ai_thinking = False
+            if shot is not None:
+                self.apply_shot(shot)
+            return
+
+        # Reset thinking flag
+        self.ai_thinking = False
+
+        # Get active pucks
+        active_pucks = self.active_pucks()
+
+        if not active_pucks:
+            return
+
+        # Simple AI: Aim for the goal with a random puck
+        selected_puck = self.ai_rng.choice(active_pucks)
+        opponent_goal = self.goals[self.current_player_idx]
+
+        # Calculate angle to the goal
+        dx = opponent_goal[0] - selected_puck.position[0]
+        dy = opponent_goal[1] - selected_puck.position[1]
+        angle = math.atan2(dy, dx)
+
+        # Add some randomness
+        angle += self.ai_rng.uniform(-0.2, 0.2)
+
+        # Calculate power based on distance
+        distance = math.sqrt(dx*dx + dy*dy)
+        power = simple_ai_power(distance)
+
+        # Launch the puck
+        self.launch(selected_puck, angle, power)
+
+def simple_ai_power(distance):
+    # The simple AI's power for a goal distance away; 80% of max to increase accuracy
+    return min(distance / 50, MAX_VELOCITY * 0.8)
+
+def resolve_shot(state, puck_index, angle, power, max_frames=10000, step_frames=1, ccd=False):
+    # Resolve one shot from a BoardState; puck_index indexes state.pucks. ccd should
+    # be the physics of the game the state comes from: steps of more than one frame
+    # need continuous collisions, whose puck contacts differ from the discrete pass
+    engine = PucketEngine.from_state(state, ai_players=(), ccd=ccd)
+    return engine.resolve_shot(engine.pucks[puck_index], angle, power, max_frames, step_frames=step_frames)
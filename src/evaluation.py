@@ -0,0 +1,61 @@
+import math
+
+# Weights of the shot and board heuristics shared by the search-based AIs
+GOAL_WEIGHT = 100.0  # One puck in the goal
+DISTANCE_WEIGHT = 0.1  # Per pixel a puck is closer to its goal
+DISPLACEMENT_WEIGHT = 0.05  # Per pixel an opponent puck is pushed away from its goal
+
+def goal_distances(state, goals, player_idx):
+    # Distance of each active puck of the player to the goal it scores in
+    goal = goals[player_idx]
+    return [
+        math.hypot(puck.x - goal[0], puck.y - goal[1])
+        for puck in state.pucks
+        if puck.active and puck.player_id == player_idx
+    ]
+
+def board_value(state, goals, player_idx):
+    """Static value of a board for one player: score lead and who is nearer their goal"""
+    opponent_idx = (player_idx + 1) % len(state.scores)
+    if state.game_over:
+        return math.inf if state.winner_id == player_idx else -math.inf
+
+    value = GOAL_WEIGHT * (state.scores[player_idx] - state.scores[opponent_idx])
+    value -= DISTANCE_WEIGHT * sum(goal_distances(state, goals, player_idx))
+    value += DISTANCE_WEIGHT * sum(goal_distances(state, goals, opponent_idx))
+    return value
+
+def shot_score(before, after, goals, player_idx):
+    """Score the outcome of one shot for the player who took it
+
+    Rewards goals, opponent pucks pushed away from their goal and own pucks brought
+    closer to the goal; goals the shot gives the opponent count against it. A shot
+    that wins the game scores inf, one that hands the opponent the win -inf.
+    """
+    opponent_idx = (player_idx + 1) % len(before.scores)
+    if after.game_over and after.winner_id == player_idx:
+        return math.inf
+    if after.game_over and after.winner_id == opponent_idx:
+        return -math.inf
+
+    score = GOAL_WEIGHT * (after.scores[player_idx] - before.scores[player_idx])
+    score -= GOAL_WEIGHT * (after.scores[opponent_idx] - before.scores[opponent_idx])
+
+    own_goal = goals[player_idx]
+    opponent_goal = goals[opponent_idx]
+    for old, new in zip(before.pucks, after.pucks):
+        if not (old.active and new.active):
+            continue
+        if new.player_id == player_idx:
+            # Remaining distance to the goal, as progress made by this shot
+            score += DISTANCE_WEIGHT * (
+                math.hypot(old.x - own_goal[0], old.y - own_goal[1]) -
+                math.hypot(new.x - own_goal[0], new.y - own_goal[1])
+            )
+        else:
+            # Opponent displacement away from the goal it scores in
+            score += DISPLACEMENT_WEIGHT * (
+                math.hypot(new.x - opponent_goal[0], new.y - opponent_goal[1]) -
+                math.hypot(old.x - opponent_goal[0], old.y - opponent_goal[1])
+            )
+    return score
@@ -1,568 +1,370 @@
 import pygame
 import sys
-import random
 import math
+import time
+import argparse
+from collections import OrderedDict
 
-# Initialize pygame
-pygame.init()
-
-# Game constants
-WIDTH, HEIGHT = 800, 600
-BOARD_WIDTH, BOARD_HEIGHT = 700, 500
-PUCK_RADIUS = 20
-HOLE_RADIUS = 25
-DIVIDER_WIDTH = 10
-FPS = 60
-MAX_VELOCITY = 10
-FRICTION = 0.98
-
-# Colors
-BLACK = (0, 0, 0)
-WHITE = (255, 255, 255)
-RED = (255, 0, 0)
-BLUE = (0, 0, 255)
-GREEN = (0, 255, 0)
-YELLOW = (255, 255, 0)
-BROWN = (139, 69, 19)
-GRAY = (200, 200, 200)
-
-# Create the screen
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Pucket: Simplified Version")
-clock = pygame.time.Clock()
+from engine import (
+    PucketEngine, WIDTH, HEIGHT, BOARD_WIDTH, BOARD_HEIGHT, HOLE_RADIUS, DIVIDER_WIDTH,
+    FPS, MAX_VELOCITY, BLACK, WHITE, RED, BLUE, GREEN, YELLOW, BROWN
+)
+from profiler import Profiler
 
 # Debug flag
 DEBUG = False
 
-class Puck:
-    def __init__(self, position, color, player_id):
-        self.position = position
-        self.color = color
-        self.radius = PUCK_RADIUS
-        self.velocity = (0, 0)
-        self.player_id = player_id
-        self.active = True  # Whether the puck is still in play
-    
-    def draw(self):
-        if not self.active:
-            return
-            
-        pygame.draw.circle(screen, self.color, (int(self.position[0]), int(self.position[1])), self.radius)
-        
-        # Draw velocity vector in debug mode
-        if DEBUG and (abs(self.velocity[0]) > 0.1 or abs(self.velocity[1]) > 0.1):
-            end_x = self.position[0] + self.velocity[0] * 5
-            end_y = self.position[1] + self.velocity[1] * 5
-            pygame.draw.line(screen, GREEN, self.position, (end_x, end_y), 2)
-    
-    def update(self):
-        if not self.active:
-            return
-            
-        # Apply friction
-        self.velocity = (self.velocity[0] * FRICTION, self.velocity[1] * FRICTION)
-        
-        # Update position
-        self.position = (
-            self.position[0] + self.velocity[0],
-            self.position[1] + self.velocity[1]
-        )
-        
-        # Check board boundaries
-        if self.position[0] < PUCK_RADIUS:
-            self.position = (PUCK_RADIUS, self.position[1])
-            self.velocity = (-self.velocity[0] * 0.8, self.velocity[1])
-        elif self.position[0] > WIDTH - PUCK_RADIUS:
-            self.position = (WIDTH - PUCK_RADIUS, self.position[1])
-            self.velocity = (-self.velocity[0] * 0.8, self.velocity[1])
-            
-        if self.position[1] < PUCK_RADIUS:
-            self.position = (self.position[0], PUCK_RADIUS)
-            self.velocity = (self.velocity[0], -self.velocity[1] * 0.8)
-        elif self.position[1] > HEIGHT - PUCK_RADIUS:
-            self.position = (self.position[0], HEIGHT - PUCK_RADIUS)
-            self.velocity = (self.velocity[0], -self.velocity[1] * 0.8)
-    
-    def launch(self, angle, power):
-        if not self.active:
-            return
-            
-        power = min(power, MAX_VELOCITY)
-        self.velocity = (
-            power * math.cos(angle),
-            power * math.sin(angle)
-        )
-    
-    def is_stopped(self):
-        return abs(self.velocity[0]) < 0.1 and abs(self.velocity[1]) < 0.1
-
-class Player:
-    def __init__(self, id, name, color, is_ai=False):
-        self.id = id
-        self.name = name
-        self.color = color
-        self.pucks = []
-        self.is_ai = is_ai
-        self.score = 0
-        self.move_made = False  # Flag to track if a move has been made
-    
-    def initialize_pucks(self, count, start_positions):
-        self.pucks = []
-        for i in range(count):
-            position = start_positions[i % len(start_positions)]
-            self.pucks.append(Puck(position, self.color, self.id))
-    
-    def all_pucks_stopped(self):
-        for puck in self.pucks:
-            if puck.active and not puck.is_stopped():
-                return False
-        return True
-            
-    def has_active_pucks(self):
-        for puck in self.pucks:
-            if puck.active:
-                return True
-        return False
+# Portal rings: thick at the entry, thin at the exit
+PURPLE = (128, 0, 160)
+
+# The simulation always advances in 1/FPS steps, whatever the render rate
+SIM_DT = 1.0 / FPS
+# Steps allowed per rendered frame before the simulation falls behind real time
+MAX_STEPS_PER_FRAME = 5
+# Rendered frames between refreshes of the F3 profiler overlay
+OVERLAY_REFRESH_FRAMES = 30
+
+def draw_puck(screen, puck):
+    # Returns the area drawn, or None for pucks out of play
+    if not puck.active:
+        return None
+
+    rect = pygame.draw.circle(screen, puck.color, (int(puck.position[0]), int(puck.position[1])), puck.radius)
+
+    # Draw velocity vector in debug mode
+    if DEBUG and (abs(puck.velocity[0]) > 0.1 or abs(puck.velocity[1]) > 0.1):
+        end_x = puck.position[0] + puck.velocity[0] * 5
+        end_y = puck.position[1] + puck.velocity[1] * 5
+        rect = rect.union(pygame.draw.line(screen, GREEN, puck.position, (end_x, end_y), 2))
+
+    return rect
+
+class TextCache:
+    """Rendered text surfaces keyed by (text, color), least recently used evicted first"""
+    def __init__(self, font, max_size=64):
+        self.font = font
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def render(self, text, color):
+        key = (text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = self.font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
 
 class PucketGame:
-    def __init__(self):
+    """Pygame front end: input and rendering on top of a PucketEngine"""
+    def __init__(self, engine=None, render_fps=FPS, record_path=None, profiler=None, difficulty=None):
+        # Initialize pygame and create the screen
+        pygame.init()
+        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Pucket: Simplified Version")
+        self.clock = pygame.time.Clock()
+        self.render_fps = render_fps
+        # Real time not yet simulated, in seconds
+        self.accumulator = 0.0
+        # Replay file written when a game ends or the window closes
+        self.record_path = record_path
+        self.recorded = False
+        self.font = pygame.font.SysFont('Arial', 24)
+        self.text_cache = TextCache(self.font)
+
+        # Static board layer and the screen areas drawn over it last frame
+        self.board_surface = None
+        self.last_rects = []
+        self.dirty_rects = []
+
+        self.engine = engine if engine is not None else PucketEngine()
+        # Difficulty profile of the AI, chosen again between matches with D
+        self.difficulty = None
+        if difficulty is not None:
+            self.set_difficulty(difficulty)
+        # Hot-path timers: always on when given, else created by F3 and on while it shows
+        self.profiler = profiler
+        self.always_profile = profiler is not None
+        self.engine.profiler = profiler
+        self.profile_lines = []
+        self.rendered_frames = 0
         self.initialize_game()
-        
+
     def initialize_game(self):
-        # Create players
-        self.players = [
-            Player(0, "Player", BLUE, is_ai=False),
-            Player(1, "AI", RED, is_ai=True)
-        ]
-        
-        # Board setup
-        self.board_x = (WIDTH - BOARD_WIDTH) // 2
-        self.board_y = (HEIGHT - BOARD_HEIGHT) // 2
-        
-        # Initialize player pucks
-        self.num_pucks_per_player = 5
-        
-        # Create starting positions
-        player_start_positions = []
-        ai_start_positions = []
-        
-        # Each player's side
-        for i in range(self.num_pucks_per_player):
-            player_start_positions.append((
-                self.board_x + 100 + (i % 3) * 50,
-                self.board_y + 100 + (i // 3) * 60
-            ))
-            
-            ai_start_positions.append((
-                self.board_x + BOARD_WIDTH - 100 - (i % 3) * 50,
-                self.board_y + BOARD_HEIGHT - 100 - (i // 3) * 60
-            ))
-        
-        self.players[0].initialize_pucks(self.num_pucks_per_player, player_start_positions)
-        self.players[1].initialize_pucks(self.num_pucks_per_player, ai_start_positions)
-        
-        # Game state
-        self.current_player_idx = 0
-        self.game_over = False
-        self.winner = None
-        
+        self.engine.initialize_game()
+        self.accumulator = 0.0
+        self.recorded = False
+
         # Launch parameters
         self.launch_power = 0
         self.launch_angle = 0
         self.is_launching = False
         self.selected_puck_idx = 0
-        
-        # Goals (holes)
-        self.goals = self.create_goals()
-        
-        # AI decision timer
-        self.ai_timer = 0
-        self.ai_thinking = False
-        
-        # Turn management
-        self.turn_cooldown = 0
-        self.turn_cooldown_duration = 30  # Half a second at 60 FPS
-        self.all_stopped_frames = 0  # Count frames where pucks are stopped
-        self.required_stopped_frames = 30  # Wait this many frames with all pucks stopped before switching turns
-        
+
         # Debug info
         self.debug_text = ""
-    
-    def create_goals(self):
-        goals = []
-        
-        # Player's goal (on AI side)
-        goals.append((
-            self.board_x + BOARD_WIDTH - 50,
-            self.board_y + BOARD_HEIGHT // 2
-        ))
-        
-        # AI's goal (on player side)
-        goals.append((
-            self.board_x + 50,
-            self.board_y + BOARD_HEIGHT // 2
-        ))
-        
-        return goals
-    
-    def draw_board(self):
+
+        # Pre-render the static board once; the next frame repaints the whole screen
+        self.board_surface = self.render_board()
+        self.last_rects = None
+
+    def set_difficulty(self, name):
+        from difficulty import apply_profile
+        self.difficulty = apply_profile(self.engine, name).name
+
+    def next_difficulty(self):
+        from difficulty import PROFILES
+        names = list(PROFILES)
+        position = names.index(self.difficulty) + 1 if self.difficulty in names else 0
+        self.set_difficulty(names[position % len(names)])
+
+    def render_board(self):
+        surface = pygame.Surface((WIDTH, HEIGHT)).convert()
+        surface.fill(WHITE)
+        self.draw_board(surface)
+        return surface
+
+    def draw_board(self, surface):
+        engine = self.engine
+
         # Draw the board background
-        pygame.draw.rect(screen, BROWN, (self.board_x, self.board_y, BOARD_WIDTH, BOARD_HEIGHT))
-        
-        # Draw the center divider
-        pygame.draw.rect(screen, BLACK, 
-                         (WIDTH // 2 - DIVIDER_WIDTH // 2, 
-                          self.board_y, 
-                          DIVIDER_WIDTH, 
-                          BOARD_HEIGHT))
-        
+        pygame.draw.rect(surface, BROWN, (engine.board_x, engine.board_y, BOARD_WIDTH, BOARD_HEIGHT))
+
+        # Draw the center divider, unless the layout has a real one
+        if engine.layout.painted_divider:
+            pygame.draw.rect(surface, BLACK,
+                             (WIDTH // 2 - DIVIDER_WIDTH // 2,
+                              engine.board_y,
+                              DIVIDER_WIDTH,
+                              BOARD_HEIGHT))
+
+        # Draw the obstacles; they never move, so they live on the static layer
+        for wall in engine.layout.walls:
+            pygame.draw.line(surface, BLACK, (wall.x1, wall.y1), (wall.x2, wall.y2), max(1, round(wall.thickness)))
+        for bumper in engine.layout.bumpers:
+            pygame.draw.circle(surface, YELLOW, (round(bumper.x), round(bumper.y)), round(bumper.radius))
+            pygame.draw.circle(surface, BLACK, (round(bumper.x), round(bumper.y)), round(bumper.radius), 2)
+        for portal in engine.layout.portals:
+            pygame.draw.circle(surface, PURPLE, (round(portal.x1), round(portal.y1)), round(portal.radius), 4)
+            pygame.draw.circle(surface, PURPLE, (round(portal.x2), round(portal.y2)), round(portal.radius), 1)
+
         # Draw the goals (holes)
-        for goal in self.goals:
-            pygame.draw.circle(screen, BLACK, goal, HOLE_RADIUS)
-    
+        for goal in engine.goals:
+            pygame.draw.circle(surface, BLACK, goal, HOLE_RADIUS)
+
     def draw_game_state(self):
-        # Clear the screen
-        screen.fill(WHITE)
-        
-        # Draw the board
-        self.draw_board()
-        
+        engine = self.engine
+        screen = self.screen
+        text = self.text_cache.render
+
+        # Restore the board under last frame's pucks and text, or all of it after a restart
+        if self.last_rects is None:
+            screen.blit(self.board_surface, (0, 0))
+            dirty = [screen.get_rect()]
+        else:
+            for rect in self.last_rects:
+                screen.blit(self.board_surface, rect, rect)
+            dirty = self.last_rects
+        drawn = []
+
         # Draw pucks
-        for player in self.players:
-            for puck in player.pucks:
-                puck.draw()
-        
+        for puck in engine.pucks:
+            rect = draw_puck(screen, puck)
+            if rect is not None:
+                drawn.append(rect)
+
         # Draw launch line if launching
-        if self.is_launching and not self.players[self.current_player_idx].is_ai:
+        if self.is_launching and not engine.current_player().is_ai:
             selected_puck = self.get_selected_puck()
             if selected_puck and selected_puck.active:
                 end_x = selected_puck.position[0] + math.cos(self.launch_angle) * self.launch_power * 5
                 end_y = selected_puck.position[1] + math.sin(self.launch_angle) * self.launch_power * 5
-                pygame.draw.line(screen, BLACK, selected_puck.position, (end_x, end_y), 2)
-        
+                drawn.append(pygame.draw.line(screen, BLACK, selected_puck.position, (end_x, end_y), 2))
+
         # Draw scores and current player indicator
-        font = pygame.font.SysFont('Arial', 24)
-        
-        player_text = f"{self.players[0].name}: {self.players[0].score}"
-        ai_text = f"{self.players[1].name}: {self.players[1].score}"
-        
-        player_surface = font.render(player_text, True, BLUE)
-        ai_surface = font.render(ai_text, True, RED)
-        
-        screen.blit(player_surface, (20, 20))
-        screen.blit(ai_surface, (WIDTH - 20 - ai_surface.get_width(), 20))
-        
+        player_surface = text(f"{engine.players[0].name}: {engine.players[0].score}", BLUE)
+        ai_surface = text(f"{engine.players[1].name}: {engine.players[1].score}", RED)
+
+        drawn.append(screen.blit(player_surface, (20, 20)))
+        drawn.append(screen.blit(ai_surface, (WIDTH - 20 - ai_surface.get_width(), 20)))
+
         # Current player indicator
-        current_text = f"Current Turn: {self.players[self.current_player_idx].name}"
-        current_surface = font.render(current_text, True, BLACK)
-        screen.blit(current_surface, (WIDTH // 2 - current_surface.get_width() // 2, 20))
-        
+        current_surface = text(f"Current Turn: {engine.current_player().name}", BLACK)
+        drawn.append(screen.blit(current_surface, (WIDTH // 2 - current_surface.get_width() // 2, 20)))
+
+        # Thinking indicator while the AI works in the background
+        if engine.ai_thinking and engine.current_player().is_ai and not engine.game_over:
+            dots = "." * (1 + (engine.frame // 15) % 3)
+            thinking_surface = text(f"{engine.current_player().name} is thinking{dots}", BLACK)
+            drawn.append(screen.blit(thinking_surface, (WIDTH // 2 - thinking_surface.get_width() // 2, 50)))
+
         # Game over message
-        if self.game_over and self.winner:
-            over_text = f"Game Over! {self.winner.name} Wins!"
-            over_surface = font.render(over_text, True, BLACK)
-            restart_text = "Press R to Restart"
-            restart_surface = font.render(restart_text, True, BLACK)
-            
-            screen.blit(over_surface, (WIDTH // 2 - over_surface.get_width() // 2, HEIGHT // 2 - 30))
-            screen.blit(restart_surface, (WIDTH // 2 - restart_surface.get_width() // 2, HEIGHT // 2 + 10))
-        
-        # Debug info
+        if engine.game_over and engine.winner:
+            over_surface = text(f"Game Over! {engine.winner.name} Wins!", BLACK)
+            restart_surface = text(f"Press R to Restart, D for difficulty ({self.difficulty or 'default'})", BLACK)
+
+            drawn.append(screen.blit(over_surface, (WIDTH // 2 - over_surface.get_width() // 2, HEIGHT // 2 - 30)))
+            drawn.append(screen.blit(restart_surface, (WIDTH // 2 - restart_surface.get_width() // 2, HEIGHT // 2 + 10)))
+
+        # Debug info, with the profiler timers above it
         if DEBUG:
-            debug_surface = font.render(self.debug_text, True, BLACK)
-            screen.blit(debug_surface, (20, HEIGHT - 30))
-    
+            debug_surface = text(self.debug_text, BLACK)
+            drawn.append(screen.blit(debug_surface, (20, HEIGHT - 30)))
+            for k, line in enumerate(reversed(self.profile_lines)):
+                line_surface = text(line, BLACK)
+                drawn.append(screen.blit(line_surface, (20, HEIGHT - 60 - 26 * k)))
+
+        # Only the areas erased or drawn this frame go to the display
+        self.dirty_rects = dirty + drawn
+        self.last_rects = drawn
+
     def get_selected_puck(self):
-        current_player = self.players[self.current_player_idx]
-        active_pucks = [p for p in current_player.pucks if p.active]
-        
+        active_pucks = self.engine.active_pucks()
+
         if not active_pucks:
             return None
-            
+
         self.selected_puck_idx = self.selected_puck_idx % len(active_pucks)
         return active_pucks[self.selected_puck_idx]
-    
+
     def handle_input(self):
+        engine = self.engine
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                # Cancel any background AI work before leaving
+                self.save_replay()
+                engine.shutdown()
                 pygame.quit()
                 sys.exit()
-                
-            if self.game_over:
+
+            # Toggle debug mode with F3
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.toggle_debug()
+
+            if engine.game_over:
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+                    self.save_replay()
                     self.initialize_game()
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_d:
+                    # Takes effect from the next match
+                    self.next_difficulty()
                 continue
-                
-            if self.players[self.current_player_idx].is_ai:
+
+            if engine.current_player().is_ai:
                 continue
-                
+
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_TAB:
                     # Switch selected puck
                     self.selected_puck_idx += 1
-                
-                # Toggle debug mode with F3
-                if event.key == pygame.K_F3:
-                    global DEBUG
-                    DEBUG = not DEBUG
-                    
+
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 # Start launching
                 self.is_launching = True
-                
+
             if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
                 # Finish launching
                 if self.is_launching:
-                    selected_puck = self.get_selected_puck()
-                    if selected_puck:
-                        selected_puck.launch(self.launch_angle, self.launch_power)
-                        # Mark that a move has been made
-                        self.players[self.current_player_idx].move_made = True
-                        # Reset frames counter
-                        self.all_stopped_frames = 0
+                    engine.launch(self.get_selected_puck(), self.launch_angle, self.launch_power)
                     self.is_launching = False
                     self.launch_power = 0
-        
+
         # Update launch parameters based on mouse position if launching
-        if self.is_launching and not self.players[self.current_player_idx].is_ai:
+        if self.is_launching and not engine.current_player().is_ai:
             mouse_pos = pygame.mouse.get_pos()
             selected_puck = self.get_selected_puck()
-            
+
             if selected_puck:
                 dx = mouse_pos[0] - selected_puck.position[0]
                 dy = mouse_pos[1] - selected_puck.position[1]
-                
+
                 self.launch_angle = math.atan2(dy, dx)
                 distance = math.sqrt(dx*dx + dy*dy)
                 self.launch_power = min(distance / 20, MAX_VELOCITY)
-    
-    def update_game_state(self):
-        # Update pucks
-        for player in self.players:
-            for puck in player.pucks:
-                puck.update()
-        
-        # Check collisions between pucks
-        self.check_puck_collisions()
-        
-        # Check goal collisions
-        self.check_goal_collisions()
-        
-        # Turn management
-        self.manage_turns()
-        
-        # Check win condition
-        for player in self.players:
-            if not player.has_active_pucks():
-                self.game_over = True
-                self.winner = player
-        
+
+    def toggle_debug(self):
+        global DEBUG
+        DEBUG = not DEBUG
+        if DEBUG and self.profiler is None:
+            self.profiler = Profiler()
+        if not self.always_profile:
+            # Timers run only while the overlay shows them
+            self.engine.profiler = self.profiler if DEBUG else None
+        self.profile_lines = []
+
+    def save_replay(self):
+        # Each game is written once; with several games only the latest is kept
+        if self.record_path is None or self.recorded:
+            return
+        from replay import ReplayLog
+        ReplayLog.from_engine(self.engine).save(self.record_path)
+        self.recorded = True
+
+    def update_game_state(self, elapsed):
+        engine = self.engine
+
+        # AI moves and physics in fixed steps for the real time that has passed
+        self.accumulator += elapsed
+        steps = 0
+        while self.accumulator >= SIM_DT and steps < MAX_STEPS_PER_FRAME:
+            engine.step()
+            self.accumulator -= SIM_DT
+            steps += 1
+        if steps == MAX_STEPS_PER_FRAME:
+            # Too slow to keep up: drop the backlog rather than spiral
+            self.accumulator = min(self.accumulator, SIM_DT)
+        if engine.game_over:
+            self.save_replay()
+
         # Update debug text
         if DEBUG:
-            current_player = self.players[self.current_player_idx]
-            self.debug_text = f"Player: {self.current_player_idx}, Move Made: {current_player.move_made}, Stopped Frames: {self.all_stopped_frames}, Cooldown: {self.turn_cooldown}"
-    
-    def manage_turns(self):
-        # If turn cooldown is active, decrement it
-        if self.turn_cooldown > 0:
-            self.turn_cooldown -= 1
-            return
+            current_player = engine.current_player()
+            self.debug_text = f"FPS: {self.clock.get_fps():.0f}, Player: {engine.current_player_idx}, Move Made: {current_player.move_made}, Stopped Frames: {engine.all_stopped_frames}, Cooldown: {engine.turn_cooldown}"
+            # Refresh the timers now and then, so they stay readable
+            if self.rendered_frames % OVERLAY_REFRESH_FRAMES == 0 and self.profiler is not None:
+                self.profile_lines = self.profiler.lines()
+                # The search AI's last decision, under the timers
+                stats = getattr(engine.ai, "last_stats", None)
+                if stats is not None:
+                    self.profile_lines.append(f"search    depth {stats.depth}  {stats.nodes_per_sec:.0f} nodes/s  "
+                                              f"TT hits {stats.tt_hit_rate:.0%}")
 
-        # Check if the current player's pucks have all stopped
-        if self.players[self.current_player_idx].all_pucks_stopped():
-            # Only count frames if a move has been made
-            if self.players[self.current_player_idx].move_made:
-                self.all_stopped_frames += 1
-                
-                # If pucks have been stopped for enough frames, switch turns
-                if self.all_stopped_frames >= self.required_stopped_frames:
-                    # Reset for next player
-                    self.all_stopped_frames = 0
-                    
-                    # Switch to the other player
-                    self.current_player_idx = (self.current_player_idx + 1) % len(self.players)
-                    
-                    # Reset move made flag for the new player
-                    self.players[self.current_player_idx].move_made = False
-                    
-                    # Set a cooldown before the new player can make a move
-                    self.turn_cooldown = self.turn_cooldown_duration
-                    
-                    # Reset AI thinking state
-                    if self.players[self.current_player_idx].is_ai:
-                        self.ai_thinking = False
-                        self.ai_timer = 0
-    
-    def check_puck_collisions(self):
-        # Check collisions between pairs of pucks
-        for i, player1 in enumerate(self.players):
-            for puck1 in player1.pucks:
-                if not puck1.active:
-                    continue
-                    
-                # Check collision with other pucks
-                for j, player2 in enumerate(self.players):
-                    for puck2 in player2.pucks:
-                        if puck1 == puck2 or not puck2.active:
-                            continue
-                            
-                        dx = puck2.position[0] - puck1.position[0]
-                        dy = puck2.position[1] - puck1.position[1]
-                        distance = math.sqrt(dx*dx + dy*dy)
-                        
-                        # Prevent division by zero
-                        if distance < 0.0001:
-                            # Pucks are exactly in the same position - move one slightly
-                            puck2.position = (
-                                puck2.position[0] + random.uniform(0.1, 1.0),
-                                puck2.position[1] + random.uniform(0.1, 1.0)
-                            )
-                            # Recalculate after adjustment
-                            dx = puck2.position[0] - puck1.position[0]
-                            dy = puck2.position[1] - puck1.position[1]
-                            distance = math.sqrt(dx*dx + dy*dy)
-                        
-                        if distance < puck1.radius + puck2.radius:
-                            # Collision handling: elastic collision
-                            # Calculate collision normal
-                            nx = dx / distance
-                            ny = dy / distance
-                            
-                            # Calculate relative velocity
-                            vx = puck1.velocity[0] - puck2.velocity[0]
-                            vy = puck1.velocity[1] - puck2.velocity[1]
-                            
-                            # Calculate velocity component along the normal
-                            vn = vx * nx + vy * ny
-                            
-                            # Don't process collision if pucks are moving away from each other
-                            if vn > 0:
-                                continue
-                            
-                            # Calculate impulse
-                            impulse = -1.8 * vn / 2  # Slightly less elastic for stability
-                            
-                            # Apply impulse to velocities
-                            puck1.velocity = (
-                                puck1.velocity[0] + impulse * nx,
-                                puck1.velocity[1] + impulse * ny
-                            )
-                            
-                            puck2.velocity = (
-                                puck2.velocity[0] - impulse * nx,
-                                puck2.velocity[1] - impulse * ny
-                            )
-                            
-                            # Separate the pucks to prevent sticking
-                            overlap = 0.5 * (puck1.radius + puck2.radius - distance)
-                            puck1.position = (
-                                puck1.position[0] - overlap * nx,
-                                puck1.position[1] - overlap * ny
-                            )
-                            
-                            puck2.position = (
-                                puck2.position[0] + overlap * nx,
-                                puck2.position[1] + overlap * ny
-                            )
-    
-    def check_goal_collisions(self):
-        for player_idx, player in enumerate(self.players):
-            opponent_idx = (player_idx + 1) % len(self.players)
-            opponent_goal = self.goals[player_idx]
-            
-            for puck in player.pucks:
-                if not puck.active:
-                    continue
-                    
-                # Check if puck is in the opponent's goal
-                dx = puck.position[0] - opponent_goal[0]
-                dy = puck.position[1] - opponent_goal[1]
-                distance = math.sqrt(dx*dx + dy*dy)
-                
-                if distance < HOLE_RADIUS - 5:  # Little margin to make it easier
-                    # Puck is in goal
-                    puck.active = False
-                    player.score += 1
-                    
-                    # Check if all pucks from this player are in goals
-                    if not player.has_active_pucks():
-                        self.game_over = True
-                        self.winner = player
-    
-    def ai_make_move(self):
-        """Simple AI strategy for stability"""
-        if not self.players[self.current_player_idx].is_ai:
-            return
-        
-        # Don't make a move if the AI player has already made one this turn
-        if self.players[self.current_player_idx].move_made:
-            return
-            
-        if not self.ai_thinking:
-            self.ai_thinking = True
-            self.ai_timer = 0
-            
-        # Simulate thinking time
-        self.ai_timer += 1
-        if self.ai_timer < 30:  # Half a second delay
-            return
-            
-        # Reset thinking flag
-        self.ai_thinking = False
-        
-        # Get active pucks
-        ai_player = self.players[self.current_player_idx]
-        active_pucks = [p for p in ai_player.pucks if p.active]
-        
-        if not active_pucks:
-            return
-        
-        # Simple AI: Aim for the goal with a random puck
-        selected_puck = random.choice(active_pucks)
-        opponent_goal = self.goals[self.current_player_idx]
-        
-        # Calculate angle to the goal
-        dx = opponent_goal[0] - selected_puck.position[0]
-        dy = opponent_goal[1] - selected_puck.position[1]
-        angle = math.atan2(dy, dx)
-        
-        # Add some randomness
-        angle += random.uniform(-0.2, 0.2)
-        
-        # Calculate power based on distance
-        distance = math.sqrt(dx*dx + dy*dy)
-        power = min(distance / 50, MAX_VELOCITY * 0.8)  # 80% of max to increase accuracy
-        
-        # Launch the puck
-        selected_puck.launch(angle, power)
-        
-        # Mark that the AI has made a move
-        self.players[self.current_player_idx].move_made = True
-        
-        # Reset the stopped frames counter
-        self.all_stopped_frames = 0
-    
     def run_game(self):
         try:
+            elapsed = 0.0
             while True:
-                # Handle input
-                self.handle_input()
-                
-                # AI player's turn
-                if self.players[self.current_player_idx].is_ai and not self.game_over:
-                    self.ai_make_move()
-                
-                # Update game state
-                self.update_game_state()
-                
-                # Draw the game
-                self.draw_game_state()
-                
-                # Update the display
-                pygame.display.update()
-                
-                # Cap the frame rate
-                clock.tick(FPS)
+                profiler = self.engine.profiler
+                if profiler is None:
+                    # Handle input
+                    self.handle_input()
+
+                    # Update game state
+                    self.update_game_state(elapsed)
+
+                    # Draw the game
+                    self.draw_game_state()
+                else:
+                    # The same, timed
+                    started = time.perf_counter()
+                    self.handle_input()
+                    handled = time.perf_counter()
+                    self.update_game_state(elapsed)
+                    updated = time.perf_counter()
+                    self.draw_game_state()
+                    profiler.record("input", handled - started)
+                    profiler.record("draw", time.perf_counter() - updated)
+                self.rendered_frames += 1
+
+                # Update the changed parts of the display
+                pygame.display.update(self.dirty_rects)
+
+                # Cap the render rate; the simulation catches up on the time passed
+                elapsed = self.clock.tick(self.render_fps) / 1000.0
         except Exception as e:
             # Print any errors and continue running
             print(f"Error: {e}")
@@ -570,7 +372,45 @@ class PucketGame:
             self.initialize_game()
             self.run_game()
 
+def create_ai(name, model_path=None):
+    # AI opponents selectable from the command line
+    if name == "montecarlo":
+        from montecarlo import MonteCarloAI
+        return MonteCarloAI()
+    if name == "minimax":
+        from minimax import AlphaBetaAI
+        return AlphaBetaAI()
+    if name == "aim":
+        # The table is loaded or built here, before the first move
+        from aim import AimTableAI, DEFAULT_TABLE
+        goals = PucketEngine(ai_players=(), seed=0, record_shots=False).goals
+        return AimTableAI(table_path=DEFAULT_TABLE, goals=goals)
+    if name == "grid":
+        from candidates import GridAI
+        return GridAI()
+    if name == "learned":
+        from learned import LearnedAI, DEFAULT_MODEL
+        return LearnedAI(model_path=model_path or DEFAULT_MODEL)
+    return None
+
 # Run the game if this script is executed
 if __name__ == "__main__":
-    game = PucketGame()
-    game.run_game()
\ No newline at end of file
+    from difficulty import PROFILES
+
+    parser = argparse.ArgumentParser(description="Pucket: Simplified Version")
+    parser.add_argument("--ai", choices=["simple", "montecarlo", "minimax", "aim", "grid", "learned"], default="simple", help="AI opponent")
+    parser.add_argument("--difficulty", choices=list(PROFILES), default=None,
+                        help="AI difficulty profile (overrides --ai); D changes it between matches")
+    parser.add_argument("--model", metavar="PATH", default=None, help="model trained by learned.py for --ai learned")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the first game")
+    parser.add_argument("--record", metavar="PATH", default=None, help="save a replay of the game to PATH")
+    parser.add_argument("--render-fps", type=int, default=FPS, help="render rate; the simulation stays at %d steps/s" % FPS)
+    parser.add_argument("--layout", default="classic",
+                        help="board layout: classic, divider, bumpers, portals, or a JSON file from layout.py")
+    parser.add_argument("--metrics", metavar="PATH", default=None, help="profile the hot paths and append them to PATH as JSON lines")
+    args = parser.parse_args()
+
+    profiler = Profiler(dump_path=args.metrics) if args.metrics else None
+    engine = PucketEngine(ai=create_ai(args.ai, args.model), seed=args.seed, layout=args.layout)
+    game = PucketGame(engine, args.render_fps, args.record, profiler, args.difficulty)
+    game.run_game()
@@ -0,0 +1,282 @@
+import json
+import math
+import random
+from collections import namedtuple
+from functools import lru_cache
+
+from engine import WIDTH, HEIGHT, BOARD_WIDTH, BOARD_HEIGHT, DIVIDER_WIDTH, MAX_VELOCITY
+
+# Static obstacles. A wall is a segment of the given thickness; a bumper is a circle
+# that kicks pucks back harder than they hit it; a portal moves a puck that runs into
+# its entry circle to the same spot relative to its exit, keeping its velocity
+Wall = namedtuple("Wall", "x1 y1 x2 y2 thickness")
+Bumper = namedtuple("Bumper", "x y radius restitution")
+Portal = namedtuple("Portal", "x1 y1 x2 y2 radius")
+
+# Restitution of walls, as for the screen edges in Puck.update
+WALL_RESTITUTION = 0.8
+
+BOARD_X = (WIDTH - BOARD_WIDTH) // 2
+BOARD_Y = (HEIGHT - BOARD_HEIGHT) // 2
+
+class Layout(namedtuple("Layout", "name walls bumpers portals painted_divider")):
+    """A board's static obstacles, as plain data that round-trips through JSON
+
+    painted_divider draws the classic centre divider, which has no physics; layouts
+    with a real divider give it as walls instead.
+    """
+    __slots__ = ()
+
+    @property
+    def empty(self):
+        return not (self.walls or self.bumpers or self.portals)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "walls": [list(wall) for wall in self.walls],
+            "bumpers": [list(bumper) for bumper in self.bumpers],
+            "portals": [list(portal) for portal in self.portals],
+            "painted_divider": self.painted_divider,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get("name", "custom"),
+            tuple(Wall(*wall) for wall in data.get("walls", ())),
+            tuple(Bumper(*bumper) for bumper in data.get("bumpers", ())),
+            tuple(Portal(*portal) for portal in data.get("portals", ())),
+            data.get("painted_divider", False),
+        )
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+def divider(gap=0, thickness=DIVIDER_WIDTH):
+    # The centre divider as walls, with a gap of the given height in the middle
+    x = WIDTH / 2
+    top, bottom = BOARD_Y, BOARD_Y + BOARD_HEIGHT
+    if gap <= 0:
+        return (Wall(x, top, x, bottom, thickness),)
+    middle = HEIGHT / 2
+    return (
+        Wall(x, top, x, middle - gap / 2, thickness),
+        Wall(x, middle + gap / 2, x, bottom, thickness),
+    )
+
+def scattered(count, seed=1, radius=12, restitution=1.1):
+    # count bumpers spread over the board, clear of the starting rows and the goals,
+    # for stress-testing large layouts
+    rng = random.Random(seed)
+    keep_clear = [(BOARD_X + 150, BOARD_Y + 130, 140), (WIDTH - BOARD_X - 150, HEIGHT - BOARD_Y - 130, 140),
+                  (BOARD_X + 50, HEIGHT / 2, 60), (WIDTH - BOARD_X - 50, HEIGHT / 2, 60)]
+    bumpers = []
+    while len(bumpers) < count:
+        x = rng.uniform(BOARD_X + radius, BOARD_X + BOARD_WIDTH - radius)
+        y = rng.uniform(BOARD_Y + radius, BOARD_Y + BOARD_HEIGHT - radius)
+        if all(math.hypot(x - cx, y - cy) > clear for cx, cy, clear in keep_clear):
+            bumpers.append(Bumper(x, y, radius, restitution))
+    return Layout(f"scattered_{count}", (), tuple(bumpers), (), False)
+
+LAYOUTS = {
+    # The original board: the divider is only painted on
+    "classic": Layout("classic", (), (), (), True),
+    "divider": Layout("divider", divider(gap=120), (), (), False),
+    "bumpers": Layout("bumpers", divider(gap=160), (
+        Bumper(320, 300, 22, 1.2),
+        Bumper(480, 300, 22, 1.2),
+        Bumper(400, 140, 16, 1.2),
+        Bumper(400, 460, 16, 1.2),
+    ), (), False),
+    "portals": Layout("portals", divider() + (
+        Wall(BOARD_X + 250, BOARD_Y + 200, BOARD_X + 250, BOARD_Y + 300, 8),
+        Wall(WIDTH - BOARD_X - 250, BOARD_Y + 200, WIDTH - BOARD_X - 250, BOARD_Y + 300, 8),
+    ), (), (
+        Portal(340, 200, 460, 200, 24),
+        Portal(460, 400, 340, 400, 24),
+    ), False),
+}
+
+def get_layout(name_or_path):
+    # A built-in layout by name, or one loaded from a JSON file
+    if name_or_path is None:
+        return LAYOUTS["classic"]
+    if isinstance(name_or_path, Layout):
+        return name_or_path
+    if name_or_path in LAYOUTS:
+        return LAYOUTS[name_or_path]
+    if name_or_path.startswith("scattered_"):
+        return scattered(int(name_or_path.split("_", 1)[1]))
+    return Layout.load(name_or_path)
+
+def segment_distance(px, py, x1, y1, x2, y2):
+    # Distance from a point to a segment and the closest point on it
+    dx = x2 - x1
+    dy = y2 - y1
+    length2 = dx*dx + dy*dy
+    t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length2))
+    qx = x1 + t * dx
+    qy = y1 + t * dy
+    return math.hypot(px - qx, py - qy), qx, qy
+
+class StaticIndex:
+    """Precomputed grid over a layout's obstacles for pucks of one radius
+
+    Every cell lists the walls, bumpers and portals a puck centred anywhere in that
+    cell could touch, so a moving puck only tests the geometry near it and the cost
+    per puck stays flat however many obstacles the board has. Built once per layout
+    and radius (see static_index); nothing is allocated per frame.
+    """
+    def __init__(self, layout, radius, cell_size=20):
+        self.layout = layout
+        self.radius = radius
+        self.cell_size = cell_size
+        self.columns = int(math.ceil(WIDTH / cell_size))
+        self.rows = int(math.ceil(HEIGHT / cell_size))
+        found = [((), (), ()) for _ in range(self.columns * self.rows)]
+        # Each obstacle goes into the cells within reach of its bounding box, then
+        # stays in those whose rectangle comes close enough to touch
+        for wall in layout.walls:
+            reach = radius + wall.thickness / 2
+            for cell, left, top in self.cells_near(min(wall.x1, wall.x2), min(wall.y1, wall.y2),
+                                                   max(wall.x1, wall.x2), max(wall.y1, wall.y2), reach):
+                # Conservative: from the cell's centre, plus its half diagonal
+                half = cell_size / 2
+                distance = segment_distance(left + half, top + half, wall.x1, wall.y1, wall.x2, wall.y2)[0]
+                if distance < reach + half * math.sqrt(2):
+                    walls, bumpers, portals = found[cell]
+                    found[cell] = (walls + (wall,), bumpers, portals)
+        for bumper in layout.bumpers:
+            reach = radius + bumper.radius
+            for cell, left, top in self.cells_near(bumper.x, bumper.y, bumper.x, bumper.y, reach):
+                if self.rect_distance(bumper.x, bumper.y, left, top) < reach:
+                    walls, bumpers, portals = found[cell]
+                    found[cell] = (walls, bumpers + (bumper,), portals)
+        for portal in layout.portals:
+            for cell, left, top in self.cells_near(portal.x1, portal.y1, portal.x1, portal.y1, portal.radius):
+                if self.rect_distance(portal.x1, portal.y1, left, top) < portal.radius:
+                    walls, bumpers, portals = found[cell]
+                    found[cell] = (walls, bumpers, portals + (portal,))
+        self.cells = [cell if any(cell) else None for cell in found]
+
+    def cells_near(self, x1, y1, x2, y2, reach):
+        # (cell, left, top) of the cells overlapping a box grown by reach
+        size = self.cell_size
+        for column in range(max(0, int((x1 - reach) // size)), min(self.columns, int((x2 + reach) // size) + 1)):
+            for row in range(max(0, int((y1 - reach) // size)), min(self.rows, int((y2 + reach) // size) + 1)):
+                yield column * self.rows + row, column * size, row * size
+
+    def rect_distance(self, x, y, left, top):
+        # Distance from a point to the nearest point of a cell
+        dx = max(left - x, 0.0, x - (left + self.cell_size))
+        dy = max(top - y, 0.0, y - (top + self.cell_size))
+        return math.hypot(dx, dy)
+
+    def collide(self, pucks, data):
+        """Push the moving pucks out of the obstacles they overlap, in place
+
+        data is the engine's PuckArray data. Walls and bumpers reflect the velocity
+        of a puck moving into them; portals move a puck heading into one.
+        """
+        cell_size = self.cell_size
+        rows = self.rows
+        cells = self.cells
+        radius = self.radius
+        for puck in pucks:
+            if not puck.active or puck.sleeping:
+                continue
+            k = puck.base
+            x = data[k]
+            y = data[k + 1]
+            column = int(x // cell_size)
+            row = int(y // cell_size)
+            if not (0 <= column < self.columns and 0 <= row < rows):
+                continue
+            cell = cells[column * rows + row]
+            if cell is None:
+                continue
+            walls, bumpers, portals = cell
+
+            for wall in walls:
+                distance, qx, qy = segment_distance(x, y, wall.x1, wall.y1, wall.x2, wall.y2)
+                contact = radius + wall.thickness / 2
+                if distance >= contact:
+                    continue
+                if distance < 0.0001:
+                    # Centre on the wall's line: push out along its normal
+                    length = math.hypot(wall.x2 - wall.x1, wall.y2 - wall.y1) or 1.0
+                    nx = -(wall.y2 - wall.y1) / length
+                    ny = (wall.x2 - wall.x1) / length
+                else:
+                    nx = (x - qx) / distance
+                    ny = (y - qy) / distance
+                x = qx + nx * contact
+                y = qy + ny * contact
+                self.bounce(data, k, nx, ny, WALL_RESTITUTION)
+
+            for bumper in bumpers:
+                dx = x - bumper.x
+                dy = y - bumper.y
+                distance = math.hypot(dx, dy)
+                contact = radius + bumper.radius
+                if distance >= contact or distance < 0.0001:
+                    continue
+                nx = dx / distance
+                ny = dy / distance
+                x = bumper.x + nx * contact
+                y = bumper.y + ny * contact
+                self.bounce(data, k, nx, ny, bumper.restitution)
+
+            for portal in portals:
+                dx = x - portal.x1
+                dy = y - portal.y1
+                # Only a puck heading into the entry goes through, so one that comes
+                # out next to it is not sent back
+                if dx*dx + dy*dy < portal.radius * portal.radius and dx * data[k + 2] + dy * data[k + 3] < 0:
+                    x = portal.x2 + dx
+                    y = portal.y2 + dy
+                    break
+
+            data[k] = x
+            data[k + 1] = y
+            if walls or bumpers:
+                puck.track_motion()
+
+    @staticmethod
+    def bounce(data, k, nx, ny, restitution):
+        # Reflect the velocity's normal part if the puck moves into the surface,
+        # keeping the speed under MAX_VELOCITY when the surface kicks
+        vx = data[k + 2]
+        vy = data[k + 3]
+        vn = vx * nx + vy * ny
+        if vn >= 0:
+            return
+        vx -= (1 + restitution) * vn * nx
+        vy -= (1 + restitution) * vn * ny
+        speed = math.hypot(vx, vy)
+        if speed > MAX_VELOCITY:
+            vx *= MAX_VELOCITY / speed
+            vy *= MAX_VELOCITY / speed
+        data[k + 2] = vx
+        data[k + 3] = vy
+
+@lru_cache(maxsize=32)
+def static_index(layout, radius):
+    # Shared by every engine on the same layout and puck radius; None for no obstacles
+    return None if layout.empty else StaticIndex(layout, radius)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a built-in board layout to a JSON file to edit")
+    parser.add_argument("layout", help="built-in layout: " + ", ".join(LAYOUTS) + ", or scattered_N")
+    parser.add_argument("path")
+    args = parser.parse_args()
+    get_layout(args.layout).save(args.path)
@@ -0,0 +1,263 @@
+import argparse
+import math
+import time
+
+from vector_physics import np, require_numpy
+from engine import PucketEngine, Shot
+from evaluation import shot_score
+from selfplay import FEATURES, FEATURES_VERSION, features, sample_shots, load_dataset
+
+MODEL_VERSION = 1
+DEFAULT_MODEL = "value_model.npz"
+
+class ValueModel:
+    """Small two-headed network over (board, shot) features, in plain NumPy
+
+    A trunk of two ReLU layers feeds a policy head, a logit for how good a shot is
+    next to the other candidates on its board, and a value head, the outcome of the
+    game the shooter can expect after it, in [-1, 1]. Inputs are standardized with
+    the mean and spread of the training data, which are saved with the weights.
+    """
+    PARAMETERS = ("w1", "b1", "w2", "b2", "wp", "bp", "wv", "bv")
+
+    def __init__(self, params, mean, std):
+        self.params = {name: np.asarray(params[name], dtype=np.float32) for name in self.PARAMETERS}
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.std = np.asarray(std, dtype=np.float32)
+
+    @classmethod
+    def initial(cls, hidden=32, seed=1, inputs=FEATURES):
+        # Untrained weights (He initialization) and an identity standardization
+        rng = np.random.default_rng(seed)
+        params = {
+            "w1": rng.normal(0.0, math.sqrt(2.0 / inputs), (inputs, hidden)),
+            "b1": np.zeros(hidden),
+            "w2": rng.normal(0.0, math.sqrt(2.0 / hidden), (hidden, hidden)),
+            "b2": np.zeros(hidden),
+            "wp": rng.normal(0.0, math.sqrt(1.0 / hidden), hidden),
+            "bp": np.zeros(()),
+            "wv": rng.normal(0.0, math.sqrt(1.0 / hidden), hidden),
+            "bv": np.zeros(()),
+        }
+        return cls(params, np.zeros(inputs), np.ones(inputs))
+
+    @property
+    def hidden(self):
+        return self.params["w1"].shape[1]
+
+    def forward(self, x):
+        # (logits, values) of a (C, FEATURES) batch, one matrix product per layer
+        p = self.params
+        z = (np.asarray(x, dtype=np.float32) - self.mean) / self.std
+        h = np.maximum(z @ p["w1"] + p["b1"], 0.0)
+        h = np.maximum(h @ p["w2"] + p["b2"], 0.0)
+        return h @ p["wp"] + p["bp"], np.tanh(h @ p["wv"] + p["bv"])
+
+    def rank(self, x, value_weight=1.0):
+        # One score per candidate: the policy logit plus the weighted value
+        logits, values = self.forward(x)
+        return logits + value_weight * values
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, version=MODEL_VERSION, features_version=FEATURES_VERSION, mean=self.mean, std=self.std,
+                     **self.params)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["version"]) != MODEL_VERSION:
+                raise ValueError(f"Unsupported model version: {int(data['version'])}")
+            if int(data["features_version"]) != FEATURES_VERSION:
+                raise ValueError("Model was trained on different features")
+            return cls({name: data[name] for name in cls.PARAMETERS}, data["mean"], data["std"])
+
+def softmax(x):
+    e = np.exp(x - x.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+def losses(model, data, temperature=20.0):
+    """Policy cross-entropy, top-1 agreement and value error on a dataset
+
+    The policy target of a position is the softmax of its candidates' shot scores
+    at the given temperature; top-1 is how often the highest logit picks the
+    highest-scoring candidate. The value error is over the shots actually played.
+    """
+    positions, candidates, _ = data["features"].shape
+    logits, values = model.forward(data["features"].reshape(-1, FEATURES))
+    logits = logits.reshape(positions, candidates)
+    values = values.reshape(positions, candidates)[np.arange(positions), data["played"]]
+    target = softmax(data["scores"] / temperature)
+    predicted = softmax(logits)
+    return {
+        "policy": float(-(target * np.log(predicted + 1e-12)).sum(axis=1).mean()),
+        "top1": float((logits.argmax(axis=1) == data["scores"].argmax(axis=1)).mean()),
+        "value": float(((values - data["outcome"]) ** 2).mean()),
+    }
+
+def split(data, validation=0.1):
+    # (training, validation) by game, so positions of one game never end up in both
+    games = np.unique(data["game"])
+    held = games[len(games) - int(round(validation * len(games))):] if validation > 0 else games[:0]
+    mask = np.isin(data["game"], held)
+    return ({key: value[~mask] for key, value in data.items()},
+            {key: value[mask] for key, value in data.items()})
+
+def train(data, hidden=32, epochs=30, batch_size=64, learning_rate=3e-3, temperature=20.0, value_weight=1.0,
+          validation=0.1, seed=1, progress=None):
+    """Fit a ValueModel to self-play positions with Adam, in plain NumPy
+
+    The loss is the policy cross-entropy against the softmax of the candidate scores
+    plus value_weight times the squared error of the value of the played shot
+    against the game's outcome. Returns the model and the metrics of every epoch.
+    """
+    require_numpy()
+    training, held_out = split(data, validation)
+    positions, candidates, inputs = training["features"].shape
+    if positions == 0:
+        raise ValueError("No training positions")
+    flat = training["features"].reshape(-1, inputs)
+    model = ValueModel.initial(hidden, seed, inputs)
+    model.mean = flat.mean(axis=0)
+    model.std = np.maximum(flat.std(axis=0), 1e-3)
+    params = {name: value.astype(np.float64) for name, value in model.params.items()}
+    moments = {name: (np.zeros_like(value), np.zeros_like(value)) for name, value in params.items()}
+    beta1, beta2 = 0.9, 0.999
+    targets = softmax(training["scores"] / temperature)
+    rng = np.random.default_rng(seed)
+    history = []
+    step = 0
+    for epoch in range(epochs):
+        for batch in np.array_split(rng.permutation(positions), max(1, positions // batch_size)):
+            b = len(batch)
+            z = (training["features"][batch].reshape(-1, inputs) - model.mean) / model.std
+            a1 = z @ params["w1"] + params["b1"]
+            h1 = np.maximum(a1, 0.0)
+            a2 = h1 @ params["w2"] + params["b2"]
+            h2 = np.maximum(a2, 0.0)
+            logits = (h2 @ params["wp"] + params["bp"]).reshape(b, candidates)
+            values = np.tanh(h2 @ params["wv"] + params["bv"])
+
+            # Gradients of the policy and value losses at the head outputs
+            dlogits = ((softmax(logits) - targets[batch]) / b).ravel()
+            played = np.arange(b) * candidates + training["played"][batch]
+            dvalues = np.zeros_like(values)
+            v = values[played]
+            dvalues[played] = value_weight * 2.0 * (v - training["outcome"][batch]) * (1.0 - v * v) / b
+
+            grads = {
+                "wp": h2.T @ dlogits, "bp": dlogits.sum(),
+                "wv": h2.T @ dvalues, "bv": dvalues.sum(),
+            }
+            da2 = (np.outer(dlogits, params["wp"]) + np.outer(dvalues, params["wv"])) * (a2 > 0)
+            grads["w2"] = h1.T @ da2
+            grads["b2"] = da2.sum(axis=0)
+            da1 = (da2 @ params["w2"].T) * (a1 > 0)
+            grads["w1"] = z.T @ da1
+            grads["b1"] = da1.sum(axis=0)
+
+            step += 1
+            for name, grad in grads.items():
+                m, s = moments[name]
+                m *= beta1
+                m += (1 - beta1) * grad
+                s *= beta2
+                s += (1 - beta2) * grad * grad
+                params[name] = params[name] - learning_rate * (m / (1 - beta1 ** step)) / (
+                    np.sqrt(s / (1 - beta2 ** step)) + 1e-8)
+
+        model.params = {name: value.astype(np.float32) for name, value in params.items()}
+        metrics = {"epoch": epoch + 1, "train": losses(model, training, temperature)}
+        if len(held_out["played"]):
+            metrics["validation"] = losses(model, held_out, temperature)
+        history.append(metrics)
+        if progress is not None:
+            progress(metrics)
+    return model, history
+
+class LearnedAI:
+    """Ranks a thousand sampled shots with a ValueModel, then simulates only the best
+
+    The candidates are sampled like MonteCarloAI's and ranked in one batched
+    forward pass; the top simulations of them are resolved with
+    PucketEngine.resolve_shot and the best-scoring one is played. With simulations=0
+    the top-ranked shot is played untested.
+    """
+    def __init__(self, model=None, model_path=DEFAULT_MODEL, candidates=1000, simulations=8, value_weight=1.0,
+                 seed=None):
+        require_numpy()
+        self.model = model if model is not None else ValueModel.load(model_path)
+        self.candidates = candidates
+        self.simulations = simulations
+        self.value_weight = value_weight
+        self.rng = np.random.default_rng(seed)
+
+    def rank(self, state, goals):
+        # (pucks, angles, powers, ranks) of the sampled candidates, or None
+        sampled = sample_shots(state, goals, self.candidates, self.rng)
+        if sampled is None:
+            return None
+        pucks, angles, powers = sampled
+        return pucks, angles, powers, self.model.rank(features(state, goals, pucks, angles, powers), self.value_weight)
+
+    def choose_shot(self, state, goals):
+        ranked = self.rank(state, goals)
+        if ranked is None:
+            return None
+        pucks, angles, powers, ranks = ranked
+        order = np.argsort(-ranks)[:max(1, self.simulations)]
+        shots = [Shot(int(pucks[c]), float(angles[c]), float(powers[c])) for c in order]
+        if self.simulations <= 0:
+            return shots[0]
+
+        engine = PucketEngine.from_state(state, ai_players=())
+        best_shot, best_score = shots[0], -math.inf
+        for shot in shots:
+            engine.load_state(state)
+            result = engine.resolve_shot(engine.pucks[shot.puck_index], shot.angle, shot.power)
+            score = shot_score(state, result.state, goals, state.current_player_idx)
+            if score > best_score:
+                best_shot, best_score = shot, score
+        return best_shot
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the value/policy model on self-play positions")
+    parser.add_argument("data", help="directory of chunks written by selfplay.py")
+    parser.add_argument("model", nargs="?", default=DEFAULT_MODEL, help="where to save the model")
+    parser.add_argument("--hidden", type=int, default=32, help="units per hidden layer")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=64, help="positions per batch")
+    parser.add_argument("--lr", type=float, default=3e-3, help="Adam learning rate")
+    parser.add_argument("--temperature", type=float, default=20.0, help="softmax temperature of the shot scores")
+    parser.add_argument("--validation", type=float, default=0.1, help="share of games held out")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    data = load_dataset(args.data)
+    print(f"{len(data['played'])} positions from {len(np.unique(data['game']))} games, "
+          f"{data['features'].shape[1]} candidates each")
+
+    def progress(metrics):
+        line = f"epoch {metrics['epoch']:3d}"
+        for name in ("train", "validation"):
+            if name in metrics:
+                m = metrics[name]
+                line += f"  {name} policy {m['policy']:.3f} top1 {m['top1']:.1%} value {m['value']:.3f}"
+        print(line)
+
+    model, _ = train(data, args.hidden, args.epochs, args.batch, args.lr, args.temperature,
+                     validation=args.validation, seed=args.seed, progress=progress)
+    model.save(args.model)
+
+    # Inference cost of ranking a thousand candidates in one batch
+    engine = PucketEngine(ai_players=(), seed=args.seed, record_shots=False)
+    ai = LearnedAI(model, candidates=1000, seed=args.seed)
+    state = engine.snapshot()
+    ai.rank(state, engine.goals)
+    runs = 50
+    started = time.perf_counter()
+    for _ in range(runs):
+        ai.rank(state, engine.goals)
+    elapsed = (time.perf_counter() - started) / runs
+    print(f"saved to {args.model}; ranking 1000 candidates takes {1000 * elapsed:.2f} ms "
+          f"({1e6 * elapsed / 1000:.2f} us per shot)")
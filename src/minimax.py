@@ -0,0 +1,323 @@
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from engine import PucketEngine, Shot, MAX_VELOCITY, FPS
+from aim import stopping_power
+from evaluation import board_value
+
+WIN_SCORE = 1e6  # Value of a won board, minus the plies taken to win it
+
+# Transposition table entry bounds
+EXACT, LOWER, UPPER = 0, 1, 2
+
+class SearchTimeout(Exception):
+    pass
+
+class SearchStats:
+    """Counters of one search, reported alongside the chosen shot"""
+    def __init__(self):
+        self.nodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.depth = 0  # Deepest fully searched depth
+        self.elapsed = 0.0
+
+    @property
+    def nodes_per_sec(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def __repr__(self):
+        return (f"SearchStats(depth={self.depth}, nodes={self.nodes}, nodes/s={self.nodes_per_sec:.0f}, "
+                f"tt_hit_rate={self.tt_hit_rate:.1%}, elapsed={self.elapsed:.3f}s)")
+
+def to_table(value, ply):
+    # Win scores count plies from the root; the table keeps them counted from the
+    # entry's own board, so a board reached at another ply gets the right distance
+    if value >= WIN_SCORE / 2:
+        return value + ply
+    if value <= -WIN_SCORE / 2:
+        return value - ply
+    return value
+
+def from_table(value, ply):
+    if value >= WIN_SCORE / 2:
+        return value - ply
+    if value <= -WIN_SCORE / 2:
+        return value + ply
+    return value
+
+def quantize(state, grid):
+    # Board hash key: positions snapped to a grid, so near-identical boards share entries
+    pucks = tuple(
+        (round(puck.x / grid), round(puck.y / grid)) if puck.active else None
+        for puck in state.pucks
+    )
+    return hash((pucks, state.scores, state.current_player_idx))
+
+class AlphaBetaSearcher:
+    """Depth-limited negamax with alpha-beta pruning over a discrete set of shots
+
+    Every node resolves its children with PucketEngine.resolve_shot, so the branching
+    factor (pucks x angle_offsets x powers) is what decides how deep the search gets.
+    """
+    def __init__(self, goals, angle_offsets=(-0.12, 0.0, 0.12), power_scales=(1.0, None),
+                 grid=4.0, max_depth=4, table_size=200000):
+        self.goals = goals
+        self.angle_offsets = angle_offsets
+        # None stands for the power that stops the puck on the goal
+        self.power_scales = power_scales
+        self.grid = grid
+        self.max_depth = max_depth
+        self.table_size = table_size
+        self.table = {}
+        self.engine = None
+        self.stats = SearchStats()
+        self.deadline = math.inf
+        self.cancelled = None
+
+    def moves(self, state):
+        # Discretized shots, ordered by a cheap heuristic: pucks nearest their goal first,
+        # straight aim before offsets and the stopping power before full power
+        player_idx = state.current_player_idx
+        goal = self.goals[player_idx]
+        ordered = []
+        for k, puck in enumerate(state.pucks):
+            if not puck.active or puck.player_id != player_idx:
+                continue
+            dx = goal[0] - puck.x
+            dy = goal[1] - puck.y
+            distance = math.hypot(dx, dy)
+            direct = math.atan2(dy, dx)
+            for offset in self.angle_offsets:
+                for scale in self.power_scales:
+                    if scale is None:
+                        power = stopping_power(distance)
+                    else:
+                        power = scale * MAX_VELOCITY
+                    priority = distance + 100 * abs(offset) + 10 * (scale is not None)
+                    ordered.append((priority, Shot(k, direct + offset, power)))
+        ordered.sort(key=lambda item: item[0])
+        return [shot for _, shot in ordered]
+
+    def check_time(self):
+        if time.monotonic() >= self.deadline or (self.cancelled is not None and self.cancelled.is_set()):
+            raise SearchTimeout()
+
+    def child(self, state, shot):
+        self.engine.load_state(state)
+        return self.engine.resolve_shot(self.engine.pucks[shot.puck_index], shot.angle, shot.power).state
+
+    def negamax(self, state, depth, alpha, beta, ply):
+        self.check_time()
+        self.stats.nodes += 1
+
+        player_idx = state.current_player_idx
+        if state.game_over:
+            won = state.winner_id == player_idx
+            return (WIN_SCORE - ply) if won else -(WIN_SCORE - ply)
+        if depth == 0:
+            return board_value(state, self.goals, player_idx)
+
+        # Probe the transposition table
+        key = quantize(state, self.grid)
+        self.stats.tt_probes += 1
+        entry = self.table.get(key)
+        best_first = None
+        if entry is not None:
+            self.stats.tt_hits += 1
+            entry_depth, entry_value, entry_flag, best_first = entry
+            entry_value = from_table(entry_value, ply)
+            if entry_depth >= depth:
+                if entry_flag == EXACT:
+                    return entry_value
+                if entry_flag == LOWER:
+                    alpha = max(alpha, entry_value)
+                elif entry_flag == UPPER:
+                    beta = min(beta, entry_value)
+                if alpha >= beta:
+                    return entry_value
+
+        moves = self.moves(state)
+        if not moves:
+            return board_value(state, self.goals, player_idx)
+        if best_first is not None and best_first < len(moves):
+            moves.insert(0, moves.pop(best_first))
+            order = [best_first] + [i for i in range(len(moves)) if i != best_first]
+        else:
+            order = list(range(len(moves)))
+
+        original_alpha = alpha
+        best_value = -math.inf
+        best_index = order[0]
+        for index, shot in zip(order, moves):
+            value = -self.negamax(self.child(state, shot), depth - 1, -beta, -alpha, ply + 1)
+            if value > best_value:
+                best_value = value
+                best_index = index
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        if best_value <= original_alpha:
+            flag = UPPER
+        elif best_value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if len(self.table) >= self.table_size:
+            self.table.clear()
+        self.table[key] = (depth, to_table(best_value, ply), flag, best_index)
+        return best_value
+
+    def search(self, state, deadline, cancelled=None):
+        # Iterative deepening until the deadline; returns the best shot of the deepest
+        # completed iteration
+        self.engine = PucketEngine.from_state(state, ai_players=())
+        self.stats = SearchStats()
+        self.deadline = deadline
+        self.cancelled = cancelled
+        started = time.monotonic()
+
+        moves = self.moves(state)
+        best = moves[0] if moves else None
+        try:
+            for depth in range(1, self.max_depth + 1):
+                best_value = -math.inf
+                best_here = None
+                alpha, beta = -math.inf, math.inf
+                # Root: try the previous iteration's best shot first
+                if best is not None and best in moves:
+                    moves.insert(0, moves.pop(moves.index(best)))
+                for shot in moves:
+                    value = -self.negamax(self.child(state, shot), depth - 1, -beta, -alpha, 1)
+                    if value > best_value:
+                        best_value = value
+                        best_here = shot
+                    alpha = max(alpha, value)
+                best = best_here
+                self.stats.depth = depth
+                if abs(best_value) >= WIN_SCORE - self.max_depth:
+                    break
+        except SearchTimeout:
+            pass
+        self.stats.elapsed = time.monotonic() - started
+        return best, self.stats
+
+class CancelFlag:
+    """Event-like cancel flag of one search, shared with a worker process
+
+    The AI numbers its searches and keeps the number of the latest cancelled one in
+    a shared integer, so a flag never needs clearing: a search is cancelled once that
+    number reaches its own. Only the game's process writes the integer.
+    """
+    def __init__(self, cancelled_upto, search_id):
+        self.cancelled_upto = cancelled_upto
+        self.search_id = search_id
+
+    def set(self):
+        if self.cancelled_upto.value < self.search_id:
+            self.cancelled_upto.value = self.search_id
+
+    def is_set(self):
+        return self.cancelled_upto.value >= self.search_id
+
+# The searcher of a worker process, its settings and its cancel counter, kept
+# between moves so the transposition table carries over as it does on a thread
+worker_searcher = None
+worker_settings = None
+worker_cancelled_upto = None
+
+def init_worker(cancelled_upto):
+    global worker_cancelled_upto
+    worker_cancelled_upto = cancelled_upto
+
+def run_search(settings, state, goals, deadline, search_id):
+    # Process pool entry point: search with the worker's searcher, made anew only
+    # when the settings or goals change
+    global worker_searcher, worker_settings
+    if worker_searcher is None or worker_searcher.goals != goals or worker_settings != settings:
+        worker_searcher = AlphaBetaSearcher(goals, **settings)
+        worker_settings = settings
+    return worker_searcher.search(state, deadline, CancelFlag(worker_cancelled_upto, search_id))
+
+class AlphaBetaSearch:
+    """A search running off the render thread, collected by result()"""
+    def __init__(self, future, cancelled, ai):
+        self.future = future
+        self.cancelled = cancelled
+        self.ai = ai
+        self.stats = None
+
+    def done(self):
+        return self.future.done()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.future.cancel()
+
+    def result(self):
+        if self.future.cancelled():
+            return None
+        shot, self.stats = self.future.result()
+        self.ai.last_stats = self.stats
+        return shot
+
+class AlphaBetaAI:
+    """Minimax AI: alpha-beta over discretized shots with a transposition table and
+    iterative deepening under a wall-clock budget
+
+    The search runs on a worker process (or a thread with use_processes=False) so the
+    game loop keeps rendering while it thinks. Either way the searcher and its table
+    live on between moves, and cancel() stops a search within a node. last_stats
+    holds the SearchStats of the latest decision: depth reached, nodes/sec and
+    transposition table hit rate.
+    """
+    def __init__(self, time_budget=None, use_processes=True, **settings):
+        self.time_budget = time_budget if time_budget is not None else 0.9 * 30 / FPS
+        self.use_processes = use_processes
+        self.settings = settings
+        self.executor = None
+        self.searcher = None
+        self.last_stats = None
+        self.searches = 0
+        self.cancelled_upto = None
+
+    def start(self, state, goals):
+        # time.monotonic is system-wide, so the deadline holds in a worker process too
+        deadline = time.monotonic() + self.time_budget
+        if self.use_processes:
+            if self.executor is None:
+                # Written here and only read by the worker, so it needs no lock
+                self.cancelled_upto = multiprocessing.Value("q", 0, lock=False)
+                self.executor = ProcessPoolExecutor(max_workers=1, initializer=init_worker,
+                                                    initargs=(self.cancelled_upto,))
+            self.searches += 1
+            cancelled = CancelFlag(self.cancelled_upto, self.searches)
+            future = self.executor.submit(run_search, self.settings, state, goals, deadline, self.searches)
+        else:
+            cancelled = threading.Event()
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1)
+            # The thread keeps one searcher, so its table carries over between moves
+            if self.searcher is None or self.searcher.goals != goals:
+                self.searcher = AlphaBetaSearcher(goals, **self.settings)
+            future = self.executor.submit(self.searcher.search, state, deadline, cancelled)
+        return AlphaBetaSearch(future, cancelled, self)
+
+    def choose_shot(self, state, goals):
+        return self.start(state, goals).result()
+
+    def close(self):
+        if self.executor is not None:
+            # Stop a search still running on the worker process
+            if self.cancelled_upto is not None:
+                self.cancelled_upto.value = self.searches
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
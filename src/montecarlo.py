@@ -0,0 +1,119 @@
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from engine import PucketEngine, Shot, MAX_VELOCITY, FPS
+from evaluation import shot_score
+
+def evaluate_shots(state, shots, deadline, step_frames=1, ccd=False):
+    """Worker task: resolve each shot from state and score it for the player to move
+
+    Stops at the deadline (a time.monotonic() value) and returns the scores computed so far.
+    Steps of more than one frame need continuous collisions (ccd).
+    """
+    engine = PucketEngine.from_state(state, ai_players=(), ccd=ccd)
+    player_idx = state.current_player_idx
+    scores = []
+    for shot in shots:
+        if time.monotonic() > deadline:
+            break
+        engine.load_state(state)
+        result = engine.resolve_shot(engine.pucks[shot.puck_index], shot.angle, shot.power, step_frames=step_frames)
+        scores.append(shot_score(state, result.state, engine.goals, player_idx))
+    return scores
+
+class MonteCarloSearch:
+    """A running search: rollouts submitted to the pool, collected by result()"""
+    def __init__(self, chunks, futures, deadline, fallback):
+        self.chunks = chunks
+        self.futures = futures
+        self.deadline = deadline
+        self.fallback = fallback
+        self.rollouts = 0
+
+    def done(self):
+        return time.monotonic() >= self.deadline or all(future.done() for future in self.futures)
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+    def result(self):
+        # Best shot among the rollouts finished by the deadline
+        wait(self.futures, timeout=max(0.0, self.deadline - time.monotonic()))
+        best_shot, best_score = self.fallback, -math.inf
+        for chunk, future in zip(self.chunks, self.futures):
+            if not future.done() or future.cancelled() or future.exception() is not None:
+                future.cancel()
+                continue
+            for shot, score in zip(chunk, future.result()):
+                self.rollouts += 1
+                if score > best_score:
+                    best_shot, best_score = shot, score
+        return best_shot
+
+class MonteCarloAI:
+    """Samples (puck, angle, power) candidates and simulates each to rest in a process pool
+
+    The search is bounded by time_budget seconds, which defaults to the engine's
+    30-frame thinking delay so a decision is always ready when the delay runs out.
+    Rollouts use the game's physics: set ccd=True for a game with continuous
+    collisions, which can then resolve rollouts in steps of step_frames frames. The
+    discrete game is only predicted frame by frame, since continuous collisions
+    bounce pucks off each other differently.
+    """
+    def __init__(self, rollouts=256, time_budget=None, workers=None, chunk_size=16, aimed_fraction=0.75, seed=None,
+                 step_frames=1, ccd=False):
+        if step_frames != 1 and not ccd:
+            raise ValueError("step_frames > 1 needs a game with continuous collisions (ccd=True)")
+        self.rollouts = rollouts
+        self.time_budget = time_budget if time_budget is not None else 0.9 * 30 / FPS
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.aimed_fraction = aimed_fraction
+        self.rng = random.Random(seed)
+        self.step_frames = step_frames
+        self.ccd = ccd
+        self.executor = None
+
+    def candidates(self, state, goals):
+        player_idx = state.current_player_idx
+        goal = goals[player_idx]
+        movable = [k for k, puck in enumerate(state.pucks) if puck.active and puck.player_id == player_idx]
+        shots = []
+        if not movable:
+            return shots
+        for n in range(self.rollouts):
+            k = movable[n % len(movable)]
+            puck = state.pucks[k]
+            if n < self.rollouts * self.aimed_fraction:
+                # Around the straight line to the goal, with power for the distance
+                direct = math.atan2(goal[1] - puck.y, goal[0] - puck.x)
+                angle = direct + self.rng.gauss(0.0, 0.25)
+                power = self.rng.uniform(0.3, 1.0) * MAX_VELOCITY
+            else:
+                # Anywhere, to find bank shots and knock-outs
+                angle = self.rng.uniform(-math.pi, math.pi)
+                power = self.rng.uniform(0.1, 1.0) * MAX_VELOCITY
+            shots.append(Shot(k, angle, power))
+        return shots
+
+    def start(self, state, goals):
+        # Submit the rollouts and return a MonteCarloSearch to collect later
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        deadline = time.monotonic() + self.time_budget
+        shots = self.candidates(state, goals)
+        chunks = [shots[i:i + self.chunk_size] for i in range(0, len(shots), self.chunk_size)]
+        futures = [self.executor.submit(evaluate_shots, state, chunk, deadline, self.step_frames, self.ccd) for chunk in chunks]
+        return MonteCarloSearch(chunks, futures, deadline, shots[0] if shots else None)
+
+    def choose_shot(self, state, goals):
+        return self.start(state, goals).result()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,100 @@
+import argparse
+import json
+import time
+
+class RollingTimer:
+    """The last `window` durations of one code section, for rolling percentiles"""
+    def __init__(self, window=512):
+        self.samples = [0.0] * window
+        self.count = 0  # Samples ever recorded; the ring holds the latest `window`
+
+    def record(self, seconds):
+        self.samples[self.count % len(self.samples)] = seconds
+        self.count += 1
+
+    def percentile(self, fraction):
+        # In milliseconds, over the samples still in the window
+        filled = sorted(self.samples[:min(self.count, len(self.samples))])
+        if not filled:
+            return 0.0
+        return 1000.0 * filled[min(len(filled) - 1, int(fraction * len(filled)))]
+
+    @property
+    def p50(self):
+        return self.percentile(0.50)
+
+    @property
+    def p99(self):
+        return self.percentile(0.99)
+
+class Profiler:
+    """Rolling p50/p99 timers for the hot paths of the engine and the front end
+
+    Off by default: engine.profiler is None and the timed sections cost one attribute
+    check per frame. Sections are recorded under names such as "integrate",
+    "collide", "goals", "turns", "ai", "input" and "draw". With dump_path set, the
+    engine appends a JSON line of all timers every dump_every frames.
+    """
+    def __init__(self, window=512, dump_path=None, dump_every=600):
+        self.window = window
+        self.timers = {}
+        self.dump_path = dump_path
+        self.dump_every = dump_every
+        self.started = time.time()
+
+    def record(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = RollingTimer(self.window)
+        timer.record(seconds)
+
+    def summary(self):
+        return {
+            name: {"p50_ms": timer.p50, "p99_ms": timer.p99, "count": timer.count}
+            for name, timer in self.timers.items()
+        }
+
+    def lines(self):
+        # One overlay line per timer, in the order they were first recorded
+        return [f"{name:9s} p50 {timer.p50:6.3f} ms  p99 {timer.p99:6.3f} ms" for name, timer in self.timers.items()]
+
+    def frame_done(self, frame):
+        # Called by the engine after each frame; writes the periodic dump
+        if self.dump_path is not None and frame % self.dump_every == 0:
+            self.dump(frame)
+
+    def dump(self, frame=None):
+        record = {"time": time.time() - self.started, "frame": frame, "timers": self.summary()}
+        with open(self.dump_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+if __name__ == "__main__":
+    from engine import PucketEngine, dense_radius
+
+    parser = argparse.ArgumentParser(description="Profile headless AI-vs-AI games")
+    parser.add_argument("--games", type=int, default=3)
+    parser.add_argument("--ai", choices=["simple", "montecarlo", "minimax"], default="simple", help="AI for both sides")
+    parser.add_argument("--pucks", type=int, default=5, help="pucks per player")
+    parser.add_argument("--dump", metavar="PATH", default=None, help="append a JSON line of metrics every --every frames")
+    parser.add_argument("--every", type=int, default=600, help="frames between metric dumps")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    ai = None
+    if args.ai == "montecarlo":
+        from montecarlo import MonteCarloAI
+        ai = MonteCarloAI()
+    elif args.ai == "minimax":
+        from minimax import AlphaBetaAI
+        ai = AlphaBetaAI()
+    profiler = Profiler(dump_path=args.dump, dump_every=args.every)
+    engine = PucketEngine(ai_players=(0, 1), num_pucks_per_player=args.pucks, puck_radius=dense_radius(args.pucks),
+                          ai=ai, seed=args.seed)
+    engine.profiler = profiler
+    for game in range(args.games):
+        if game:
+            engine.initialize_game(args.seed + game)
+        engine.run()
+    engine.shutdown()
+    for line in profiler.lines():
+        print(line)
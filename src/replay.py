@@ -0,0 +1,152 @@
+import argparse
+import hashlib
+import json
+import time
+
+from engine import PucketEngine, Shot
+from layout import Layout
+
+REPLAY_VERSION = 1
+
+def state_digest(engine):
+    # Bit-exact fingerprint of a board: float reprs round-trip exactly
+    return hashlib.sha256(repr((engine.frame, engine.snapshot())).encode()).hexdigest()
+
+class ReplayLog:
+    """Seed, board settings and every shot of one game: enough to re-run it bit for bit
+
+    Shots are (frame, puck_index, angle, power) tuples, launched just before the
+    engine's update for frame + 1, exactly as the game loop applied them.
+    """
+    def __init__(self, seed, num_pucks_per_player, puck_radius, shots, frames=0, digest=None, ai_players=(),
+                 layout=None):
+        self.seed = seed
+        self.num_pucks_per_player = num_pucks_per_player
+        self.puck_radius = puck_radius
+        self.shots = [tuple(shot) for shot in shots]
+        self.frames = frames
+        self.digest = digest
+        self.ai_players = tuple(ai_players)
+        # layout.Layout of the board; None is the classic board
+        self.layout = layout
+
+    @classmethod
+    def from_engine(cls, engine):
+        return cls(
+            engine.game_seed,
+            engine.num_pucks_per_player,
+            engine.puck_radius,
+            engine.shot_log,
+            engine.frame,
+            state_digest(engine),
+            engine.ai_players,
+            None if engine.layout.empty else engine.layout
+        )
+
+    def to_dict(self):
+        return {
+            "version": REPLAY_VERSION,
+            "seed": self.seed,
+            "num_pucks_per_player": self.num_pucks_per_player,
+            "puck_radius": self.puck_radius,
+            "ai_players": list(self.ai_players),
+            "frames": self.frames,
+            "digest": self.digest,
+            "shots": [list(shot) for shot in self.shots],
+            **({} if self.layout is None else {"layout": self.layout.to_dict()}),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != REPLAY_VERSION:
+            raise ValueError(f"Unsupported replay version: {data.get('version')}")
+        return cls(
+            data["seed"],
+            data["num_pucks_per_player"],
+            data["puck_radius"],
+            data["shots"],
+            data["frames"],
+            data.get("digest"),
+            data.get("ai_players", ()),
+            Layout.from_dict(data["layout"]) if "layout" in data else None
+        )
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+def run(log, frames=None):
+    """Generator: re-run a logged game headless at full speed
+
+    Yields (engine, shot) once before the first frame and then after every frame,
+    where shot is the Shot launched just before that frame or None.
+    """
+    engine = PucketEngine(
+        ai_players=(),
+        num_pucks_per_player=log.num_pucks_per_player,
+        puck_radius=log.puck_radius,
+        seed=log.seed,
+        layout=log.layout
+    )
+    yield engine, None
+    shots = iter(log.shots)
+    pending = next(shots, None)
+    for _ in range(log.frames if frames is None else frames):
+        shot = None
+        while pending is not None and pending[0] == engine.frame:
+            shot = Shot(*pending[1:])
+            engine.launch(engine.pucks[shot.puck_index], shot.angle, shot.power)
+            pending = next(shots, None)
+        engine.update_game_state()
+        yield engine, shot
+
+def play(log, frames=None):
+    # Re-run a logged game and return the engine at the end
+    for engine, _ in run(log, frames):
+        pass
+    return engine
+
+def turns(log):
+    """Generator over the turns of a logged game as (shot, state, frame)
+
+    The first turn is the opening board with no shot; each later one is the board
+    when the turn passes, or the game ends, after a shot.
+    """
+    game = run(log)
+    engine, _ = next(game)
+    yield None, engine.snapshot(), engine.frame
+    player = engine.current_player_idx
+    shot = None
+    for engine, launched in game:
+        shot = launched or shot
+        if shot is not None and (engine.current_player_idx != player or engine.game_over):
+            yield shot, engine.snapshot(), engine.frame
+            shot = None
+        player = engine.current_player_idx
+
+def verify(log):
+    # True when re-running the log lands on the recorded final state
+    return log.digest is not None and state_digest(play(log)) == log.digest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run a recorded Pucket game headless")
+    parser.add_argument("replay", help="replay file written by game.py --record")
+    parser.add_argument("--repeat", type=int, default=1, help="run the replay this many times for timing")
+    args = parser.parse_args()
+
+    log = ReplayLog.load(args.replay)
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        engine = play(log)
+    elapsed = time.perf_counter() - started
+
+    winner = engine.winner.id if engine.winner is not None else None
+    print(f"seed {log.seed}: {len(log.shots)} shots, {log.frames} frames, scores {[p.score for p in engine.players]}, winner {winner}")
+    print(f"{log.frames * args.repeat / elapsed:.0f} frames/s")
+    if log.digest is not None:
+        print("final state matches recording" if state_digest(engine) == log.digest else "final state DIFFERS from recording")
@@ -0,0 +1,287 @@
+import argparse
+import glob
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from vector_physics import np, require_numpy
+from engine import PucketEngine, WIDTH, HEIGHT, FRICTION, MAX_VELOCITY
+from evaluation import shot_score, GOAL_WEIGHT
+
+SELFPLAY_VERSION = 1
+FEATURES_VERSION = 1
+
+# Matches still undecided after this many shots are draws, as in tournament.py
+MAX_SHOTS = 200
+# Shot scores are clipped to ±this, so winning and losing shots (infinite scores)
+# stay usable
+WIN_SCORE = 10 * GOAL_WEIGHT
+
+DIAGONAL = math.hypot(WIDTH, HEIGHT)
+# Distance a launch covers on an empty board, per unit of power
+REACH_PER_POWER = FRICTION / (1 - FRICTION)
+
+BOARD_FEATURES = 10
+SHOT_FEATURES = 14
+FEATURES = BOARD_FEATURES + SHOT_FEATURES
+
+def board_features(state, goals):
+    """(BOARD_FEATURES,) summary of a board from the side of the player to move
+
+    Per side: score, share of pucks still in play, mean and closest distance of them
+    to the goal they score in, and share within 150 px of it. Counts are relative to
+    the pucks a side started with, so boards of any size give the same features.
+    """
+    player_idx = state.current_player_idx
+    features = []
+    for side in (player_idx, (player_idx + 1) % len(state.scores)):
+        goal = goals[side]
+        total = sum(1 for puck in state.pucks if puck.player_id == side) or 1
+        distances = [
+            math.hypot(puck.x - goal[0], puck.y - goal[1]) / DIAGONAL
+            for puck in state.pucks
+            if puck.active and puck.player_id == side
+        ]
+        features += [
+            state.scores[side] / total,
+            len(distances) / total,
+            sum(distances) / len(distances) if distances else 0.0,
+            min(distances) if distances else 0.0,
+            sum(1 for distance in distances if distance * DIAGONAL < 150) / total,
+        ]
+    return np.array(features, dtype=np.float32)
+
+def shot_features(state, goals, pucks, angles, powers):
+    """(C, SHOT_FEATURES) features of C candidate launches, computed as one batch
+
+    pucks, angles and powers are (C,) arrays. The features follow each shot's straight
+    path on an empty board: how it lines up with the goal, where it would stop, how
+    close it passes the goal and which pucks are in its way.
+    """
+    player_idx = state.current_player_idx
+    gx, gy = goals[player_idx]
+    bx = np.array([puck.x for puck in state.pucks], dtype=np.float64)
+    by = np.array([puck.y for puck in state.pucks], dtype=np.float64)
+    active = np.array([puck.active for puck in state.pucks], dtype=bool)
+    own = np.array([puck.player_id == player_idx for puck in state.pucks], dtype=bool)
+    radius = state.puck_radius
+
+    pucks = np.asarray(pucks, dtype=np.intp)
+    angles = np.asarray(angles, dtype=np.float64)
+    powers = np.minimum(np.asarray(powers, dtype=np.float64), MAX_VELOCITY)
+    x = bx[pucks]
+    y = by[pucks]
+    goal_distance = np.hypot(gx - x, gy - y)
+    offset = angles - np.arctan2(gy - y, gx - x)
+    cos = np.cos(angles)
+    sin = np.sin(angles)
+    reach = powers * REACH_PER_POWER
+    end_x = x + cos * reach
+    end_y = y + sin * reach
+    inside = (end_x >= radius) & (end_x <= WIDTH - radius) & (end_y >= radius) & (end_y <= HEIGHT - radius)
+    end_distance = np.hypot(gx - np.clip(end_x, radius, WIDTH - radius), gy - np.clip(end_y, radius, HEIGHT - radius))
+    # Closest approach to the goal along the path
+    along = np.clip((gx - x) * cos + (gy - y) * sin, 0.0, reach)
+    nearest = np.hypot(x + cos * along - gx, y + sin * along - gy)
+
+    # Pucks within two radii of the path, and how far along the first one is
+    dx = bx[None, :] - x[:, None]
+    dy = by[None, :] - y[:, None]
+    t = np.clip(dx * cos[:, None] + dy * sin[:, None], 0.0, reach[:, None])
+    gap = np.hypot(dx - cos[:, None] * t, dy - sin[:, None] * t)
+    blocking = (gap < 2 * radius) & active[None, :] & (t > 0)
+    blocking[np.arange(len(pucks)), pucks] = False
+    first = np.where(blocking, t, DIAGONAL).min(axis=1)
+
+    return np.stack((
+        x / WIDTH,
+        y / HEIGHT,
+        goal_distance / DIAGONAL,
+        np.cos(offset),
+        np.sin(offset),
+        powers / MAX_VELOCITY,
+        np.minimum(reach / np.maximum(goal_distance, 1.0), 3.0),
+        end_distance / DIAGONAL,
+        nearest / DIAGONAL,
+        inside,
+        (blocking & own[None, :]).sum(axis=1),
+        (blocking & ~own[None, :]).sum(axis=1),
+        np.minimum(first, DIAGONAL) / DIAGONAL,
+        np.minimum(reach, DIAGONAL) / DIAGONAL,
+    ), axis=1).astype(np.float32)
+
+def features(state, goals, pucks, angles, powers):
+    # (C, FEATURES): the board features next to each candidate's shot features
+    shots = shot_features(state, goals, pucks, angles, powers)
+    board = np.broadcast_to(board_features(state, goals), (len(shots), BOARD_FEATURES))
+    return np.concatenate((board, shots), axis=1)
+
+def sample_shots(state, goals, count, rng, aimed_fraction=0.75):
+    """count candidate launches as (pucks, angles, powers) arrays, or None
+
+    Like MonteCarloAI.candidates: most are fanned around the straight line to the
+    goal, the rest go anywhere to find bank shots and knock-outs.
+    """
+    player_idx = state.current_player_idx
+    movable = [k for k, puck in enumerate(state.pucks) if puck.active and puck.player_id == player_idx]
+    if not movable:
+        return None
+    goal = goals[player_idx]
+    turns = np.arange(count) % len(movable)
+    pucks = np.array(movable, dtype=np.intp)[turns]
+    direct = np.array([math.atan2(goal[1] - state.pucks[k].y, goal[0] - state.pucks[k].x) for k in movable])[turns]
+    aimed = np.arange(count) < count * aimed_fraction
+    angles = np.where(aimed, direct + rng.normal(0.0, 0.25, count), rng.uniform(-math.pi, math.pi, count))
+    powers = np.where(aimed, rng.uniform(0.3, 1.0, count), rng.uniform(0.1, 1.0, count)) * MAX_VELOCITY
+    return pucks, angles, powers
+
+def play_game(task):
+    """Pool task: one self-play game, returned as arrays of its positions
+
+    Every turn the player to move samples candidate shots, resolves each of them
+    to rest and plays the best-scoring one (a random one with probability epsilon).
+    A position records the features and score of every candidate, which one was
+    played, and how the game ended for the player who moved: 1 win, -1 loss, 0 draw.
+    """
+    game, seed, candidates, epsilon = task["game"], task["seed"], task["candidates"], task["epsilon"]
+    engine = PucketEngine(ai_players=(), seed=seed, record_shots=False)
+    rng = np.random.default_rng(seed)
+    chooser = random.Random(seed)
+    rows = {"features": [], "shots": [], "scores": [], "played": [], "mover": []}
+    while not engine.game_over and len(rows["played"]) < MAX_SHOTS:
+        state = engine.snapshot()
+        sampled = sample_shots(state, engine.goals, candidates, rng)
+        if sampled is None:
+            break
+        pucks, angles, powers = sampled
+        scores = []
+        for k, angle, power in zip(pucks.tolist(), angles.tolist(), powers.tolist()):
+            engine.load_state(state)
+            result = engine.resolve_shot(engine.pucks[k], angle, power)
+            score = shot_score(state, result.state, engine.goals, state.current_player_idx)
+            scores.append(min(max(score, -WIN_SCORE), WIN_SCORE))
+        played = chooser.randrange(candidates) if chooser.random() < epsilon else int(np.argmax(scores))
+        engine.load_state(state)
+        engine.resolve_shot(engine.pucks[int(pucks[played])], float(angles[played]), float(powers[played]))
+
+        rows["features"].append(features(state, engine.goals, pucks, angles, powers))
+        rows["shots"].append(np.stack((pucks, angles, powers), axis=1))
+        rows["scores"].append(scores)
+        rows["played"].append(played)
+        rows["mover"].append(state.current_player_idx)
+
+    mover = np.array(rows["mover"], dtype=np.int64)
+    winner = engine.winner.id if engine.game_over and engine.winner is not None else None
+    outcome = np.zeros(len(mover), dtype=np.float32) if winner is None else np.where(mover == winner, 1.0, -1.0)
+    return {
+        "features": np.array(rows["features"], dtype=np.float32).reshape(-1, candidates, FEATURES),
+        "shots": np.array(rows["shots"], dtype=np.float64).reshape(-1, candidates, 3),
+        "scores": np.array(rows["scores"], dtype=np.float32).reshape(-1, candidates),
+        "played": np.array(rows["played"], dtype=np.int64),
+        "outcome": outcome.astype(np.float32),
+        "game": np.full(len(mover), game, dtype=np.int64),
+    }
+
+def chunk_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, "chunk-*.npz")))
+
+def games_done(directory, seed):
+    # Games already in the chunks on disk. Game numbers only mean the same game
+    # under the same seed, so chunks written with another one are refused
+    done = set()
+    for path in chunk_paths(directory):
+        with np.load(path) as chunk:
+            if "seed" not in chunk.files or int(chunk["seed"]) != seed:
+                raise ValueError(f"{path} was not written with seed {seed}; use another directory for this seed")
+            done.update(int(game) for game in np.unique(chunk["game"]))
+    return done
+
+def write_chunk(directory, index, games, seed):
+    # Concatenate whole games into one chunk file, renamed into place once written
+    path = os.path.join(directory, f"chunk-{index:05d}.npz")
+    arrays = {key: np.concatenate([game[key] for game in games]) for key in games[0]}
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, version=SELFPLAY_VERSION, features_version=FEATURES_VERSION, seed=seed, **arrays)
+    os.replace(path + ".tmp", path)
+    return path
+
+def generate(directory, games, workers=None, candidates=16, epsilon=0.1, seed=1, chunk_positions=1024,
+             progress=None):
+    """Play self-play games on a process pool and stream them to directory in chunks
+
+    Positions are buffered as games finish and written once at least chunk_positions
+    are waiting, so memory stays bounded however many games are played. Games are
+    numbered from their seed; the ones already on disk are skipped, so a stopped run
+    resumes where it left off. Every chunk records the seed, and a directory
+    written with another seed raises ValueError rather than mixing the two.
+    """
+    require_numpy()
+    os.makedirs(directory, exist_ok=True)
+    done = games_done(directory, seed)
+    tasks = [
+        {"game": game, "seed": seed * 1000003 + game, "candidates": candidates, "epsilon": epsilon}
+        for game in range(games) if game not in done
+    ]
+    index = len(chunk_paths(directory))
+    buffered, positions, written = [], 0, 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = [executor.submit(play_game, task) for task in tasks]
+        for future in as_completed(futures):
+            game = future.result()
+            if progress is not None:
+                progress(game)
+            if not len(game["played"]):
+                continue
+            buffered.append(game)
+            positions += len(game["played"])
+            if positions >= chunk_positions:
+                write_chunk(directory, index, buffered, seed)
+                index += 1
+                written += positions
+                buffered, positions = [], 0
+    if buffered:
+        write_chunk(directory, index, buffered, seed)
+        written += positions
+    return written
+
+def load_dataset(directory):
+    # Every chunk in directory concatenated into one dict of arrays
+    chunks = []
+    for path in chunk_paths(directory):
+        with np.load(path) as chunk:
+            if int(chunk["version"]) != SELFPLAY_VERSION or int(chunk["features_version"]) != FEATURES_VERSION:
+                raise ValueError(f"{path} was written by a different self-play version")
+            chunks.append({key: chunk[key] for key in ("features", "shots", "scores", "played", "outcome", "game")})
+    if not chunks:
+        raise ValueError(f"No self-play chunks in {directory}")
+    if len({chunk["features"].shape[1] for chunk in chunks}) > 1:
+        raise ValueError("Chunks were written with different candidate counts")
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate self-play training positions on all cores")
+    parser.add_argument("directory", help="where to write the chunk-*.npz files (rerun with the same --seed to resume)")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="game processes (default: all cores)")
+    parser.add_argument("--candidates", type=int, default=16, help="shots resolved and recorded per position")
+    parser.add_argument("--epsilon", type=float, default=0.1, help="chance of playing a random candidate")
+    parser.add_argument("--chunk", type=int, default=1024, help="positions per chunk file")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    played = [0]
+
+    def progress(game):
+        played[0] += 1
+        print(f"game {int(game['game'][0]) if len(game['game']) else '?':>5}: {len(game['played']):3d} positions")
+
+    try:
+        written = generate(args.directory, args.games, args.workers, args.candidates, args.epsilon, args.seed,
+                           args.chunk, progress)
+    except ValueError as error:
+        parser.error(str(error))
+    elapsed = time.perf_counter() - started
+    print(f"{played[0]} games, {written} positions in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.0f} positions/s)")
@@ -0,0 +1,448 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import tracemalloc
+
+from engine import PucketEngine, PuckState, BoardState, Shot
+from layout import Layout
+
+PROTOCOL_VERSION = 1
+
+# Longest message line accepted from a client, in bytes
+MAX_LINE = 4096
+# Messages queued for one client before it counts as too slow and is dropped
+SEND_QUEUE = 16
+# Messages queued for one match before further ones are refused
+INBOX_QUEUE = 8
+
+class ProtocolError(Exception):
+    """A client message that breaks the protocol; reported back to the client"""
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+def board_digest(state):
+    # Fingerprint of a resting board as a client mirrors it: where the active pucks
+    # are and the scores (float reprs survive JSON exactly)
+    pucks = tuple((puck.x, puck.y) if puck.active else None for puck in state.pucks)
+    return hashlib.sha256(repr((pucks, tuple(state.scores))).encode()).hexdigest()
+
+def full_state(state):
+    # The whole board and its layout, sent once when a match starts
+    return {
+        "pucks": [[puck.x, puck.y, puck.active, puck.player_id] for puck in state.pucks],
+        "scores": list(state.scores),
+        "next": state.current_player_idx,
+        "radius": state.puck_radius,
+        "layout": state.layout.to_dict(),
+    }
+
+def state_delta(before, after):
+    # The pucks a resolved shot moved or captured, and the resulting scores and turn
+    moved = []
+    captured = []
+    for k, (old, new) in enumerate(zip(before.pucks, after.pucks)):
+        if old.active and not new.active:
+            captured.append(k)
+        elif new.active and (old.x != new.x or old.y != new.y):
+            moved.append([k, new.x, new.y])
+    return {
+        "moved": moved,
+        "captured": captured,
+        "scores": list(after.scores),
+        "next": after.current_player_idx,
+    }
+
+def mirror_state(message):
+    # BoardState of a start message, at rest
+    pucks = tuple(PuckState(x, y, 0, 0, active, player_id) for x, y, active, player_id in message["pucks"])
+    return BoardState(pucks, tuple(message["scores"]), message["next"], False, None, message["radius"],
+                      Layout.from_dict(message["layout"]))
+
+def apply_delta(state, delta):
+    # A client's mirror after one turn message
+    pucks = list(state.pucks)
+    for k, x, y in delta["moved"]:
+        pucks[k] = pucks[k]._replace(x=x, y=y)
+    for k in delta["captured"]:
+        pucks[k] = pucks[k]._replace(active=False)
+    return state._replace(pucks=tuple(pucks), scores=tuple(delta["scores"]), current_player_idx=delta["next"])
+
+class Connection:
+    """One client socket with a bounded send queue drained by its own task
+
+    send() never waits: a client that falls SEND_QUEUE messages behind is closed
+    instead of letting its backlog grow.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.queue = asyncio.Queue(SEND_QUEUE)
+        self.closed = False
+        self.paired = None  # Set to (match, player) when an opponent joins
+        self.sender = asyncio.ensure_future(self.drain())
+
+    async def drain(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                if message is None:
+                    break
+                self.writer.write(message)
+                await self.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.closed = True
+            self.writer.close()
+
+    def send(self, message):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(encode(message))
+        except asyncio.QueueFull:
+            self.close(now=True)
+
+    def close(self, now=False):
+        # Flush what is queued, or drop it all with now=True
+        if self.closed:
+            return
+        self.closed = True
+        if now:
+            self.sender.cancel()
+        else:
+            try:
+                self.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                self.sender.cancel()
+
+    async def receive(self):
+        # Next message as a dict, or None when the client hung up or sent garbage
+        try:
+            line = await self.reader.readline()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            return None
+        if not line:
+            return None
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return None
+        return message if isinstance(message, dict) else None
+
+class Match:
+    """One authoritative game between two connections
+
+    The engine is the only simulation: a shot from the player to move is resolved to
+    rest with resolve_shot and both players get the same delta. Turns are numbered,
+    and a shot must name the turn it is for, so a late or repeated shot is refused
+    instead of being applied to the wrong board. A match keeps no history, only its
+    engine and its bounded queues.
+
+    Shots are resolved on a worker thread, so the event loop keeps serving the other
+    matches' sockets meanwhile. Only one shot of a match is resolved at a time, and
+    the threads share the interpreter: this keeps I/O flowing during a resolve, but
+    it does not add CPU for more resolves at once.
+    """
+    def __init__(self, match_id, connections, seed, num_pucks_per_player=5, layout=None):
+        self.id = match_id
+        self.connections = connections
+        self.engine = PucketEngine(ai_players=(), num_pucks_per_player=num_pucks_per_player, seed=seed,
+                                   record_shots=False, layout=layout)
+        self.state = self.engine.snapshot()
+        self.turn = 0
+        self.inbox = asyncio.Queue(INBOX_QUEUE)
+        self.task = None  # The task playing the match
+
+    def start(self):
+        for player, connection in enumerate(self.connections):
+            connection.send(dict(
+                full_state(self.state),
+                type="start",
+                version=PROTOCOL_VERSION,
+                match=self.id,
+                player=player,
+                goals=[list(goal) for goal in self.engine.goals],
+                turn=self.turn,
+            ))
+
+    def broadcast(self, message):
+        for connection in self.connections:
+            connection.send(message)
+
+    def shot(self, player, message):
+        # Check one shot message and return the Shot it asks for
+        if player != self.state.current_player_idx:
+            raise ProtocolError("not your turn")
+        if message.get("turn") != self.turn:
+            raise ProtocolError(f"shot is for turn {message.get('turn')}, this is turn {self.turn}")
+        try:
+            shot = Shot(int(message["puck"]), float(message["angle"]), float(message["power"]))
+        except (KeyError, TypeError, ValueError):
+            raise ProtocolError("shot needs puck, angle and power")
+        if not 0 <= shot.puck_index < len(self.state.pucks):
+            raise ProtocolError(f"no puck {shot.puck_index}")
+        puck = self.state.pucks[shot.puck_index]
+        if puck.player_id != player or not puck.active:
+            raise ProtocolError(f"puck {shot.puck_index} is not yours to play")
+        if not (math.isfinite(shot.angle) and math.isfinite(shot.power)) or shot.power < 0:
+            raise ProtocolError("angle and power must be finite, power not negative")
+        return shot
+
+    async def resolve(self, shot):
+        # Play a checked shot off the event loop and broadcast the delta
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, self.engine.resolve_shot, self.engine.pucks[shot.puck_index], shot.angle, shot.power)
+        delta = state_delta(self.state, result.state)
+        self.state = result.state
+        self.turn += 1
+        self.broadcast(dict(delta, type="turn", turn=self.turn, shot=list(shot)))
+
+    def end(self, winner, reason):
+        self.broadcast({
+            "type": "end",
+            "winner": winner,
+            "reason": reason,
+            "turn": self.turn,
+            "digest": board_digest(self.state),
+        })
+        for connection in self.connections:
+            connection.close()
+
+class MatchServer:
+    """Asyncio server hosting many concurrent matches in one process
+
+    Clients connect, send {"type": "join"} and are paired in arrival order. Each
+    match then runs as its own task, waiting for the shot of the player to move for
+    at most turn_timeout seconds. Line-delimited JSON messages:
+
+        server: start  {match, player, turn, goals, pucks, scores, next, radius, layout}
+        client: shot   {turn, puck, angle, power}
+        server: turn   {turn, shot, moved: [[k, x, y]], captured: [k], scores, next}
+        server: end    {winner, reason, turn, digest}
+        server: error  {reason}
+
+    Deltas list only the pucks a shot moved, at rest; positions never stream per
+    frame. The layout is sent as layout.Layout.to_dict(), so clients plan on the
+    same obstacles. At most max_matches run at once; further joins are refused.
+    """
+    def __init__(self, host="127.0.0.1", port=8765, num_pucks_per_player=5, turn_timeout=30.0, max_shots=200,
+                 max_matches=1000, seed=None, layout=None):
+        self.host = host
+        self.port = port
+        self.num_pucks_per_player = num_pucks_per_player
+        self.turn_timeout = turn_timeout
+        self.max_shots = max_shots
+        self.max_matches = max_matches
+        self.layout = layout  # Layout of every match: a layout.Layout, a built-in name or a JSON file
+        self.rng = random.Random(seed)
+        self.server = None
+        self.waiting = None  # A joined connection with no opponent yet
+        self.matches = {}
+        self.next_id = 0
+        self.finished = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_LINE)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        connection = Connection(reader, writer)
+        message = await connection.receive()
+        if message is None or message.get("type") != "join":
+            connection.send({"type": "error", "reason": "expected a join message"})
+            connection.close()
+            return
+        if len(self.matches) >= self.max_matches:
+            connection.send({"type": "error", "reason": "server full"})
+            connection.close()
+            return
+
+        receiving = None
+        if self.waiting is None or self.waiting.closed:
+            self.waiting = connection
+            connection.paired = asyncio.get_running_loop().create_future()
+            # Wait for an opponent; a client that hangs up (or talks) first frees the slot
+            receiving = asyncio.ensure_future(connection.receive())
+            await asyncio.wait((connection.paired, receiving), return_when=asyncio.FIRST_COMPLETED)
+            if not connection.paired.done():
+                if self.waiting is connection:
+                    self.waiting = None
+                connection.close(now=True)
+                return
+            match, player = connection.paired.result()
+        else:
+            opponent, self.waiting = self.waiting, None
+            match = Match(self.next_id, [opponent, connection], self.rng.randrange(2**32), self.num_pucks_per_player,
+                          self.layout)
+            self.next_id += 1
+            self.matches[match.id] = match
+            match.task = asyncio.ensure_future(self.run_match(match))
+            opponent.paired.set_result((match, 0))
+            player = 1
+
+        # Forward this client's messages to its match until it hangs up
+        while True:
+            message = await receiving if receiving is not None else await connection.receive()
+            receiving = None
+            if match.id not in self.matches:
+                break
+            try:
+                match.inbox.put_nowait((player, message))
+            except asyncio.QueueFull:
+                if message is None:
+                    # A hang-up is never dropped: with no room behind the queued
+                    # messages, end the match here instead of waiting for a timeout
+                    match.end(1 - player, "disconnect")
+                    match.task.cancel()
+                    break
+                connection.send({"type": "error", "reason": "too many messages"})
+            if message is None:
+                break
+
+    async def run_match(self, match):
+        match.start()
+        try:
+            await self.play(match)
+        finally:
+            del self.matches[match.id]
+            self.finished += 1
+
+    async def play(self, match):
+        loop = asyncio.get_running_loop()
+        while True:
+            engine = match.engine
+            if engine.game_over:
+                match.end(engine.winner.id if engine.winner is not None else None, "won")
+                return
+            if match.turn >= self.max_shots:
+                match.end(None, "draw")
+                return
+
+            # Wait for the player to move, answering anything else in the meantime
+            to_move = match.state.current_player_idx
+            deadline = loop.time() + self.turn_timeout
+            while True:
+                try:
+                    player, message = await asyncio.wait_for(match.inbox.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    match.end(1 - to_move, "timeout")
+                    return
+                if message is None:
+                    match.end(1 - player, "disconnect")
+                    return
+                if message.get("type") != "shot":
+                    match.connections[player].send({"type": "error", "reason": "expected a shot"})
+                    continue
+                try:
+                    shot = match.shot(player, message)
+                except ProtocolError as error:
+                    match.connections[player].send({"type": "error", "reason": str(error)})
+                    continue
+                await match.resolve(shot)
+                break
+
+async def scripted_client(host, port, ai):
+    """A loopback player: joins, mirrors the board from the deltas and plays ai's shots
+
+    Returns (match id, player, final message, True when the mirrored board matches
+    the server's digest).
+    """
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    writer.write(encode({"type": "join"}))
+    state = goals = None
+    player = match_id = None
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return match_id, player, None, False
+            message = json.loads(line)
+            kind = message["type"]
+            if kind == "start":
+                state = mirror_state(message)
+                goals = [tuple(goal) for goal in message["goals"]]
+                player = message["player"]
+                match_id = message["match"]
+            elif kind == "turn":
+                state = apply_delta(state, message)
+            elif kind == "end":
+                return match_id, player, message, board_digest(state) == message["digest"]
+            elif kind == "error":
+                raise RuntimeError(message["reason"])
+
+            if kind in ("start", "turn") and state.current_player_idx == player:
+                shot = ai.choose_shot(state, goals)
+                writer.write(encode({
+                    "type": "shot",
+                    "turn": message["turn"],
+                    "puck": shot.puck_index,
+                    "angle": shot.angle,
+                    "power": shot.power,
+                }))
+    finally:
+        writer.close()
+
+async def loopback(matches, num_pucks_per_player=5, seed=1, layout=None):
+    # Host matches on an ephemeral local port, played by pairs of scripted clients
+    from tournament import HeuristicAI
+
+    server = await MatchServer(port=0, num_pucks_per_player=num_pucks_per_player, max_matches=matches,
+                               seed=seed, layout=layout).start()
+    clients = [scripted_client(server.host, server.port, HeuristicAI(seed + k)) for k in range(2 * matches)]
+    try:
+        results = await asyncio.gather(*clients)
+    finally:
+        await server.close()
+    return server, results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Authoritative Pucket match server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pucks", type=int, default=5, help="pucks per player")
+    parser.add_argument("--turn-timeout", type=float, default=30.0, help="seconds a player has to shoot")
+    parser.add_argument("--max-matches", type=int, default=1000)
+    parser.add_argument("--layout", default=None, help="board layout: a built-in name or a layout JSON file")
+    parser.add_argument("--loopback", type=int, metavar="N", default=None,
+                        help="instead of serving, play N matches between scripted local clients and report")
+    parser.add_argument("--trace-memory", action="store_true", help="with --loopback, report peak memory per match")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.loopback is None:
+        async def serve():
+            server = await MatchServer(args.host, args.port, args.pucks, args.turn_timeout,
+                                       max_matches=args.max_matches, seed=args.seed, layout=args.layout).start()
+            print(f"serving on {server.host}:{server.port}")
+            await server.server.serve_forever()
+        asyncio.run(serve())
+    else:
+        # Tracing slows Python several times over, so it is only on for --trace-memory
+        if args.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        server, results = asyncio.run(loopback(args.loopback, args.pucks, args.seed or 1, args.layout))
+        elapsed = time.perf_counter() - started
+        ends = [end for _, _, end, _ in results if end is not None]
+        turns = sum(end["turn"] for end in ends) // 2
+        in_sync = sum(1 for *_, synced in results if synced)
+        print(f"{server.finished} matches, {turns} turns in {elapsed:.1f}s "
+              f"({server.finished / elapsed:.1f} matches/s, {turns / elapsed:.0f} turns/s)")
+        print(f"{in_sync}/{len(results)} clients ended in sync with the server")
+        if args.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"peak traced memory {peak / 1024:.0f} KB, {peak / 1024 / max(1, args.loopback):.1f} KB per match "
+                  f"with its two clients")
@@ -0,0 +1,320 @@
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engine import PucketEngine, Shot, simple_ai_power
+
+TOURNAMENT_VERSION = 1
+
+# Matches still undecided after this many shots are draws
+MAX_SHOTS = 200
+
+class HeuristicAI:
+    """The engine's simple AI as a choose_shot AI: a random puck aimed at the goal"""
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def choose_shot(self, state, goals):
+        player_idx = state.current_player_idx
+        movable = [k for k, puck in enumerate(state.pucks) if puck.active and puck.player_id == player_idx]
+        if not movable:
+            return None
+        k = self.rng.choice(movable)
+        puck = state.pucks[k]
+        goal = goals[player_idx]
+        dx = goal[0] - puck.x
+        dy = goal[1] - puck.y
+        angle = math.atan2(dy, dx) + self.rng.uniform(-0.2, 0.2)
+        power = simple_ai_power(math.hypot(dx, dy))
+        return Shot(k, angle, power)
+
+# AI variants by name: make(seed, budget) builds one for a match. Each match runs in
+# its own pool process, so the search AIs are kept to one core each
+def simple_ai(seed, budget):
+    return HeuristicAI(seed)
+
+# The aim table is built once per pool process, not timed as part of a decision
+aim_tables = {}
+
+def aim_ai(seed, budget):
+    from aim import AimTable, AimTableAI
+    if "table" not in aim_tables:
+        goals = PucketEngine(ai_players=(), seed=0, record_shots=False).goals
+        aim_tables["table"] = AimTable.build(goals)
+    return AimTableAI(table=aim_tables["table"])
+
+def grid_ai(seed, budget):
+    from candidates import GridAI
+    return GridAI()
+
+def montecarlo_ai(seed, budget):
+    from montecarlo import MonteCarloAI
+    return MonteCarloAI(time_budget=budget, workers=1, seed=seed)
+
+def minimax_ai(seed, budget):
+    from minimax import AlphaBetaAI
+    return AlphaBetaAI(time_budget=budget, use_processes=False)
+
+# Likewise the learned model, from where learned.py saves it by default
+models = {}
+
+def learned_ai(seed, budget):
+    from learned import LearnedAI, ValueModel, DEFAULT_MODEL
+    if "model" not in models:
+        models["model"] = ValueModel.load(DEFAULT_MODEL)
+    return LearnedAI(models["model"], seed=seed)
+
+def profile_ai(name):
+    # A difficulty profile as an entrant; it keeps its own budget, not --budget
+    def make(seed, budget):
+        from difficulty import ProfileAI
+        return ProfileAI(name, seed)
+    return make
+
+AIS = {
+    "simple": simple_ai,
+    "aim": aim_ai,
+    "grid": grid_ai,
+    "montecarlo": montecarlo_ai,
+    "minimax": minimax_ai,
+    "learned": learned_ai,
+    "easy": profile_ai("easy"),
+    "normal": profile_ai("normal"),
+    "hard": profile_ai("hard"),
+    "expert": profile_ai("expert"),
+}
+
+def schedule(names, games, seed=1, budget=0.2, max_shots=MAX_SHOTS, layout="classic"):
+    """Every pairing of names, games times each with the sides swapped every game
+
+    Returns match dicts with a stable id, so a rerun with the same arguments finds
+    the matches already in the results store. The thinking budget, shot limit and
+    layout (a name or layout JSON file, see layout.get_layout) are part of the id, so
+    a rerun with other ones plays its matches afresh. Both
+    orders of a pairing share the board seed, so each side plays the same opening
+    from either end.
+    """
+    matches = []
+    for a, b in itertools.combinations(names, 2):
+        for game in range(games):
+            players = [a, b] if game % 2 == 0 else [b, a]
+            board_seed = seed * 1000003 + game // 2
+            matches.append({
+                "id": f"{a}-{b}-{seed}-{game}-{budget:g}s-{max_shots}" + ("" if layout == "classic" else f"-{layout}"),
+                "players": players,
+                "seed": board_seed,
+                "budget": budget,
+                "max_shots": max_shots,
+                "layout": layout,
+            })
+    return matches
+
+def play_match(match):
+    """Pool task: play one AI-vs-AI match to the end, shot by shot
+
+    Shots are resolved straight to rest, with no turn delays, under the match's
+    thinking budget and shot limit. Returns the result
+    record: the winning side (or None for a draw), scores, shots and the decision
+    latency of every move in milliseconds, per side.
+    """
+    seed = match["seed"]
+    budget = match["budget"]
+    max_shots = match["max_shots"]
+    engine = PucketEngine(ai_players=(), seed=seed, record_shots=False, layout=match["layout"])
+    ais = [AIS[name](seed ^ (side + 1), budget) for side, name in enumerate(match["players"])]
+    latencies = [[], []]
+    shots = 0
+    started = time.perf_counter()
+    try:
+        while not engine.game_over and shots < max_shots:
+            side = engine.current_player_idx
+            state = engine.snapshot()
+            decided = time.perf_counter()
+            shot = ais[side].choose_shot(state, engine.goals)
+            latencies[side].append(1000.0 * (time.perf_counter() - decided))
+            if shot is None:
+                break
+            engine.resolve_shot(engine.pucks[shot.puck_index], shot.angle, shot.power)
+            shots += 1
+    finally:
+        for ai in ais:
+            if hasattr(ai, "close"):
+                ai.close()
+
+    winner = engine.winner.id if engine.game_over and engine.winner is not None else None
+    return dict(
+        match,
+        version=TOURNAMENT_VERSION,
+        winner=winner,
+        scores=[player.score for player in engine.players],
+        shots=shots,
+        seconds=time.perf_counter() - started,
+        latency_ms=latencies,
+    )
+
+def load_results(path):
+    # Results already in the store, by match id; a torn last line is ignored
+    results = {}
+    if path is None or not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[record["id"]] = record
+    return results
+
+def run_tournament(matches, store=None, workers=None, progress=None):
+    """Play the matches not yet in store on a process pool and return all results
+
+    Each result is appended to store (JSON lines) as soon as its match finishes, so
+    an interrupted tournament resumes where it stopped.
+    """
+    results = load_results(store)
+    pending = [match for match in matches if match["id"] not in results]
+    if not pending:
+        return [results[match["id"]] for match in matches]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = [executor.submit(play_match, match) for match in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            results[record["id"]] = record
+            if store is not None:
+                with open(store, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+            if progress is not None:
+                progress(record)
+    return [results[match["id"]] for match in matches if match["id"] in results]
+
+def outcomes(results):
+    # (first, second, points of first): 1 win, 0.5 draw, 0 loss
+    games = []
+    for record in results:
+        a, b = record["players"]
+        points = 0.5 if record["winner"] is None else 1.0 - record["winner"]
+        games.append((a, b, points))
+    return games
+
+def elo(games, names, iterations=200):
+    """Elo ratings fitted to all games at once (Bradley-Terry maximum likelihood)
+
+    Ratings average 1500. Every AI gets one virtual draw against an average
+    opponent, which keeps the fit finite for an AI that never won or never lost.
+    """
+    strength = {name: 1.0 for name in names}
+    for _ in range(iterations):
+        updated = {}
+        for name in names:
+            wins = 0.5
+            weight = 1.0 / (strength[name] + 1.0)
+            for a, b, points in games:
+                if name == a:
+                    wins += points
+                    weight += 1.0 / (strength[a] + strength[b])
+                elif name == b:
+                    wins += 1.0 - points
+                    weight += 1.0 / (strength[a] + strength[b])
+            updated[name] = wins / weight
+        # Keep the geometric mean at 1 (a rating of 1500)
+        mean = math.exp(sum(math.log(value) for value in updated.values()) / len(updated))
+        strength = {name: value / mean for name, value in updated.items()}
+    return {name: 1500.0 + 400.0 * math.log10(strength[name]) for name in names}
+
+def elo_intervals(games, names, rounds=200, confidence=0.95, seed=1):
+    # Percentile bootstrap over the games: (low, high) rating per AI
+    rng = random.Random(seed)
+    samples = {name: [] for name in names}
+    for _ in range(rounds):
+        resampled = [rng.choice(games) for _ in games]
+        for name, rating in elo(resampled, names, iterations=50).items():
+            samples[name].append(rating)
+    tail = (1.0 - confidence) / 2
+    intervals = {}
+    for name, values in samples.items():
+        values.sort()
+        low = values[int(tail * (len(values) - 1))]
+        high = values[int(math.ceil((1.0 - tail) * (len(values) - 1)))]
+        intervals[name] = (low, high)
+    return intervals
+
+def latency_rows(results):
+    # One (ai, match, move, ms) row per decision
+    rows = []
+    for record in results:
+        for side, name in enumerate(record["players"]):
+            for move, ms in enumerate(record["latency_ms"][side]):
+                rows.append((name, record["id"], move, ms))
+    return rows
+
+def latency_summary(rows):
+    by_ai = {}
+    for name, _, _, ms in rows:
+        by_ai.setdefault(name, []).append(ms)
+    summary = {}
+    for name, values in by_ai.items():
+        values.sort()
+        summary[name] = {
+            "moves": len(values),
+            "p50_ms": values[len(values) // 2],
+            "p99_ms": values[min(len(values) - 1, int(0.99 * len(values)))],
+            "max_ms": values[-1],
+        }
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless AI-vs-AI tournament with Elo ratings")
+    parser.add_argument("ais", nargs="+", help="AIs to enter: " + ", ".join(AIS))
+    parser.add_argument("--games", type=int, default=10, help="games per pairing, sides swapped every game")
+    parser.add_argument("--workers", type=int, default=None, help="match processes (default: all cores)")
+    parser.add_argument("--store", metavar="PATH", default="tournament.jsonl", help="resumable results store")
+    parser.add_argument("--budget", type=float, default=0.2, help="thinking time per move for the search AIs")
+    parser.add_argument("--max-shots", type=int, default=MAX_SHOTS, help="shots before a match is a draw")
+    parser.add_argument("--layout", default="classic", help="board layout: a built-in name or a layout JSON file")
+    parser.add_argument("--latency", metavar="PATH", default=None, help="write per-move decision latencies as CSV")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    unknown = [name for name in args.ais if name not in AIS]
+    if unknown:
+        parser.error(f"unknown AIs: {', '.join(unknown)}")
+    if len(set(args.ais)) < 2:
+        parser.error("a tournament needs at least two different AIs")
+    names = list(dict.fromkeys(args.ais))
+
+    matches = schedule(names, args.games, args.seed, args.budget, args.max_shots, args.layout)
+    started = time.perf_counter()
+    played = [0]
+
+    def progress(record):
+        played[0] += 1
+        winner = "draw" if record["winner"] is None else record["players"][record["winner"]]
+        print(f"{record['id']:34s} {' vs '.join(record['players']):24s} {winner:12s} {record['shots']:3d} shots")
+
+    results = run_tournament(matches, args.store, args.workers, progress)
+    elapsed = time.perf_counter() - started
+    if played[0]:
+        print(f"{played[0]} matches in {elapsed:.1f}s ({60.0 * played[0] / elapsed:.1f} matches/min)")
+
+    games = outcomes(results)
+    ratings = elo(games, names)
+    intervals = elo_intervals(games, names, seed=args.seed)
+    rows = latency_rows(results)
+    latency = latency_summary(rows)
+    print(f"{'AI':12s} {'Elo':>6s}  {'95% CI':>13s}  {'p50 ms':>8s} {'p99 ms':>8s}")
+    for name in sorted(names, key=ratings.get, reverse=True):
+        low, high = intervals[name]
+        stats = latency.get(name, {"p50_ms": 0.0, "p99_ms": 0.0})
+        print(f"{name:12s} {ratings[name]:6.0f}  [{low:5.0f}, {high:5.0f}]  {stats['p50_ms']:8.2f} {stats['p99_ms']:8.2f}")
+
+    if args.latency:
+        with open(args.latency, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("ai", "match", "move", "ms"))
+            writer.writerows(rows)
@@ -0,0 +1,258 @@
+import argparse
+import math
+import random
+import sys
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is an optional dependency
+    np = None
+
+from engine import PucketEngine, WIDTH, HEIGHT, PUCK_RADIUS, HOLE_RADIUS, FRICTION, MAX_VELOCITY, dense_radius
+
+# Same constants as the scalar engine, named so the batched code reads like Puck.update
+WALL_RESTITUTION = 0.8
+COLLISION_IMPULSE = 1.8  # Slightly less elastic for stability
+CAPTURE_RADIUS = HOLE_RADIUS - 5
+STOP_SPEED = 0.1
+# Largest position difference, in pixels, allowed between this backend and the engine
+TOLERANCE = 1e-6
+
+def require_numpy():
+    if np is None:
+        raise ImportError("The vectorized physics backend needs NumPy: pip install numpy")
+
+class VectorPhysics:
+    """Structure-of-arrays puck physics: every puck of every player in flat NumPy arrays
+
+    pos and vel are (n, 2) float arrays, active is an (n,) bool mask and owner holds the
+    player id of each puck. Goals are indexed by player id, like PucketEngine.goals.
+    rng nudges apart pucks that land on the same spot, as the engine's rng does.
+    """
+    def __init__(self, pos, vel, active, owner, goals, num_players=2, radius=PUCK_RADIUS, rng=None):
+        require_numpy()
+        self.pos = np.array(pos, dtype=np.float64).reshape(-1, 2)
+        self.vel = np.array(vel, dtype=np.float64).reshape(-1, 2)
+        self.active = np.array(active, dtype=bool)
+        self.owner = np.array(owner, dtype=np.intp)
+        self.goals = np.array(goals, dtype=np.float64).reshape(-1, 2)
+        self.scores = np.zeros(num_players, dtype=np.int64)
+        self.radius = radius
+        self.rng = rng if rng is not None else random.Random(0)
+        # Broad-phase reach, as in PucketEngine's SpatialHash
+        self.reach = 3 * radius
+
+        # Pair indices for the collision pass, each unordered pair once
+        self.pair_i, self.pair_j = np.triu_indices(len(self.pos), k=1)
+
+    @classmethod
+    def from_engine(cls, engine):
+        pucks = [puck for player in engine.players for puck in player.pucks]
+        physics = cls(
+            [puck.position for puck in pucks],
+            [puck.velocity for puck in pucks],
+            [puck.active for puck in pucks],
+            [puck.player_id for puck in pucks],
+            engine.goals,
+            num_players=len(engine.players),
+            radius=engine.puck_radius,
+            rng=random.Random()
+        )
+        # Draw the same nudges as the engine from here on
+        physics.rng.setstate(engine.rng.getstate())
+        physics.scores[:] = [player.score for player in engine.players]
+        return physics
+
+    def write_back(self, engine):
+        # Copy the array state back into the engine's Puck objects
+        pucks = [puck for player in engine.players for puck in player.pucks]
+        for k, puck in enumerate(pucks):
+            puck.position = (float(self.pos[k, 0]), float(self.pos[k, 1]))
+            puck.velocity = (float(self.vel[k, 0]), float(self.vel[k, 1]))
+            puck.active = bool(self.active[k])
+        for player in engine.players:
+            player.score = int(self.scores[player.id])
+
+    def launch(self, index, angle, power):
+        if not self.active[index]:
+            return
+        power = min(power, MAX_VELOCITY)
+        self.vel[index] = (power * math.cos(angle), power * math.sin(angle))
+
+    def step(self):
+        # One frame: integration, wall bounces, puck collisions, goal capture.
+        # Returns the mask of pucks captured this frame
+        self.integrate()
+        self.collide()
+        return self.capture()
+
+    def integrate(self):
+        active = self.active[:, None]
+
+        # Apply friction and update positions of pucks still in play
+        self.vel = np.where(active, self.vel * FRICTION, self.vel)
+        self.pos = np.where(active, self.pos + self.vel, self.pos)
+
+        # Clamp to the board edges and reflect the velocity component with energy loss
+        low = self.radius
+        high = np.array((WIDTH - self.radius, HEIGHT - self.radius), dtype=np.float64)
+        out = ((self.pos < low) | (self.pos > high)) & active
+        self.pos = np.where(out, np.clip(self.pos, low, high), self.pos)
+        self.vel = np.where(out, -self.vel * WALL_RESTITUTION, self.vel)
+
+    def collide(self):
+        i, j = self.pair_i, self.pair_j
+        if len(i) == 0:
+            return
+
+        # Candidate pairs as in the scalar broad phase: both active, at least one moving
+        # and closer than the reach, each pair once in index order
+        d = self.pos[j] - self.pos[i]
+        distance2 = (d * d).sum(axis=1)
+        moving = self.moving()
+        candidate = self.active[i] & self.active[j] & (moving[i] | moving[j]) & (distance2 < self.reach * self.reach)
+        distance = np.sqrt(distance2)
+        touching = candidate & (distance < 2 * self.radius)
+        if not touching.any():
+            return
+
+        # A contact whose pucks are in no other candidate pair can't be affected by, or
+        # affect, any other pair and is resolved in one batch with the other such contacts.
+        # The rest depend on resolution order: resolve the chain of candidate pairs they
+        # belong to pair by pair, in the same order as the scalar engine, however long
+        # it is: resolving a pile-up in one batch instead sends it somewhere else
+        counts = np.bincount(np.concatenate((i[candidate], j[candidate])), minlength=len(self.pos))
+        crowded = counts > 1
+        # Pucks on the same spot are nudged with the rng, which has to be drawn in order too
+        ordered = touching & (crowded[i] | crowded[j] | (distance < 0.0001))
+
+        independent = touching & ~ordered
+        if independent.any():
+            self.resolve_batch(i[independent], j[independent], d[independent], distance[independent])
+        if ordered.any():
+            ci, cj = i[candidate], j[candidate]
+            member = np.zeros(len(self.pos), dtype=bool)
+            member[self.chain(ci, cj, np.union1d(i[ordered], j[ordered]))] = True
+            inside = member[ci]
+            self.resolve_sequential(ci[inside], cj[inside])
+
+    def chain(self, i, j, seeds):
+        # Every puck reachable from the seeds through the given pairs
+        member = np.zeros(len(self.pos), dtype=bool)
+        member[seeds] = True
+        while True:
+            grown = member.copy()
+            grown[j[member[i]]] = True
+            grown[i[member[j]]] = True
+            if (grown == member).all():
+                return np.flatnonzero(member)
+            member = grown
+
+    def resolve_batch(self, i, j, d, distance):
+        # Resolve all contacts at once, summing impulses on pucks in several contacts.
+        # Pucks on the same spot never get here: collide resolves them in order
+        normal = d / distance[:, None]
+
+        # Relative velocity along the normal, only for pucks moving towards each other
+        vn = ((self.vel[i] - self.vel[j]) * normal).sum(axis=1)
+        approaching = vn <= 0
+        if not approaching.any():
+            return
+        i, j, normal, vn, distance = i[approaching], j[approaching], normal[approaching], vn[approaching], distance[approaching]
+
+        impulse = (-COLLISION_IMPULSE * vn / 2)[:, None] * normal
+        overlap = (0.5 * (2 * self.radius - distance))[:, None] * normal
+        np.add.at(self.vel, i, impulse)
+        np.subtract.at(self.vel, j, impulse)
+        np.subtract.at(self.pos, i, overlap)
+        np.add.at(self.pos, j, overlap)
+
+    def resolve_sequential(self, pairs_i, pairs_j):
+        # Same pair-by-pair pass as PucketEngine.check_puck_collisions, on a few pairs
+        pos, vel = self.pos, self.vel
+        limit = 2 * self.radius
+        for a, b in zip(pairs_i.tolist(), pairs_j.tolist()):
+            dx = pos[b, 0] - pos[a, 0]
+            dy = pos[b, 1] - pos[a, 1]
+            distance = math.sqrt(dx*dx + dy*dy)
+            if distance < 0.0001:
+                pos[b, 0] += self.rng.uniform(0.1, 1.0)
+                pos[b, 1] += self.rng.uniform(0.1, 1.0)
+                dx = pos[b, 0] - pos[a, 0]
+                dy = pos[b, 1] - pos[a, 1]
+                distance = math.sqrt(dx*dx + dy*dy)
+            if distance >= limit:
+                continue
+            nx = dx / distance
+            ny = dy / distance
+            vn = (vel[a, 0] - vel[b, 0]) * nx + (vel[a, 1] - vel[b, 1]) * ny
+            if vn > 0:
+                continue
+            impulse = -COLLISION_IMPULSE * vn / 2
+            vel[a, 0] += impulse * nx
+            vel[a, 1] += impulse * ny
+            vel[b, 0] -= impulse * nx
+            vel[b, 1] -= impulse * ny
+            overlap = 0.5 * (limit - distance)
+            pos[a, 0] -= overlap * nx
+            pos[a, 1] -= overlap * ny
+            pos[b, 0] += overlap * nx
+            pos[b, 1] += overlap * ny
+
+    def capture(self):
+        # Pucks within the capture radius of their opponent's goal leave play
+        d = self.pos - self.goals[self.owner]
+        captured = self.active & ((d * d).sum(axis=1) < CAPTURE_RADIUS * CAPTURE_RADIUS)
+        if captured.any():
+            self.active &= ~captured
+            self.scores += np.bincount(self.owner[captured], minlength=len(self.scores))
+        return captured
+
+    def moving(self):
+        return (np.abs(self.vel) >= STOP_SPEED).any(axis=1) & self.active
+
+    def all_stopped(self):
+        return not self.moving().any()
+
+def deviation(engine, frames):
+    """Largest position difference between this backend and engine over frames
+
+    Both start from the engine's current board and step it on their own; the engine
+    is left where it ended up. Only boards without obstacles can be compared.
+    """
+    if engine.obstacles is not None:
+        raise ValueError("VectorPhysics has no walls, bumpers or portals")
+    physics = VectorPhysics.from_engine(engine)
+    pucks = [puck for player in engine.players for puck in player.pucks]
+    worst = 0.0
+    for _ in range(frames):
+        engine.physics_step(engine.pucks)
+        physics.step()
+        positions = np.array([puck.position for puck in pucks])
+        worst = max(worst, float(np.abs(positions - physics.pos).max()))
+    return worst
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the NumPy backend against the scalar engine on dense boards")
+    # The default game and the ends of the 50-500 per side stress range of the broad phase
+    parser.add_argument("pucks", nargs="*", type=int, default=[5, 50, 500], help="pucks per player of each board")
+    parser.add_argument("--boards", type=int, default=2, help="seeded boards per size")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    failed = False
+    for count in args.pucks:
+        for seed in range(args.boards):
+            # Every puck of the first player launched at once into a crowded board, the
+            # pucks as large as the start grid allows
+            engine = PucketEngine(ai_players=(), num_pucks_per_player=count, puck_radius=dense_radius(count),
+                                  seed=seed, record_shots=False)
+            rng = random.Random(seed)
+            for puck in engine.players[0].pucks:
+                puck.launch(rng.uniform(-math.pi, math.pi), rng.uniform(0.5, 1.0) * MAX_VELOCITY)
+            worst = deviation(engine, args.frames)
+            failed |= worst > TOLERANCE
+            print(f"{count:4d} pucks per player (radius {engine.puck_radius}), seed {seed}: max deviation {worst:.3g} px"
+                  + ("  OVER TOLERANCE" if worst > TOLERANCE else ""))
+    if failed:
+        sys.exit(1)